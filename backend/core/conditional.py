@@ -0,0 +1,94 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _version_key(model):
+    return f'model-version:{model._meta.label_lower}'
+
+
+def model_version(model):
+    """
+    Marca de versão do model (timestamp da última escrita), guardada no cache.
+    Cache vazio (reinício/limpeza) gera uma marca nova: os clientes só
+    revalidam uma vez, nunca recebem 304 com dado velho.
+    """
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*models):
+    """
+    Invalida a versão dos models. Agora (quem ler a partir daqui revalida) e
+    de novo no commit: uma ETag entregue durante a transação, com os dados
+    ainda antigos, não sobrevive à gravação.
+    """
+    def bump():
+        now = time.time()
+        cache.set_many({_version_key(model): now for model in models}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def track_versions(*models):
+    """Mantém a versão dos models pelos signals de save/delete (chamar no AppConfig.ready)."""
+    for model in models:
+        uid = f'track-version:{model._meta.label_lower}'
+        post_save.connect(_bump_from_signal, sender=model, dispatch_uid=f'{uid}:save')
+        post_delete.connect(_bump_from_signal, sender=model, dispatch_uid=f'{uid}:delete')
+
+
+def _bump_from_signal(sender, **kwargs):
+    bump_version(sender)
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional (ETag / Last-Modified) para viewsets de leitura frequente.
+
+    `etag_models` lista todos os models que aparecem na resposta (inclusive
+    os aninhados). Saves/deletes atualizam a versão via signals
+    (track_versions); UPDATEs em lote chamam bump_version diretamente.
+
+    If-None-Match / If-Modified-Since são respondidos com 304 antes de
+    qualquer query ou serialização.
+    """
+    etag_models = ()
+
+    def version_marker(self):
+        versions = [model_version(model) for model in self.etag_models]
+        etag = '"%s"' % hashlib.md5(repr(versions).encode()).hexdigest()
+        # Last-Modified tem precisão de 1s: se a última escrita foi neste mesmo
+        # segundo, outra ainda pode vir com a mesma data, então não é enviado
+        last_modified = int(max(versions))
+        if last_modified >= int(time.time()):
+            last_modified = None
+        return etag, last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.version_marker()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Sempre revalida: o navegador guarda a resposta e manda If-None-Match
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,343 @@
+"""
+Instrumentação por requisição: Server-Timing, métricas Prometheus e log de
+queries lentas.
+
+MetricsMiddleware mede cada requisição:
+- total: do middleware até a resposta renderizada;
+- db: número de queries e tempo no banco (execute_wrapper em todas as
+  conexões, inclusive as das threads do Dashboard async);
+- render: Response.render() do DRF (renderer JSON/Browsable);
+- app: o resto (view, serializers, Python).
+
+Os números saem no header `Server-Timing` (aba Network do navegador) e são
+somados em histogramas por rota (view_name) em memória, por processo:
+com vários workers, cada scrape lê o worker que atendeu. Exposição em
+`/api/metrics/` (formato texto do Prometheus).
+
+Queries acima de SLOW_QUERY_MS vão para o logger `trama.slow_queries` e as
+piores (SLOW_QUERY_KEEP) ficam no cache, compartilhadas entre os workers,
+em `/api/metrics/slow-queries/`. Só o SQL com placeholders, sem parâmetros.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger('trama.slow_queries')
+
+# Limites dos buckets do histograma de latência, em segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_QUERIES_KEY = 'metrics:slow-queries'
+SLOW_QUERY_KEEP = 20
+SLOW_SQL_MAX_LENGTH = 2000
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Contadores de uma requisição (as queries podem vir de várias threads)."""
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.lock = threading.Lock()
+
+    def add_query(self, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+
+
+def current_metrics():
+    """Métricas da requisição em andamento (None fora de uma requisição)."""
+    return _current.get()
+
+
+# --- BANCO ---
+
+def _record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add_query(duration)
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            _slow_query(sql, duration, metrics, context['connection'].alias)
+
+
+def install_query_wrapper(connection, **kwargs):
+    """Liga _record_query na conexão (signal connection_created)."""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install():
+    connection_created.connect(install_query_wrapper, dispatch_uid='core.metrics.install_query_wrapper')
+    # Conexões que já estavam abertas antes do middleware carregar
+    for connection in connections.all(initialized_only=True):
+        install_query_wrapper(connection)
+
+
+# --- QUERIES LENTAS ---
+
+def _slow_query(sql, duration, metrics, alias):
+    path = metrics.request.path if metrics is not None else '-'
+    registry.count_slow_query(_route(metrics.request) if metrics is not None else 'unmatched')
+    logger.warning("Query lenta (%.1f ms, %s, %s): %s", duration * 1000, alias, path, sql)
+
+    entries = cache.get(SLOW_QUERIES_KEY) or []
+    if len(entries) >= SLOW_QUERY_KEEP and duration * 1000 <= entries[-1]['ms']:
+        return
+    entries.append({
+        'ms': round(duration * 1000, 1),
+        'sql': sql[:SLOW_SQL_MAX_LENGTH],
+        'path': path,
+        'database': alias,
+        'at': time.time(),
+    })
+    entries.sort(key=lambda entry: entry['ms'], reverse=True)
+    # get + set sem lock: duas queries lentas simultâneas podem perder uma entrada
+    cache.set(SLOW_QUERIES_KEY, entries[:SLOW_QUERY_KEEP], None)
+
+
+def slow_queries():
+    """As piores queries registradas (mais lentas primeiro)."""
+    return cache.get(SLOW_QUERIES_KEY) or []
+
+
+def reset_slow_queries():
+    cache.delete(SLOW_QUERIES_KEY)
+
+
+# --- AGREGAÇÃO ---
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # view_name (ex.: product-list) e não o path: cardinalidade limitada
+    return (match.view_name if match is not None else None) or 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """Histogramas e contadores por rota, em memória (por processo)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.responses = {}
+            self.slow = {}
+
+    def observe(self, route, method, status, metrics, total):
+        with self.lock:
+            data = self.routes.get((route, method))
+            if data is None:
+                data = self.routes[(route, method)] = {
+                    'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0,
+                    'queries': 0, 'db': 0.0, 'render': 0.0,
+                }
+            for index, limit in enumerate(BUCKETS):
+                if total <= limit:
+                    data['buckets'][index] += 1
+            data['count'] += 1
+            data['sum'] += total
+            data['queries'] += metrics.queries
+            data['db'] += metrics.db_time
+            data['render'] += metrics.render_time
+            key = (route, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def count_slow_query(self, route):
+        with self.lock:
+            self.slow[route] = self.slow.get(route, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {key: {**data, 'buckets': list(data['buckets'])} for key, data in self.routes.items()},
+                dict(self.responses),
+                dict(self.slow),
+            )
+
+
+registry = MetricsRegistry()
+_collectors = []
+
+
+def register_collector(collector):
+    """
+    Métricas de outros módulos no /api/metrics/ (chamar no AppConfig.ready).
+    `collector()` retorna [(nome, tipo, ajuda, valor)].
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_prometheus():
+    """Todas as métricas no formato texto do Prometheus (versão 0.0.4)."""
+    routes, responses, slow = registry.snapshot()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('trama_http_request_duration_seconds', 'histogram', 'Latência das requisições por rota.')
+    for (route, method), data in sorted(routes.items()):
+        for limit, count in zip(BUCKETS, data['buckets']):
+            lines.append(f'trama_http_request_duration_seconds_bucket{_labels(route=route, method=method, le=limit)} {count}')
+        lines.append(f'trama_http_request_duration_seconds_bucket{_labels(route=route, method=method, le="+Inf")} {data["count"]}')
+        lines.append(f'trama_http_request_duration_seconds_sum{_labels(route=route, method=method)} {data["sum"]:.6f}')
+        lines.append(f'trama_http_request_duration_seconds_count{_labels(route=route, method=method)} {data["count"]}')
+
+    for name, field, help_text, fmt in (
+        ('trama_http_db_queries_total', 'queries', 'Queries executadas pelas requisições.', '{}'),
+        ('trama_http_db_seconds_total', 'db', 'Tempo no banco das requisições.', '{:.6f}'),
+        ('trama_http_render_seconds_total', 'render', 'Tempo de renderização (DRF) das respostas.', '{:.6f}'),
+    ):
+        family(name, 'counter', help_text)
+        for (route, method), data in sorted(routes.items()):
+            lines.append(f'{name}{_labels(route=route, method=method)} {fmt.format(data[field])}')
+
+    family('trama_http_responses_total', 'counter', 'Respostas por rota e status.')
+    for (route, method, status), count in sorted(responses.items()):
+        lines.append(f'trama_http_responses_total{_labels(route=route, method=method, status=status)} {count}')
+
+    family('trama_slow_queries_total', 'counter', f'Queries acima de {settings.SLOW_QUERY_MS} ms.')
+    for route, count in sorted(slow.items()):
+        lines.append(f'trama_slow_queries_total{_labels(route=route)} {count}')
+
+    for collector in _collectors:
+        for name, kind, help_text, value in collector():
+            family(name, kind, help_text)
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- MIDDLEWARE ---
+
+def _server_timing(metrics, total):
+    app = max(total - metrics.db_time - metrics.render_time, 0)
+    return ', '.join([
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'render;dur={metrics.render_time * 1000:.1f}',
+        f'app;dur={app * 1000:.1f}',
+    ])
+
+
+class MetricsMiddleware:
+    """
+    Mede cada requisição (ver o docstring do módulo). Funciona em WSGI e ASGI
+    sem forçar as views async para uma thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # Response do DRF: renderizada pelo handler depois deste hook
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        registry.observe(_route(request), request.method, response.status_code, metrics, total)
+        response['Server-Timing'] = _server_timing(metrics, total)
+        return response
+
+
+# --- ENDPOINT ---
+
+class HasMetricsToken(BasePermission):
+    """`Authorization: Bearer <METRICS_TOKEN>` (para o scraper, sem JWT)."""
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+class MetricsView(APIView):
+    """
+    Métricas no formato do Prometheus. Acesso com o token fixo METRICS_TOKEN
+    (scraper) ou com usuário autenticado (JWT).
+    """
+    permission_classes = [HasMetricsToken | IsAuthenticated]
+
+    def perform_authentication(self, request):
+        # Autenticação preguiçosa: o token do scraper não é um JWT
+        pass
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SlowQueriesView(MetricsView):
+    """As piores queries acima de SLOW_QUERY_MS (DELETE limpa a lista)."""
+
+    def get(self, request):
+        return Response({'threshold_ms': settings.SLOW_QUERY_MS, 'queries': slow_queries()})
+
+    def delete(self, request):
+        reset_slow_queries()
+        return Response(status=204)
@@ -0,0 +1,105 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre a ordenação da view.
+
+    O cursor guarda os valores da última linha da página e a próxima página
+    é buscada com `WHERE (a, b, id) < (...)`, sem OFFSET nem COUNT(*): o custo
+    é o mesmo na primeira ou na milésima página. A ordenação (`view.ordering`)
+    deve terminar em um campo único (id) para desempatar.
+
+    Opcional: sem `?page_size=N` (até `max_page_size`) nem `?cursor=` a
+    resposta continua sendo a lista completa, como antes; clientes que
+    pedem página recebem {'next', 'results'}. O link `next` já carrega o
+    cursor e o tamanho escolhido. `?paginate=false` força a lista completa.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    disable_query_param = 'paginate'
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get(self.disable_query_param, '').lower() in ('false', '0', 'no'):
+            return None
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None  # cliente antigo: lista completa
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'ordering', None) or self.ordering)
+        self.fields = [
+            (queryset.model._meta.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def position_filter(self, position):
+        """(a, b, c) < (x, y, z)  =>  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)"""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.fields, position):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field.name}__{lookup}': value})
+            equal &= Q(**{field.name: value})
+        return condition
+
+    def encode_cursor(self, obj):
+        values = []
+        for field, _ in self.fields:
+            value = getattr(obj, field.attname)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps(values, default=str).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for (field, _), value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound("Cursor inválido.")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
 
 # 5. Middleware
 MIDDLEWARE = [
+    # Primeiro da lista: mede a requisição inteira (ver core/metrics.py)
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,6 +82,74 @@ DATABASES = {
     )
 }
 
+# 6.1 Perfil de produção do SQLite (lojas menores rodam com o banco em arquivo)
+# - WAL: leituras não bloqueiam a escrita (nem o contrário)
+# - BEGIN IMMEDIATE em todo transaction.atomic(): a escrita pega o lock no
+#   início e espera a vez (timeout) em vez de falhar com "database is locked"
+#   ao tentar promover uma leitura no meio da transação
+# - synchronous=NORMAL (seguro com WAL), cache e mmap maiores
+# O ganho medido é o fim dos "database is locked"; vendas/s fica igual (entre
+# 0.94x e 1.03x no bench_sqlite), pois a venda é limitada pela CPU do Python
+# SQLITE_TUNING=off volta ao padrão do Django (ex.: para comparar no bench_sqlite)
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',  # ms esperando o lock de escrita
+    'PRAGMA cache_size=-32000',  # KiB (32 MB)
+    'PRAGMA mmap_size=268435456',  # 256 MB
+    'PRAGMA temp_store=MEMORY',
+]
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and os.environ.get('SQLITE_TUNING', 'on') != 'off':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'init_command': ';'.join(SQLITE_PRAGMAS),
+        'transaction_mode': 'IMMEDIATE',
+    })
+
+# 6.2 PostgreSQL: pool de conexões nativo do Django (psycopg 3 + psycopg_pool)
+# Cada processo mantém até DB_POOL_MAX_SIZE conexões abertas e as empresta
+# por requisição/thread: rajadas não pagam o handshake (TCP/TLS/autenticação)
+# e o total de conexões no banco fica limitado (workers x max_size).
+# DB_POOL=off volta às conexões persistentes por thread (CONN_MAX_AGE).
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and os.environ.get('DB_POOL', 'on') != 'off':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # com pool o Django exige 0: devolve a conexão no fim da requisição
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        # Segundos esperando uma conexão livre antes de erro (PoolTimeout)
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        # Conexões ociosas acima do min_size fecham depois disso; e toda conexão é renovada após max_lifetime
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800')),
+    }
+    # Health check ao emprestar (o Django liga o check do pool por esta chave):
+    # uma ida ao banco que descarta conexões derrubadas pelo servidor/proxy
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = os.environ.get('DB_POOL_CHECK', 'on') != 'off'
+
+# 6.3 Cache (versões dos models para ETag/GET condicional, Dashboard, queries lentas)
+# Em arquivo: compartilhado entre os workers do mesmo servidor (LocMem não seria)
+# - MAX_ENTRIES folgado: cheio, o FileBasedCache apaga 1/CULL_FREQUENCY das
+#   entradas ao acaso (marcas de versão inclusive: os clientes só revalidam)
+# - Sem lock entre processos: incr e a lista de queries lentas são
+#   ler-alterar-gravar, então contagens concorrentes podem se perder (aproximadas)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'trama_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000')),
+            'CULL_FREQUENCY': 10,
+        },
+    }
+}
+# Testes: o runner de core/testing.py troca por cache em memória do processo
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# 6.4 Métricas (core/metrics.py)
+# Queries acima deste tempo vão para o log de queries lentas
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# Token fixo do scraper do Prometheus em /api/metrics/ (vazio = só JWT)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # 7. Validação de Senha
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
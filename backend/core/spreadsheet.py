@@ -0,0 +1,123 @@
+"""
+Leitura de planilhas enviadas pelo usuário (CSV ou XLSX) para importação.
+
+Cada linha vira um dict {coluna: texto}, com o cabeçalho normalizado
+(minúsculas, sem acento, espaços viram "_"): "Preço Unitário" => "preco_unitario".
+O XLSX é lido direto do zip (primeira planilha), sem dependência extra.
+"""
+import csv
+import io
+import re
+import unicodedata
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+CELL_REF = re.compile(r'([A-Z]+)')
+
+
+class SpreadsheetError(ValueError):
+    """Arquivo ilegível (formato, codificação ou zip inválido)."""
+
+
+def normalize_header(name):
+    name = unicodedata.normalize('NFKD', str(name or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'\W+', '_', name.strip().lower()).strip('_')
+
+
+def _csv_rows(raw):
+    for encoding in ('utf-8-sig', 'cp1252'):
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise SpreadsheetError("Codificação do CSV não reconhecida (use UTF-8).")
+    # Excel em português grava com ";"
+    first_line = text.split('\n', 1)[0]
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    yield from csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+
+
+def _column_index(ref):
+    letters = CELL_REF.match(ref).group(1)
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _xlsx_rows(raw):
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(raw))
+    except zipfile.BadZipFile:
+        raise SpreadsheetError("Arquivo XLSX inválido.")
+    with archive:
+        names = archive.namelist()
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as stream:
+                for _, elem in iterparse(stream):
+                    if elem.tag == f'{XLSX_NS}si':
+                        shared.append(''.join(t.text or '' for t in elem.iter(f'{XLSX_NS}t')))
+                        elem.clear()
+
+        sheets = sorted(name for name in names if re.match(r'xl/worksheets/sheet\d+\.xml$', name))
+        if not sheets:
+            raise SpreadsheetError("Planilha não encontrada no XLSX.")
+        sheet = 'xl/worksheets/sheet1.xml' if 'xl/worksheets/sheet1.xml' in sheets else sheets[0]
+
+        with archive.open(sheet) as stream:
+            expected = 1
+            for _, elem in iterparse(stream):
+                if elem.tag != f'{XLSX_NS}row':
+                    continue
+                # Linhas vazias não aparecem no XML: mantém a numeração do Excel
+                number = int(elem.get('r') or expected)
+                for _ in range(expected, number):
+                    yield []
+                expected = number + 1
+                row = []
+                for position, cell in enumerate(elem.iter(f'{XLSX_NS}c')):
+                    ref = cell.get('r')
+                    index = _column_index(ref) if ref else position
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{XLSX_NS}t'))
+                    else:
+                        v = cell.find(f'{XLSX_NS}v')
+                        value = v.text if v is not None and v.text is not None else ''
+                        if kind == 's' and value:
+                            value = shared[int(value)]
+                        elif kind == 'b':
+                            value = 'Sim' if value == '1' else 'Não'
+                    row.extend([''] * (index + 1 - len(row)))
+                    row[index] = value
+                elem.clear()
+                yield row
+
+
+def read_rows(file, filename=''):
+    """
+    Lê um CSV ou XLSX (detectado pelo conteúdo) e devolve (colunas, linhas):
+    `linhas` = [(número da linha no arquivo, {coluna: texto})], sem linhas vazias.
+    """
+    raw = file.read()
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw.startswith(b'PK') or filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(raw)
+    else:
+        rows = _csv_rows(raw)
+
+    header = [normalize_header(name) for name in next(rows, [])]
+    if not any(header):
+        raise SpreadsheetError("Arquivo vazio ou sem cabeçalho.")
+    lines = []
+    for number, row in enumerate(rows, 2):
+        values = [str(value).strip() for value in row]
+        if any(values):
+            values.extend([''] * (len(header) - len(values)))
+            lines.append((number, {name: value for name, value in zip(header, values) if name}))
+    return [name for name in header if name], lines
@@ -0,0 +1,93 @@
+"""Utilitários compartilhados pelos testes dos apps (runner, planos de execução e orçamento de queries)."""
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runner do `manage.py test` (settings.TEST_RUNNER): a suíte usa cache em
+    memória do próprio processo, então o cache.clear() dos testes não apaga
+    o cache em arquivo de um servidor local.
+    """
+    cache_settings = override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'trama-tests'},
+    })
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+def _prefer_indexes():
+    # No PostgreSQL desliga o seq scan para não depender do tamanho da tabela
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+
+def query_plan(queryset):
+    """EXPLAIN da query (texto do plano)."""
+    _prefer_indexes()
+    return queryset.explain()
+
+
+def executed_plans(function, *args, table=None):
+    """
+    Roda `function(*args)` e devolve [(sql, plano)] das queries que ela
+    executou (só as que citam `table`, se informada): o teste vê o plano da
+    query de verdade, inclusive aggregate() e ordenação, e não uma cópia dela.
+    """
+    with CaptureQueriesContext(connection) as ctx:
+        function(*args)
+    _prefer_indexes()
+    explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    plans = []
+    for query in ctx.captured_queries:
+        if table and table not in query['sql']:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(explain + query['sql'])
+            plans.append((query['sql'], '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())))
+    return plans
+
+
+class QueryBudgetMixin:
+    """
+    Orçamento de queries para TestCases: o número de statements de um
+    endpoint ou operação não pode crescer com o volume de dados (N+1).
+
+    `grow(size)` (definido pelo TestCase) completa as tabelas até `size`
+    linhas; `assertQueryBudget` faz o GET em cada tamanho de SIZES.
+    """
+    SIZES = (10, 1000)
+
+    def grow(self, size):
+        raise NotImplementedError
+
+    def assertQueryBudget(self, url, expected):
+        """GET `url` com exatamente `expected` queries em cada tamanho; devolve a última resposta."""
+        for size in self.SIZES:
+            self.grow(size)
+            with self.subTest(url=url, size=size), self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertStatementsDoNotGrow(self, run, sizes, prepare=None):
+        """
+        `run(size)` faz a operação (e suas asserções); a contagem é a mesma em
+        todos os `sizes`. `prepare(size)`, se informado, roda antes e fora da contagem.
+        """
+        counts = []
+        for size in sizes:
+            if prepare:
+                prepare(size)
+            with CaptureQueriesContext(connection) as ctx:
+                run(size)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, dict(zip(sizes, counts)))
@@ -4,8 +4,9 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # Importações dos Apps
-from inventory.views import CategoryViewSet, MaterialViewSet, ProductViewSet, PurchaseViewSet
-from finance.views import PaymentMethodViewSet, SaleViewSet, FinancialTransactionViewSet, BusinessSettingsViewSet, DashboardStatsView, UserViewSet
+from inventory.views import CategoryViewSet, MaterialViewSet, ProductViewSet, PurchaseViewSet, ProductionOrderView, StockMovementViewSet, CatalogView, CatalogImportView
+from finance.views import PaymentMethodViewSet, SaleViewSet, FinancialTransactionViewSet, BusinessSettingsViewSet, DashboardStatsView, UserViewSet, dashboard_stats_async
+from core.metrics import MetricsView, SlowQueriesView
 
 # Configuração do Router Automático
 router = DefaultRouter()
@@ -15,6 +16,7 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'materials', MaterialViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'purchases', PurchaseViewSet)
+router.register(r'stock-movements', StockMovementViewSet, basename='stock-movement')
 
 # Finance
 router.register(r'payment-methods', PaymentMethodViewSet)
@@ -31,6 +33,21 @@ urlpatterns = [
     
     # Rota Manual do Dashboard (Stats)
     path('api/dashboard/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    # Mesmo Dashboard com as queries em paralelo (servidor ASGI)
+    path('api/dashboard/async/', dashboard_stats_async, name='dashboard-stats-async'),
+
+    # Ordem de Produção em lote (vários produtos)
+    path('api/production-orders/', ProductionOrderView.as_view(), name='production-orders'),
+
+    # Catálogo enxuto e versionado do PDV
+    path('api/catalog/', CatalogView.as_view(), name='catalog'),
+
+    # Importação do cadastro por planilha (materials, products, recipes)
+    path('api/imports/<str:kind>/', CatalogImportView.as_view(), name='catalog-import'),
+
+    # Métricas (Prometheus) e queries lentas
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/metrics/slow-queries/', SlowQueriesView.as_view(), name='slow-queries'),
 
     # Autenticação JWT
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
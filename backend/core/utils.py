@@ -0,0 +1,9 @@
+def parse_ids(values):
+    """Ids inteiros válidos de uma lista vinda do cliente (ignora lixo)."""
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
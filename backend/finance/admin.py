@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings
+from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings, DailySalesSummary
 
 # Permite ver os itens da venda dentro da tela da Venda no Admin
 class SaleItemInline(admin.TabularInline):
@@ -29,4 +29,10 @@ class PaymentMethodAdmin(admin.ModelAdmin):
 
 @admin.register(BusinessSettings)
 class BusinessSettingsAdmin(admin.ModelAdmin):
-    list_display = ('hourly_labor_rate',)   
\ No newline at end of file
+    list_display = ('hourly_labor_rate',)
+
+@admin.register(DailySalesSummary)
+class DailySalesSummaryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'payment_method', 'sales_count', 'gross_amount', 'fee_amount', 'net_amount')
+    list_filter = ('payment_method',)
+    date_hierarchy = 'date'
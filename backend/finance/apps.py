@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class FinanceConfig(AppConfig):
     name = 'finance'
+
+    def ready(self):
+        from core.conditional import track_versions
+        from core.metrics import register_collector
+        from . import signals  # noqa: F401
+        from .dashboard import dashboard_cache_metrics
+        from .models import BusinessSettings, DailySalesSummary, FinancialTransaction, PaymentMethod, Sale, SaleItem
+
+        track_versions(BusinessSettings, PaymentMethod)
+        # Entradas do cache do Dashboard (finance/dashboard.py)
+        track_versions(Sale, SaleItem, FinancialTransaction, DailySalesSummary)
+        register_collector(dashboard_cache_metrics)
@@ -0,0 +1,274 @@
+"""
+KPIs do Dashboard, com cache por data local.
+
+As queries ficam em grupos independentes (vendas, previsão, estoque, top
+produtos): `compute_dashboard` roda um após o outro e `acompute_dashboard`
+(view async, ASGI) roda todos ao mesmo tempo num pool limitado de threads.
+
+O payload fica no cache (CACHES) numa entrada por data local, junto com
+um digest das versões dos models que ele lê (core.conditional.model_version),
+comparado na leitura. Qualquer escrita nesses models troca a versão
+(signals ou bump_version nos UPDATEs em lote, de novo no commit) e a
+próxima leitura recalcula e sobrescreve a mesma entrada: não há dado
+velho, invalidação manual nem uma entrada nova no cache a cada venda.
+
+Os contadores de acertos/faltas ficam no cache, somados entre os workers,
+mas são aproximados: add + incr no FileBasedCache não é atômico entre
+processos e incrementos simultâneos podem se perder.
+"""
+import asyncio
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.conditional import model_version
+from inventory.models import Product
+
+from .models import DailySalesSummary, FinancialTransaction, Sale, SaleItem
+
+DASHBOARD_MODELS = (Sale, SaleItem, FinancialTransaction, DailySalesSummary, Product)
+CACHE_TIMEOUT = 60 * 60 * 24
+HITS_KEY = 'dashboard-cache:hits'
+MISSES_KEY = 'dashboard-cache:misses'
+DASHBOARD_WORKERS = 4
+
+
+def _sales_group(today):
+    """Vendas do dia/mês, listas do modal e gráfico dos últimos 7 dias."""
+    tomorrow = today + timedelta(days=1)
+    first_day_month = today.replace(day=1)
+    history_start = today - timedelta(days=6)
+
+    # --- 1. VENDAS (Resumo diário pré-calculado = Valor Bruto e Taxas) ---
+    # Lê no máximo 31 dias já somados em vez de varrer as vendas do mês
+    daily = {
+        row['date']: row
+        for row in DailySalesSummary.objects
+            .filter(date__gte=min(first_day_month, history_start), date__lt=tomorrow)
+            .values('date')
+            .annotate(gross=Sum('gross_amount'), fees=Sum('fee_amount'))
+            .order_by()
+    }
+    month_rows = [row for day, row in daily.items() if day >= first_day_month]
+
+    # Intervalos semiabertos na coluna indexada business_date
+    sales_today_qs = Sale.objects.filter(business_date__gte=today, business_date__lt=tomorrow)
+    sales_month_qs = Sale.objects.filter(business_date__gte=first_day_month, business_date__lt=tomorrow)
+
+    # --- 4. GRÁFICO (Últimos 7 dias - Vendas Brutas) ---
+    sales_history = []
+    for i in range(6, -1, -1):
+        day = today - timedelta(days=i)
+        total = daily[day]['gross'] if day in daily else 0
+        sales_history.append({"date": day.strftime("%d/%m"), "value": total})
+
+    return {
+        # Totais Brutos e taxas das formas de pagamento
+        "sales_today": daily[today]['gross'] if today in daily else 0,
+        "sales_today_fees": daily[today]['fees'] if today in daily else 0,
+        # Listas para detalhamento (Modal)
+        "sales_today_list": [
+            {
+                "id": s.id,
+                "amount": s.total_amount,
+                "description": s.created_at.astimezone().strftime('%H:%M'),
+                "sale__customer_name": s.customer_name
+            }
+            for s in sales_today_qs.order_by('-created_at')
+        ],
+        "sales_month": sum(row['gross'] for row in month_rows),
+        "sales_month_fees": sum(row['fees'] for row in month_rows),
+        "sales_month_list": [
+            {
+                "id": s.id,
+                "amount": s.total_amount,
+                "description": s.created_at.astimezone().strftime('%d/%m'),
+                "sale__customer_name": s.customer_name
+            }
+            for s in sales_month_qs.order_by('-created_at')[:10]
+        ],
+        "sales_history": sales_history,
+    }
+
+
+def _forecast_group(today):
+    # --- 2. FINANCEIRO (Previsão Futura) ---
+    return {
+        "future_in": FinancialTransaction.objects.filter(type='REVENUE', status='PENDING').aggregate(total=Sum('amount'))['total'] or 0,
+        "future_out": FinancialTransaction.objects.filter(type='EXPENSE', status='PENDING').aggregate(total=Sum('amount'))['total'] or 0,
+    }
+
+
+def _stock_group(today):
+    # --- 3. ESTOQUE ---
+    low_stock_qs = Product.objects.filter(stock_quantity__lte=5)
+    return {
+        "low_stock_count": low_stock_qs.count(),
+        "low_stock_list": list(low_stock_qs.values('id', 'name', 'stock_quantity')),
+    }
+
+
+def _top_products_group(today):
+    # --- 5. TOP PRODUTOS ---
+    top_products_qs = SaleItem.objects.filter(sale__business_date__gte=today.replace(day=1), sale__business_date__lt=today + timedelta(days=1))\
+        .values('product__name')\
+        .annotate(total_qty=Sum('quantity'))\
+        .order_by('-total_qty')[:5]
+    return {"top_products": [{"name": i['product__name'], "quantity": i['total_qty']} for i in top_products_qs]}
+
+
+# Grupos independentes de queries: a variante async roda um por thread
+DASHBOARD_GROUPS = (_sales_group, _forecast_group, _stock_group, _top_products_group)
+PAYLOAD_KEYS = (
+    "sales_today", "sales_today_fees", "sales_today_list",
+    "sales_month", "sales_month_fees", "sales_month_list",
+    "future_in", "future_out",
+    "low_stock_count", "low_stock_list",
+    "sales_history", "top_products",
+)
+
+
+def _assemble(parts):
+    merged = {}
+    for part in parts:
+        merged.update(part)
+    return {key: merged[key] for key in PAYLOAD_KEYS}
+
+
+def compute_dashboard(today):
+    """Calcula os KPIs do Dashboard para a data local `today` (sem cache), um grupo após o outro."""
+    return _assemble(group(today) for group in DASHBOARD_GROUPS)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+        return _executor
+
+
+def _run_in_worker(group, today):
+    # Cada thread do pool tem a própria conexão (reaproveitada até CONN_MAX_AGE)
+    close_old_connections()
+    try:
+        return group(today)
+    finally:
+        close_old_connections()
+
+
+async def acompute_dashboard(today):
+    """
+    Igual a compute_dashboard, com os grupos de queries rodando ao mesmo
+    tempo no pool limitado (DASHBOARD_WORKERS threads = no máximo esse
+    número de conexões extras). A latência fica perto do grupo mais lento.
+    Cada grupo lê em sua própria conexão (sem snapshot único entre grupos).
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    # copy_context: as queries das threads contam nas métricas da requisição
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(executor, contextvars.copy_context().run, _run_in_worker, group, today)
+        for group in DASHBOARD_GROUPS
+    ))
+    return _assemble(parts)
+
+
+def _cache_key(today):
+    return f'dashboard:{today.isoformat()}'
+
+
+def _versions_digest():
+    # Versões lidas ANTES do cálculo: uma escrita no meio troca o digest e a
+    # próxima leitura recalcula
+    versions = [model_version(model) for model in DASHBOARD_MODELS]
+    return hashlib.md5(repr(versions).encode()).hexdigest()
+
+
+def _cached(entry, digest):
+    """Payload da entrada do cache se ela é das versões atuais (senão None)."""
+    if entry is not None and entry[0] == digest:
+        return entry[1]
+    return None
+
+
+def _count(key):
+    # Aproximado: sem lock entre processos, incrementos simultâneos podem se perder
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass  # Chave expulsa do cache entre o add e o incr: perde uma contagem
+
+
+def dashboard_stats():
+    """
+    KPIs do dia local atual. Retorna (payload, hit) onde `hit` indica se
+    veio do cache.
+    """
+    # Timezone fix: Converte UTC para Local antes de pegar a data
+    today = timezone.localdate()
+    key = _cache_key(today)
+    digest = _versions_digest()
+    payload = _cached(cache.get(key), digest)
+    if payload is not None:
+        _count(HITS_KEY)
+        return payload, True
+
+    _count(MISSES_KEY)
+    payload = compute_dashboard(today)
+    cache.set(key, (digest, payload), CACHE_TIMEOUT)
+    return payload, False
+
+
+async def adashboard_stats():
+    """Variante async de dashboard_stats (cálculo com acompute_dashboard)."""
+    today = timezone.localdate()
+    key = _cache_key(today)
+    digest = await sync_to_async(_versions_digest)()
+    payload = _cached(await cache.aget(key), digest)
+    if payload is not None:
+        await sync_to_async(_count)(HITS_KEY)
+        return payload, True
+
+    await sync_to_async(_count)(MISSES_KEY)
+    payload = await acompute_dashboard(today)
+    await cache.aset(key, (digest, payload), CACHE_TIMEOUT)
+    return payload, False
+
+
+def dashboard_cache_stats():
+    """
+    Contadores de acertos/faltas do cache do Dashboard (desde o último reset),
+    de todos os workers. Aproximados: ver _count.
+    """
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def dashboard_cache_metrics():
+    """Contadores do cache para o /api/metrics/ (core.metrics.register_collector)."""
+    stats = dashboard_cache_stats()
+    return [
+        ('trama_dashboard_cache_hits_total', 'counter', 'Acertos do cache do Dashboard (aproximado entre workers).', stats['hits']),
+        ('trama_dashboard_cache_misses_total', 'counter', 'Faltas do cache do Dashboard (aproximado entre workers).', stats['misses']),
+        ('trama_dashboard_cache_hit_ratio', 'gauge', 'Taxa de acerto do cache do Dashboard.', f"{stats['hit_ratio']:.4f}"),
+    ]
+
+
+def reset_dashboard_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from finance.dashboard import DASHBOARD_WORKERS, acompute_dashboard, compute_dashboard
+from finance.models import DailySalesSummary, FinancialTransaction, PaymentMethod, Sale, SaleItem
+from inventory.models import Product, StockMovement
+from inventory.services import stock_movements
+
+
+def seed_dashboard_data(sales=20_000, products=500, days=60):
+    """
+    Vendas (com itens), lançamentos pendentes e produtos sintéticos nos
+    últimos `days` dias. O estoque dos produtos entra no Kardex como saldo inicial.
+    """
+    rng = random.Random(7)
+    today = timezone.localdate()
+    with transaction.atomic():
+        methods = PaymentMethod.objects.bulk_create(
+            PaymentMethod(name=name, tax_rate=Decimal(rate)) for name, rate in (('Bench Pix', '0'), ('Bench Crédito', '4.5'))
+        )
+        items = Product.objects.bulk_create(
+            (Product(name=f'Bench {i}', price=Decimal('25'), stock_quantity=rng.randint(0, 40)) for i in range(products)),
+            batch_size=500,
+        )
+        # Saldo inicial no Kardex: verify_stock_ledger continua batendo depois do seed
+        StockMovement.objects.bulk_create(
+            stock_movements(Product, {p.id: p.stock_quantity for p in items}, 'OPENING', 'Bench'),
+            batch_size=500,
+        )
+        rows = []
+        for _ in range(sales):
+            sale = Sale(total_amount=Decimal('50'), payment_method=rng.choice(methods),
+                        business_date=today - timedelta(days=rng.randrange(days)))
+            sale.apply_fees()
+            rows.append(sale)
+        rows = Sale.objects.bulk_create(rows, batch_size=500)
+        SaleItem.objects.bulk_create(
+            (SaleItem(sale=sale, product=rng.choice(items), quantity=2, unit_price=Decimal('25'), subtotal=Decimal('50'))
+             for sale in rows),
+            batch_size=500,
+        )
+        FinancialTransaction.objects.bulk_create(
+            (FinancialTransaction(description=f'Bench {i}', amount=Decimal('10'), status='PENDING',
+                                  type=rng.choice(['REVENUE', 'EXPENSE'])) for i in range(sales // 4)),
+            batch_size=500,
+        )
+        DailySalesSummary.objects.rebuild(start=today - timedelta(days=days))
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[max(int(len(timings) * 0.95) - 1, 0)],
+        'mean': statistics.fmean(timings),
+    }
+
+
+def run_benchmark(repeat=30):
+    """
+    Latência do cálculo do Dashboard (sem cache): sequencial (view síncrona)
+    x grupos em paralelo (view async). Tempos em milissegundos.
+    """
+    today = timezone.localdate()
+
+    compute_dashboard(today)  # aquece a conexão e o cache de páginas do banco
+    sync_timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compute_dashboard(today)
+        sync_timings.append((time.perf_counter() - started) * 1000)
+
+    async def measure():
+        await acompute_dashboard(today)  # abre as conexões das threads do pool
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await acompute_dashboard(today)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    async_timings = asyncio.run(measure())
+    return {'sync': _summary(sync_timings), 'async': _summary(async_timings)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a latência do Dashboard síncrono (queries em sequência) com a "
+        "variante async (grupos em paralelo). --seed grava dados sintéticos: "
+        "use um banco descartável (DATABASE_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Vendas sintéticas a criar antes de medir.")
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed_dashboard_data(options['seed'])
+            self.stdout.write(f"{options['seed']} vendas sintéticas criadas.")
+
+        r = run_benchmark(options['repeat'])
+        self.stdout.write(f"Banco: {connection.vendor} | {Sale.objects.count()} vendas | pool: {DASHBOARD_WORKERS} threads")
+        for name, label in (('sync', 'Síncrono'), ('async', 'Async   ')):
+            t = r[name]
+            self.stdout.write(f"{label}: p50 {t['p50']:.1f} ms | p95 {t['p95']:.1f} ms | média {t['mean']:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Ganho (p50): {r['sync']['p50'] / r['async']['p50']:.2f}x"))
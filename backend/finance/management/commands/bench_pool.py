@@ -0,0 +1,124 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from rest_framework.test import APIClient
+
+PROFILES = (('off', 'Sem pool (CONN_MAX_AGE)'), ('on', 'Pool do Django (psycopg_pool)'))
+PATHS = ('/api/payment-methods/', '/api/catalog/', '/api/dashboard/')
+
+
+def _server_connections():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()")
+        return cursor.fetchone()[0]
+
+
+def run_load(bursts=30, burst_size=16, pause=0.05):
+    """
+    Tráfego em rajadas como num servidor com uma thread por requisição
+    (runserver, waitress, gthread recriando threads): cada requisição da
+    rajada roda numa thread nova, que sem pool abre a própria conexão.
+
+    Retorna latências (ms) p50/p95/p99, requisições por segundo, erros e o
+    maior número de conexões vistas no banco (pg_stat_activity).
+    """
+    user, _ = User.objects.get_or_create(username='bench-pool')
+    timings, errors = [], []
+    peak = _server_connections()
+    connection.close()
+    lock = threading.Lock()
+
+    def request(path):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        started = time.perf_counter()
+        try:
+            response = client.get(path)
+            status = response.status_code
+        except Exception:
+            status = 'exception'
+        finally:
+            # O que o request_finished faz num servidor de verdade (o cliente de
+            # teste desliga): com pool devolve a conexão; sem pool ela continua
+            # aberta (CONN_MAX_AGE) e a thread morre com ela
+            close_old_connections()
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            timings.append(elapsed)
+            if status != 200:
+                errors.append(status)
+
+    started = time.perf_counter()
+    for burst in range(bursts):
+        workers = [threading.Thread(target=request, args=(PATHS[(burst + i) % len(PATHS)],)) for i in range(burst_size)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        peak = max(peak, _server_connections())
+        connection.close()
+        time.sleep(pause)
+    elapsed = time.perf_counter() - started - bursts * pause
+
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 2),
+        'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 2),
+        'rps': round(len(timings) / elapsed, 1),
+        'errors': len(errors),
+        'peak_connections': peak,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga em rajadas no PostgreSQL com e sem o pool de conexões "
+        "(DB_POOL=on/off em core/settings.py): p50/p95/p99, vazão e pico de "
+        "conexões no banco. Use um Postgres local/descartável em DATABASE_URL "
+        "(ex.: docker run postgres) já migrado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bursts', type=int, default=30)
+        parser.add_argument('--burst-size', type=int, default=16, help="Requisições simultâneas por rajada.")
+        parser.add_argument('--run', action='store_true', help="Interno: mede só o perfil atual e imprime JSON.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Este benchmark é do PostgreSQL (DATABASE_URL aponta para outro banco).")
+        if options['run']:
+            self.stdout.write(json.dumps(run_load(options['bursts'], options['burst_size'])))
+            return
+
+        # Um processo por perfil: o pool é configurado no settings ao iniciar
+        results = {}
+        for profile, label in PROFILES:
+            self.stdout.write(f"{label} (DB_POOL={profile})...")
+            output = subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_pool', '--run',
+                 '--bursts', str(options['bursts']), '--burst-size', str(options['burst_size'])],
+                env={**os.environ, 'DB_POOL': profile}, check=True, capture_output=True, text=True,
+            )
+            r = results[profile] = json.loads(output.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"  {r['requests']} requisições | p50 {r['p50_ms']:.1f} ms | p95 {r['p95_ms']:.1f} ms | "
+                f"p99 {r['p99_ms']:.1f} ms | {r['rps']:.1f} req/s | erros: {r['errors']} | "
+                f"pico de conexões: {r['peak_connections']}"
+            )
+
+        before, after = results['off'], results['on']
+        self.stdout.write(self.style.SUCCESS(
+            f"p95: {before['p95_ms']:.1f} -> {after['p95_ms']:.1f} ms | "
+            f"conexões: {before['peak_connections']} -> {after['peak_connections']}"
+        ))
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = (('off', 'Padrão do Django'), ('on', 'Perfil de produção'))
+
+
+def run_profile(profile, threads, attempts, readers, retries=True):
+    """
+    Roda o stress_sales num banco SQLite novo (arquivo temporário) com
+    SQLITE_TUNING=<profile>. Processo separado: o perfil vale a partir da
+    conexão e o WAL fica gravado no arquivo, então cada lado começa do zero.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+            'CACHE_DIR': os.path.join(tmp, 'cache'),
+            'SQLITE_TUNING': profile,
+        }
+        manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+        subprocess.run(manage + ['migrate', '-v0'], env=env, check=True)
+        output = subprocess.run(
+            manage + ['stress_sales', '--json', '--threads', str(threads), '--attempts', str(attempts),
+                      '--stock', str(threads * attempts), '--readers', str(readers)],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Concorrência no SQLite: várias threads vendendo (e lendo o Dashboard) "
+        "com o padrão do Django x o perfil de produção de core/settings.py "
+        "(WAL, busy_timeout, BEGIN IMMEDIATE). Usa bancos temporários."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=40, help="Vendas por thread.")
+        parser.add_argument('--readers', type=int, default=2, help="Threads lendo o Dashboard ao mesmo tempo.")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("Este benchmark é do SQLite (DATABASE_URL aponta para outro banco).")
+
+        results = {}
+        for profile, label in PROFILES:
+            self.stdout.write(f"{label} (SQLITE_TUNING={profile})...")
+            r = results[profile] = run_profile(profile, options['threads'], options['attempts'], options['readers'])
+            self.stdout.write(
+                f"  {r['sold']} vendas em {r['elapsed']:.2f}s = {r['sales_per_second']:.1f} vendas/s | "
+                f"\"database is locked\" (500 repetidos): {r['retries']} | erros finais: {r['errors']} | "
+                f"leituras: {r['reads_per_second']:.1f}/s ({r['read_errors']} erros)"
+            )
+            if r['oversold']:
+                self.stderr.write(self.style.ERROR("  FALHA: estoque vendido acima do disponível."))
+
+        before, after = results['off'], results['on']
+        ratio = after['sales_per_second'] / before['sales_per_second'] if before['sales_per_second'] else float('inf')
+        self.stdout.write(self.style.SUCCESS(
+            f"Vendas/s: {before['sales_per_second']:.1f} -> {after['sales_per_second']:.1f} ({ratio:.2f}x) | "
+            f"locks: {before['retries'] + before['errors']} -> {after['retries'] + after['errors']}"
+        ))
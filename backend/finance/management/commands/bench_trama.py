@@ -0,0 +1,208 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.conditional import bump_version
+from finance.models import PaymentMethod, Sale
+from inventory.models import Material, Product, ProductComposition
+from inventory.services import increment_stock, record_movements
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[max(int(round(len(values) * fraction)) - 1, 0)]
+
+
+def _server_timing_db(response):
+    """Tempo de banco medido pelo MetricsMiddleware (header Server-Timing), em ms."""
+    for part in response.get('Server-Timing', '').split(', '):
+        if part.startswith('db;dur='):
+            return float(part.split(';')[1][4:])
+    return None
+
+
+class Scenarios:
+    """
+    Cenários sobre os endpoints reais (APIClient, mesmo caminho de uma
+    requisição: middleware, autenticação, serializers, renderer).
+    Cada cenário: (nome, status esperado, função que faz a requisição).
+    """
+
+    def __init__(self, client, repeat):
+        self.client = client
+        today = timezone.localdate()
+        self.month = {'start_date': (today - timedelta(days=30)).isoformat(), 'end_date': today.isoformat()}
+
+        self.method = PaymentMethod.objects.order_by('id').first() or PaymentMethod.objects.create(name='Pix')
+        products = list(Product.objects.order_by('id')[:3])
+        material = Material.objects.order_by('id').first()
+        if not products or material is None:
+            raise CommandError("Banco sem produtos/materiais: rode antes `manage.py seed_trama`.")
+        self.products = products
+        self.material = material
+        made = ProductComposition.objects.values('product').annotate(n=Count('id')).order_by('product').first()
+        self.produced = made['product'] if made else products[0].id
+
+        # Reposição fora da medição: vendas e produção não param por falta de estoque
+        runs = repeat + 10
+        demand = {product.id: runs for product in products}
+        increment_stock(Product, demand)
+        record_movements(Product, demand, 'ADJUSTMENT', 'bench_trama')
+        needed = {
+            material_id: quantity * runs
+            for material_id, quantity in ProductComposition.objects.filter(product_id=self.produced)
+            .values_list('material_id', 'quantity')
+        }
+        increment_stock(Material, needed)
+        record_movements(Material, needed, 'ADJUSTMENT', 'bench_trama')
+
+    def sale(self):
+        items = [{'product_id': p.id, 'quantity': 1, 'unit_price': str(p.price)} for p in self.products]
+        total = sum(p.price for p in self.products)
+        return self.client.post('/api/sales/', {
+            'total_amount': str(total), 'payment_method': self.method.id, 'items': items,
+        }, format='json')
+
+    def purchase(self):
+        return self.client.post('/api/purchases/', {
+            'supplier': 'Bench', 'freight_cost': '10.00',
+            'items': [{'material_id': self.material.id, 'quantity': '5', 'unit_cost': str(self.material.current_cost or 1)}],
+        }, format='json')
+
+    def dashboard_cold(self):
+        bump_version(Sale)  # invalida o cache do Dashboard: mede o cálculo
+        return self.client.get('/api/dashboard/')
+
+    def export(self):
+        response = self.client.get('/api/sales/export/', self.month)
+        b''.join(response.streaming_content)
+        return response
+
+    def all(self):
+        get = self.client.get
+        return [
+            ('dashboard (sem cache)', 200, self.dashboard_cold),
+            ('dashboard (cache)', 200, lambda: get('/api/dashboard/')),
+            ('pdv: criar venda', 201, self.sale),
+            ('compra: criar', 201, self.purchase),
+            ('produção', 200, lambda: self.client.post(f'/api/products/{self.produced}/produce/', {'quantity': 1}, format='json')),
+            ('lista: vendas', 200, lambda: get('/api/sales/')),
+            ('lista: lançamentos', 200, lambda: get('/api/transactions/')),
+            ('lista: compras', 200, lambda: get('/api/purchases/')),
+            ('lista: produtos', 200, lambda: get('/api/products/')),
+            ('lista: kardex', 200, lambda: get('/api/stock-movements/')),
+            ('pdv: catálogo', 200, lambda: get('/api/catalog/')),
+            ('pdv: busca', 200, lambda: get('/api/products/search/', {'q': 'colar'})),
+            ('export: vendas 30 dias', 200, self.export),
+        ]
+
+
+def run_bench(repeat=20, warmup=2, only=None):
+    """
+    Roda os cenários `repeat` vezes cada (depois de `warmup` rodadas sem
+    medir) e devolve o relatório: latência p50/p95/média em ms, queries e
+    tempo de banco por requisição e vazão (requisições por segundo, um
+    cliente). As escritas (vendas, compras, produção) ficam gravadas.
+    """
+    user, _ = User.objects.get_or_create(username='bench-trama')
+    client = APIClient()
+    client.force_authenticate(user)
+    scenarios = Scenarios(client, repeat + warmup)
+
+    results = {}
+    for name, expected, request in scenarios.all():
+        if only and not any(word in name for word in only):
+            continue
+        timings, queries, db_times, errors = [], [], [], 0
+        for run in range(warmup + repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = request()
+                elapsed = (time.perf_counter() - started) * 1000
+            if run < warmup:
+                continue
+            if response.status_code != expected:
+                errors += 1
+            timings.append(elapsed)
+            queries.append(len(ctx.captured_queries))
+            db = _server_timing_db(response)
+            if db is not None:
+                db_times.append(db)
+        results[name] = {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(_percentile(timings, 0.95), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'db_p50_ms': round(statistics.median(db_times), 2) if db_times else None,
+            'queries': max(queries),
+            'rps': round(len(timings) / (sum(timings) / 1000), 1),
+            'errors': errors,
+        }
+
+    return {
+        'meta': {
+            'at': timezone.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': repeat,
+            'sales': Sale.objects.count(),
+            'products': Product.objects.count(),
+        },
+        'scenarios': results,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ponta a ponta dos endpoints (Dashboard, venda no PDV, compra, "
+        "produção, listas, catálogo, busca e exportação) pelo cliente de teste do "
+        "DRF. Grava p50/p95, queries e vazão em JSON; --compare mostra a variação "
+        "contra uma rodada anterior. Grava vendas/compras: use a base do seed_trama."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', help="Só os cenários cujo nome contém estas palavras.")
+        parser.add_argument('--output', default='bench_trama.json', help="Arquivo JSON do relatório.")
+        parser.add_argument('--compare', help="Relatório anterior (JSON) para comparar.")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat precisa ser maior que zero.")
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    previous = json.load(f)['scenarios']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Não foi possível ler {options['compare']}: {e}")
+
+        report = run_bench(options['repeat'], options['warmup'], options['only'])
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        meta = report['meta']
+        self.stdout.write(f"Banco: {meta['database']} | {meta['sales']} vendas | {meta['products']} produtos | {meta['repeat']} rodadas")
+        self.stdout.write(f"{'cenário':<24} {'p50 ms':>8} {'p95 ms':>8} {'db ms':>7} {'queries':>7} {'req/s':>7}")
+        for name, r in report['scenarios'].items():
+            line = (f"{name:<24} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['db_p50_ms'] or 0:>7.1f} "
+                    f"{r['queries']:>7} {r['rps']:>7.1f}")
+            if previous and name in previous:
+                change = (r['p50_ms'] - previous[name]['p50_ms']) / previous[name]['p50_ms'] * 100
+                line += f"  ({change:+.0f}% p50)"
+            if r['errors']:
+                line += self.style.ERROR(f"  {r['errors']} erros")
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['output']}."))
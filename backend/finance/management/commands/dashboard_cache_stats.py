@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from finance.dashboard import dashboard_cache_stats, reset_dashboard_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra os acertos/faltas do cache do Dashboard (contadores no CACHES, "
+        "somados entre os workers; aproximados sob concorrência)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zera os contadores depois de mostrar.")
+
+    def handle(self, *args, **options):
+        stats = dashboard_cache_stats()
+        self.stdout.write(
+            f"Acertos: {stats['hits']} | Faltas: {stats['misses']} | Taxa de acerto: {stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_dashboard_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Contadores zerados."))
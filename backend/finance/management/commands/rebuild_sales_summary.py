@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.models import DailySalesSummary
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo diário de vendas (DailySalesSummary) a partir das vendas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="Data inicial (AAAA-MM-DD). Padrão: todo o histórico.")
+        parser.add_argument('--end', help="Data final (AAAA-MM-DD), inclusiva.")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Data inválida: {e}")
+
+        rows = DailySalesSummary.objects.rebuild(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f"Resumo diário reconstruído: {rows} linhas."))
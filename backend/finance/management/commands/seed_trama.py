@@ -0,0 +1,260 @@
+import random
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.conditional import bump_version
+from finance.models import BusinessSettings, DailySalesSummary, FinancialTransaction, PaymentMethod, Sale, SaleItem
+from finance.services import revenue_transaction
+from inventory.models import (
+    Category, Material, Product, ProductComposition, Purchase, PurchaseItem, StockMovement
+)
+from inventory.services import create_checkpoint, refresh_product_costs, stock_movements, touch_catalog
+
+SKU_PREFIX = 'SEED-'
+BATCH_SIZE = 1000
+
+CATEGORIES = ['Bolsas', 'Colares', 'Brincos', 'Pulseiras', 'Anéis', 'Chaveiros',
+              'Tiaras', 'Necessaires', 'Carteiras', 'Tapetes', 'Almofadas', 'Amigurumis']
+MATERIALS = [
+    ('Fio de Algodão', 'MT', '0.12'), ('Barbante', 'MT', '0.08'), ('Couro Sintético', 'MT', '18.00'),
+    ('Tecido Tricoline', 'MT', '22.00'), ('Miçanga', 'UN', '0.05'), ('Pérola Shell', 'UN', '0.40'),
+    ('Fecho Lagosta', 'UN', '0.35'), ('Argola', 'UN', '0.10'), ('Zíper', 'UN', '1.20'),
+    ('Linha Encerada', 'MT', '0.15'), ('Enchimento', 'KG', '24.00'), ('Cola Instantânea', 'LT', '60.00'),
+    ('Resina', 'LT', '85.00'), ('Pingente', 'UN', '2.50'), ('Alça', 'UN', '6.00'), ('Botão', 'UN', '0.30'),
+]
+COLORS = ['Azul', 'Rosa', 'Preto', 'Branco', 'Verde', 'Dourado', 'Prata', 'Terracota', 'Lilás', 'Natural']
+STYLES = ['Clássico', 'Boho', 'Minimal', 'Floral', 'Praia', 'Festa', 'Vintage', 'Geométrico']
+PAYMENT_METHODS = [('Pix', '0.00', 40), ('Dinheiro', '0.00', 15), ('Débito', '1.99', 20), ('Crédito', '4.99', 25)]
+CUSTOMERS = ['Ana', 'Beatriz', 'Carla', 'Daniela', 'Eduarda', 'Fernanda', 'Gabriela', 'Helena', 'Isabela', 'Juliana']
+SUPPLIERS = ['Armarinho Central', 'Distribuidora Fios & Cia', 'Atacado das Pedras', 'Casa do Artesão']
+EXPENSES = [('Aluguel do ateliê', '1800.00'), ('Energia elétrica', '220.00'), ('Internet', '120.00'),
+            ('Taxa da feira', '350.00'), ('Embalagens', '180.00')]
+# Movimento por dia da semana (segunda = 0): fim de semana de feira
+WEEKDAY_WEIGHTS = [0.7, 0.8, 0.8, 0.9, 1.2, 1.8, 1.1]
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def _set_created_at(model, field, days):
+    """auto_now_add ignora o valor do bulk_create: ajusta o created_at por dia (meio-dia local)."""
+    tz = timezone.get_current_timezone()
+    for day in sorted(days):
+        moment = timezone.make_aware(datetime.combine(day, time(12)), tz)
+        model.objects.filter(**{field: day}).update(created_at=moment)
+
+
+def seed_trama(materials=60, products=1500, sales=20_000, purchases=1000, years=3, seed=42, log=None):
+    """
+    Gera uma base sintética determinística (mesma `seed` e parâmetros =
+    mesmos dados): categorias, materiais, produtos com ficha técnica e
+    custos, compras, vendas com itens, lançamentos (receitas das vendas e
+    despesas mensais, com pendentes no futuro), Kardex, resumo diário e
+    checkpoint de estoque, espalhados pelos últimos `years` anos.
+
+    Tudo numa transação, em lotes. Retorna a contagem por tabela.
+    """
+    if Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+        raise CommandError("Já existem dados sintéticos neste banco (SKUs SEED-): use um banco novo.")
+
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    start = today - timedelta(days=365 * years)
+    days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+
+    with transaction.atomic():
+        if not BusinessSettings.objects.exists():
+            BusinessSettings.objects.create(hourly_labor_rate=Decimal('30'))
+        hourly_rate = BusinessSettings.objects.first().hourly_labor_rate
+        methods = PaymentMethod.objects.bulk_create(
+            PaymentMethod(name=f'{name} (seed)', tax_rate=Decimal(rate)) for name, rate, _ in PAYMENT_METHODS
+        )
+        method_weights = [weight for _, _, weight in PAYMENT_METHODS]
+        categories = Category.objects.bulk_create(Category(name=name) for name in CATEGORIES)
+
+        # --- Materiais ---
+        material_rows = []
+        for i in range(materials):
+            name, unit, cost = MATERIALS[i % len(MATERIALS)]
+            variant = COLORS[(i // len(MATERIALS)) % len(COLORS)]
+            suffix = f' {i // (len(MATERIALS) * len(COLORS)) + 1}' if i >= len(MATERIALS) * len(COLORS) else ''
+            material_rows.append(Material(
+                name=f'{name} {variant}{suffix}', unit=unit,
+                current_cost=_money(Decimal(cost) * Decimal(rng.uniform(0.8, 1.25))),
+            ))
+        material_rows = Material.objects.bulk_create(material_rows, batch_size=BATCH_SIZE)
+        log(f"{len(material_rows)} materiais")
+
+        # --- Produtos e fichas técnicas ---
+        product_rows = []
+        recipes = []
+        for i in range(products):
+            category = categories[i % len(categories)]
+            recipe = {}
+            for material in rng.sample(material_rows, min(rng.randint(2, 6), len(material_rows))):
+                per_unit = {'UN': rng.randint(1, 30), 'MT': rng.uniform(0.2, 40), 'KG': rng.uniform(0.05, 0.4),
+                            'LT': rng.uniform(0.01, 0.1)}[material.unit]
+                recipe[material] = Decimal(per_unit).quantize(Decimal('0.001'))
+            minutes = rng.choice([15, 20, 30, 45, 60, 90, 120])
+            margin = Decimal(rng.choice([40, 60, 80, 100, 120]))
+            cost = sum(q * m.current_cost for m, q in recipe.items()) + Decimal(minutes) / 60 * hourly_rate
+            # Preço "redondo" (x9,90) perto do sugerido pelo markup
+            price = max(_money(cost * (1 + margin / 100) / 10).to_integral_value() * 10 - Decimal('0.10'), Decimal('9.90'))
+            product_rows.append(Product(
+                name=f'{category.name[:-1] if category.name.endswith("s") else category.name} '
+                     f'{rng.choice(STYLES)} {rng.choice(COLORS)} {i + 1}',
+                sku=f'{SKU_PREFIX}{i + 1:06d}', category=category, price=price,
+                labor_time_minutes=minutes, profit_margin=margin,
+            ))
+            recipes.append(recipe)
+        product_rows = Product.objects.bulk_create(product_rows, batch_size=BATCH_SIZE)
+        ProductComposition.objects.bulk_create(
+            (ProductComposition(product=product, material=material, quantity=quantity)
+             for product, recipe in zip(product_rows, recipes) for material, quantity in recipe.items()),
+            batch_size=BATCH_SIZE,
+        )
+        log(f"{len(product_rows)} produtos")
+
+        # --- Compras de material ---
+        purchased = Counter()
+        purchase_days = sorted(rng.choices(days, k=purchases))
+        purchase_rows = Purchase.objects.bulk_create(
+            (Purchase(supplier=rng.choice(SUPPLIERS), date=day, freight_cost=_money(rng.choice([0, 0, 15, 25, 40])))
+             for day in purchase_days),
+            batch_size=BATCH_SIZE,
+        )
+        purchase_items = []
+        movements = []
+        for purchase in purchase_rows:
+            subtotal = Decimal(0)
+            for material in rng.sample(material_rows, min(rng.randint(1, 5), len(material_rows))):
+                quantity = Decimal(rng.randint(1, 20) * (50 if material.unit == 'MT' else 10 if material.unit == 'UN' else 1))
+                purchase_items.append(PurchaseItem(
+                    purchase=purchase, material=material, quantity=quantity,
+                    unit_cost=material.current_cost, effective_unit_cost=material.current_cost,
+                ))
+                subtotal += quantity * material.current_cost
+                purchased[material.id] += quantity
+                movement, = stock_movements(Material, {material.id: quantity}, 'PURCHASE', f'Compra #{purchase.id}')
+                movement.date = purchase.date
+                movements.append(movement)
+            purchase.total_amount = subtotal + purchase.freight_cost
+        Purchase.objects.bulk_update(purchase_rows, ['total_amount'], batch_size=BATCH_SIZE)
+        PurchaseItem.objects.bulk_create(purchase_items, batch_size=BATCH_SIZE)
+        log(f"{len(purchase_rows)} compras")
+
+        # --- Vendas (crescimento ao longo dos anos, picos no fim de semana, produtos "campeões") ---
+        day_weights = [(1 + i / len(days)) * WEEKDAY_WEIGHTS[day.weekday()] for i, day in enumerate(days)]
+        popularity = [1 / (rank + 1) ** 0.8 for rank in range(len(product_rows))]
+        sale_rows = []
+        baskets = []
+        for day in sorted(rng.choices(days, weights=day_weights, k=sales)):
+            basket = Counter(rng.choices(product_rows, weights=popularity, k=rng.choice([1, 1, 1, 2, 2, 3])))
+            sale = Sale(
+                business_date=day, payment_method=rng.choices(methods, weights=method_weights)[0],
+                customer_name=rng.choice(CUSTOMERS) if rng.random() < 0.4 else 'Consumidor Final',
+                total_amount=sum(product.price * quantity for product, quantity in basket.items()),
+            )
+            sale.apply_fees()
+            sale_rows.append(sale)
+            baskets.append(basket)
+        sale_rows = Sale.objects.bulk_create(sale_rows, batch_size=BATCH_SIZE)
+
+        sold = Counter()
+        sale_items = []
+        for sale, basket in zip(sale_rows, baskets):
+            for product, quantity in basket.items():
+                sale_items.append(SaleItem(sale=sale, product=product, quantity=quantity,
+                                      unit_price=product.price, subtotal=product.price * quantity))
+                sold[product.id] += quantity
+                movement, = stock_movements(Product, {product.id: quantity}, 'SALE', f'Venda #{sale.id}', sign=-1)
+                movement.date = sale.business_date
+                movements.append(movement)
+        SaleItem.objects.bulk_create(sale_items, batch_size=BATCH_SIZE)
+        log(f"{len(sale_rows)} vendas ({len(sale_items)} itens)")
+
+        # --- Financeiro: receitas das vendas + despesas mensais (as futuras ficam pendentes) ---
+        transactions = [revenue_transaction(sale) for sale in sale_rows]
+        month = start.replace(day=1)
+        horizon = today + timedelta(days=90)
+        while month <= horizon:
+            for description, amount in EXPENSES:
+                due = month.replace(day=10)
+                transactions.append(FinancialTransaction(
+                    description=f'{description} {month:%m/%Y}', type='EXPENSE',
+                    amount=_money(Decimal(amount) * Decimal(rng.uniform(0.9, 1.1))),
+                    date=due, due_date=due, status='PAID' if due <= today else 'PENDING',
+                ))
+            month = (month + timedelta(days=32)).replace(day=1)
+        FinancialTransaction.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+        log(f"{len(transactions)} lançamentos")
+
+        # --- Estoque: saldo inicial + compras/vendas = saldo atual ---
+        for material in material_rows:
+            opening = Decimal(rng.randint(0, 200))
+            material.stock_quantity = opening + purchased[material.id]
+            if opening:
+                movement, = stock_movements(Material, {material.id: opening}, 'OPENING', 'Seed')
+                movement.date = start
+                movements.append(movement)
+        for product in product_rows:
+            final = Decimal(rng.randint(0, 40))
+            product.stock_quantity = final
+            opening = final + sold[product.id]
+            if opening:
+                movement, = stock_movements(Product, {product.id: opening}, 'OPENING', 'Seed')
+                movement.date = start
+                movements.append(movement)
+        Material.objects.bulk_update(material_rows, ['stock_quantity'], batch_size=BATCH_SIZE)
+        Product.objects.bulk_update(product_rows, ['stock_quantity'], batch_size=BATCH_SIZE)
+        StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+        log(f"{len(movements)} movimentos de estoque")
+
+        refresh_product_costs(products=product_rows)
+        _set_created_at(Sale, 'business_date', {sale.business_date for sale in sale_rows})
+        DailySalesSummary.objects.rebuild(start=start)
+        create_checkpoint(today.replace(day=1) - timedelta(days=1))
+        touch_catalog(product.id for product in product_rows)
+        bump_version(Category, Material, Product, ProductComposition, Purchase, PurchaseItem,
+                     Sale, SaleItem, FinancialTransaction, PaymentMethod, BusinessSettings)
+
+    return {
+        'materials': len(material_rows), 'products': len(product_rows), 'purchases': len(purchase_rows),
+        'sales': len(sale_rows), 'sale_items': len(sale_items), 'transactions': len(transactions),
+        'movements': len(movements),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera uma base sintética determinística em escala de produção (materiais, "
+        "produtos com ficha técnica, compras, vendas e lançamentos espalhados por "
+        "anos). Grava no banco configurado: use um banco descartável (DATABASE_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--materials', type=int, default=60)
+        parser.add_argument('--products', type=int, default=1500)
+        parser.add_argument('--sales', type=int, default=20_000)
+        parser.add_argument('--purchases', type=int, default=1000)
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42, help="Mesma semente = mesmos dados.")
+
+    def handle(self, *args, **options):
+        if min(options['materials'], options['products'], options['years']) < 1:
+            raise CommandError("--materials, --products e --years precisam ser maiores que zero.")
+        counts = seed_trama(
+            materials=options['materials'], products=options['products'], sales=options['sales'],
+            purchases=options['purchases'], years=options['years'], seed=options['seed'],
+            log=lambda message: self.stdout.write(f"  {message}"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Base sintética criada: " + ', '.join(f"{count} {name}" for name, count in counts.items())
+        ))
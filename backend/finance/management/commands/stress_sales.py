@@ -0,0 +1,145 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from finance.models import PaymentMethod, SaleItem
+from inventory.models import Product
+
+
+def run_stress(threads=8, attempts=50, stock=100, retries=100, readers=0):
+    """
+    Vários "caixas" (threads, cada um com sua conexão) vendendo o mesmo
+    produto ao mesmo tempo pelo endpoint real de vendas. `readers` threads
+    abrem o Dashboard em loop enquanto isso (leituras concorrentes).
+
+    Retorna o resumo com vendas aceitas/recusadas, vendas por segundo,
+    leituras e o saldo final do produto, que precisa fechar com o que foi
+    vendido. `retries` conta os 500 (ex.: "database is locked") repetidos.
+    """
+    user, _ = User.objects.get_or_create(username='stress-pdv')
+    method, _ = PaymentMethod.objects.get_or_create(name='Stress')
+    product = Product.objects.create(name=f'Stress {time.time_ns()}', price=Decimal('1'), stock_quantity=stock)
+    payload = {
+        'total_amount': '1.00',
+        'payment_method': method.id,
+        'items': [{'product_id': product.id, 'quantity': 1, 'unit_price': '1.00'}],
+    }
+
+    results = {'sold': 0, 'rejected': 0, 'errors': 0, 'retries': 0, 'reads': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + readers)
+    selling = threading.Event()
+
+    def cashier():
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            for _ in range(attempts):
+                # Mesma chave nas retentativas: uma venda gravada nunca é repetida
+                attempt = {**payload, 'idempotency_key': uuid.uuid4().hex}
+                for _ in range(retries):
+                    response = client.post('/api/sales/', attempt, format='json')
+                    if response.status_code != 500:
+                        break
+                    # Erro transitório do banco (ex.: SQLite "database is locked"): tenta de novo
+                    with lock:
+                        results['retries'] += 1
+                    time.sleep(0.005)
+                key = {200: 'sold', 201: 'sold', 400: 'rejected'}.get(response.status_code, 'errors')
+                with lock:
+                    results[key] += 1
+        finally:
+            connection.close()
+
+    def reader():
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            while selling.is_set():
+                key = 'reads' if client.get('/api/dashboard/').status_code == 200 else 'read_errors'
+                with lock:
+                    results[key] += 1
+        finally:
+            connection.close()
+
+    # 400 (sem estoque) e 500 (retentativa) são esperados aqui: não polui o log
+    loggers = [logging.getLogger(name) for name in ('django.request', 'finance.views')]
+    previous_levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL)
+
+    workers = [threading.Thread(target=cashier) for _ in range(threads)]
+    watchers = [threading.Thread(target=reader) for _ in range(readers)]
+    selling.set()
+    started = time.perf_counter()
+    try:
+        for worker in workers + watchers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        selling.clear()
+        for watcher in watchers:
+            watcher.join()
+    finally:
+        selling.clear()
+        for logger, level in zip(loggers, previous_levels):
+            logger.setLevel(level)
+
+    product.refresh_from_db()
+    items_sold = SaleItem.objects.filter(product=product).aggregate(q=Sum('quantity'))['q'] or 0
+    results.update({
+        'product_id': product.id,
+        'initial_stock': stock,
+        'final_stock': product.stock_quantity,
+        'items_sold': items_sold,
+        'elapsed': elapsed,
+        'sales_per_second': results['sold'] / elapsed if elapsed else 0,
+        'reads_per_second': results['reads'] / elapsed if elapsed else 0,
+        'oversold': product.stock_quantity < 0 or items_sold > stock or stock - items_sold != product.stock_quantity,
+    })
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do PDV: várias threads vendendo o mesmo produto. "
+        "Confere que não há venda acima do estoque e mostra vendas/segundo. "
+        "Grava vendas de teste: use um banco descartável (DATABASE_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=50, help="Vendas tentadas por thread.")
+        parser.add_argument('--stock', type=int, default=100, help="Estoque inicial do produto.")
+        parser.add_argument('--readers', type=int, default=0, help="Threads abrindo o Dashboard durante as vendas.")
+        parser.add_argument('--json', action='store_true', help="Só o resumo em JSON (usado pelo bench_sqlite).")
+
+    def handle(self, *args, **options):
+        r = run_stress(options['threads'], options['attempts'], options['stock'], readers=options['readers'])
+        if options['json']:
+            self.stdout.write(json.dumps({**r, 'final_stock': str(r['final_stock']), 'items_sold': int(r['items_sold'])}))
+            return
+        self.stdout.write(
+            f"Vendidas: {r['sold']} | Recusadas (sem estoque): {r['rejected']} | Erros: {r['errors']} "
+            f"| Retentativas: {r['retries']}"
+        )
+        self.stdout.write(f"Estoque: {r['initial_stock']} -> {r['final_stock']} (itens vendidos: {r['items_sold']})")
+        self.stdout.write(f"Tempo: {r['elapsed']:.2f}s | {r['sales_per_second']:.1f} vendas/s")
+        if options['readers']:
+            self.stdout.write(f"Leituras do Dashboard: {r['reads']} ({r['reads_per_second']:.1f}/s) | Erros: {r['read_errors']}")
+        if r['oversold']:
+            self.stderr.write(self.style.ERROR("FALHA: estoque vendido acima do disponível."))
+        else:
+            self.stdout.write(self.style.SUCCESS("OK: nenhuma venda acima do estoque."))
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-17 20:53
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def populate_summary(apps, schema_editor):
+    """Gera o resumo diário para as vendas já existentes."""
+    Sale = apps.get_model('finance', 'Sale')
+    DailySalesSummary = apps.get_model('finance', 'DailySalesSummary')
+
+    fee_expr = F('total_amount') * Coalesce(F('payment_method__tax_rate'), Value(Decimal(0))) * Value(Decimal('0.01'))
+    rows = Sale.objects.annotate(day=TruncDate('created_at'))\
+        .values('day', 'payment_method')\
+        .annotate(
+            gross=Sum('total_amount'),
+            fees=Sum(fee_expr, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            count=Count('id'),
+        ).order_by()
+
+    objs = []
+    for row in rows:
+        gross = row['gross'] or Decimal(0)
+        fee = Decimal(row['fees'] or 0).quantize(Decimal('0.01'))
+        objs.append(DailySalesSummary(
+            date=row['day'],
+            payment_method_id=row['payment_method'],
+            gross_amount=gross,
+            fee_amount=fee,
+            net_amount=gross - fee,
+            sales_count=row['count'],
+        ))
+    DailySalesSummary.objects.bulk_create(objs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_paymentmethod_tax_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fee_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='finance.paymentmethod')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'payment_method'), name='unique_daily_sales_summary')],
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-17 20:54
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_fees(apps, schema_editor):
+    """Calcula taxa e valor líquido das vendas antigas com a taxa atual da forma de pagamento."""
+    Sale = apps.get_model('finance', 'Sale')
+    DailySalesSummary = apps.get_model('finance', 'DailySalesSummary')
+
+    batch = []
+    for sale in Sale.objects.select_related('payment_method').iterator(chunk_size=1000):
+        method = sale.payment_method
+        sale.tax_rate = method.tax_rate if method and method.tax_rate else Decimal(0)
+        sale.fee_amount = (sale.total_amount * sale.tax_rate / Decimal(100)).quantize(Decimal('0.01'))
+        sale.net_amount = sale.total_amount - sale.fee_amount
+        batch.append(sale)
+        if len(batch) >= 1000:
+            Sale.objects.bulk_update(batch, ['tax_rate', 'fee_amount', 'net_amount'])
+            batch = []
+    if batch:
+        Sale.objects.bulk_update(batch, ['tax_rate', 'fee_amount', 'net_amount'])
+
+    # Refaz o resumo diário a partir dos valores gravados
+    rows = Sale.objects.annotate(day=TruncDate('created_at'))\
+        .values('day', 'payment_method')\
+        .annotate(gross=Sum('total_amount'), fees=Sum('fee_amount'), net=Sum('net_amount'), count=Count('id'))\
+        .order_by()
+    DailySalesSummary.objects.all().delete()
+    DailySalesSummary.objects.bulk_create([
+        DailySalesSummary(
+            date=row['day'],
+            payment_method_id=row['payment_method'],
+            gross_amount=row['gross'] or 0,
+            fee_amount=row['fees'] or 0,
+            net_amount=row['net'] or 0,
+            sales_count=row['count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_dailysalessummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='fee_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='net_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='tax_rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.RunPython(backfill_fees, migrations.RunPython.noop),
+    ]
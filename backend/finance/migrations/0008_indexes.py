@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 20:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_sale_fee_snapshot'),
+        ('inventory', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='saleitem',
+            name='sale',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='finance.sale'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(fields=['date', 'created_at', 'id'], name='fintrans_ledger_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['type', 'amount'], name='fintrans_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['created_at', 'id'], name='sale_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale', 'product'], name='saleitem_sale_product_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 21:00
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_business_date(apps, schema_editor):
+    """Data local (TIME_ZONE) de cada venda, calculada no próprio banco."""
+    Sale = apps.get_model('finance', 'Sale')
+    Sale.objects.update(business_date=TruncDate('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='business_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.RunPython(backfill_business_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['business_date', 'created_at'], name='sale_business_date_idx'),
+        ),
+    ]
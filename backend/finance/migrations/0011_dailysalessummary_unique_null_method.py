@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 09:00
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_null_summaries(apps, schema_editor):
+    """Junta os resumos (dia, NULL) repetidos antes de criar a restrição."""
+    DailySalesSummary = apps.get_model('finance', 'DailySalesSummary')
+    repeated = DailySalesSummary.objects.filter(payment_method__isnull=True)\
+        .values('date').annotate(n=Count('id')).filter(n__gt=1).values_list('date', flat=True)
+    for day in repeated:
+        rows = DailySalesSummary.objects.filter(date=day, payment_method__isnull=True)
+        totals = rows.aggregate(
+            gross_amount=Sum('gross_amount'), fee_amount=Sum('fee_amount'),
+            net_amount=Sum('net_amount'), sales_count=Sum('sales_count'),
+        )
+        keep = rows.order_by('id').first()
+        rows.exclude(pk=keep.pk).delete()
+        DailySalesSummary.objects.filter(pk=keep.pk).update(**totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_sale_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_null_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('payment_method__isnull', True)), fields=('date',),
+                name='unique_daily_sales_summary_null',
+            ),
+        ),
+    ]
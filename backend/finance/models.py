@@ -1,5 +1,9 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
 from django.utils import timezone
+from core.conditional import bump_version
 from inventory.models import Product
 
 class PaymentMethod(models.Model):
@@ -13,6 +17,8 @@ class PaymentMethod(models.Model):
 class Sale(models.Model):
     """Cabeçalho da Venda"""
     created_at = models.DateTimeField(auto_now_add=True)
+    # Data local (America/Sao_Paulo) da venda: filtros por dia/mês usam esta coluna indexada
+    business_date = models.DateField(default=timezone.localdate)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True)
     status = models.CharField(max_length=20, default='COMPLETED')
@@ -21,15 +27,49 @@ class Sale(models.Model):
     # NOVO CAMPO:
     customer_phone = models.CharField(max_length=20, blank=True, null=True, help_text="Telefone/WhatsApp")
 
+    # Taxa da forma de pagamento congelada no momento da venda
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    fee_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    # Chave gerada pelo PDV: a mesma venda reenviada (offline/retentativa) não duplica
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Listagem de vendas (ordem -created_at, -id) e filtros por período
+            models.Index(fields=['created_at', 'id'], name='sale_created_idx'),
+            # Relatórios por dia/mês (intervalos semiabertos em business_date)
+            models.Index(fields=['business_date', 'created_at'], name='sale_business_date_idx'),
+        ]
+
     def __str__(self): return f"Venda #{self.id} - R$ {self.total_amount}"
 
+    def apply_fees(self):
+        """Copia a taxa atual da forma de pagamento e calcula taxa e valor líquido."""
+        method = self.payment_method
+        self.tax_rate = method.tax_rate if method and method.tax_rate else Decimal(0)
+        self.fee_amount = (self.total_amount * self.tax_rate / Decimal(100)).quantize(Decimal('0.01'))
+        self.net_amount = self.total_amount - self.fee_amount
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.apply_fees()
+        super().save(*args, **kwargs)
+
 class SaleItem(models.Model):
-    sale = models.ForeignKey(Sale, related_name='items', on_delete=models.CASCADE)
+    # O índice (sale, product) abaixo já atende as buscas por venda
+    sale = models.ForeignKey(Sale, related_name='items', on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale', 'product'], name='saleitem_sale_product_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.subtotal = self.quantity * self.unit_price
         super().save(*args, **kwargs)
@@ -53,8 +93,134 @@ class FinancialTransaction(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     sale = models.ForeignKey('Sale', on_delete=models.CASCADE, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Livro caixa: filtro por período + ordem -date, -created_at, -id
+            models.Index(fields=['date', 'created_at', 'id'], name='fintrans_ledger_idx'),
+            # Previsão do Dashboard: só os PENDENTES (índice parcial e pequeno)
+            models.Index(fields=['type', 'amount'], condition=models.Q(status='PENDING'), name='fintrans_pending_idx'),
+        ]
     
     def __str__(self): return f"{self.type}: {self.description} - R$ {self.amount}"
 
 class BusinessSettings(models.Model):
-    hourly_labor_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
\ No newline at end of file
+    hourly_labor_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+
+class DailySalesSummaryManager(models.Manager):
+
+    def register_sale(self, sale, sign=1):
+        """
+        Soma (sign=1) ou subtrai (sign=-1) uma venda do resumo do dia.
+        Deve ser chamado dentro da mesma transação que grava a venda.
+        """
+        self.register_sales([sale], sign)
+
+    def register_sales(self, sales, sign=1):
+        """
+        Igual a register_sale para várias vendas: soma tudo em memória e faz
+        um get_or_create + UPDATE por (dia, forma de pagamento), não por venda.
+        """
+        totals = {}
+        for sale in sales:
+            key = (sale.business_date, sale.payment_method_id)
+            gross, fee, net, count = totals.get(key, (0, 0, 0, 0))
+            totals[key] = (gross + sale.total_amount, fee + sale.fee_amount, net + sale.net_amount, count + 1)
+
+        for (day, method_id), (gross, fee, net, count) in totals.items():
+            summary, _ = self.select_for_update().get_or_create(date=day, payment_method_id=method_id)
+            self.filter(pk=summary.pk).update(
+                gross_amount=F('gross_amount') + sign * gross,
+                fee_amount=F('fee_amount') + sign * fee,
+                net_amount=F('net_amount') + sign * net,
+                sales_count=F('sales_count') + sign * count,
+            )
+        bump_version(self.model)
+
+    def detach_payment_method(self, method_id):
+        """
+        Antes de excluir uma forma de pagamento: junta as linhas dela ao resumo
+        sem forma (NULL) do mesmo dia. Só o SET_NULL deixaria duas linhas
+        (dia, NULL) e o get_or_create do dia passaria a falhar.
+        """
+        with transaction.atomic():
+            for row in self.select_for_update().filter(payment_method_id=method_id):
+                bucket = self.select_for_update().filter(date=row.date, payment_method__isnull=True).first()
+                if bucket is None:
+                    self.filter(pk=row.pk).update(payment_method=None)
+                    continue
+                self.filter(pk=bucket.pk).update(
+                    gross_amount=F('gross_amount') + row.gross_amount,
+                    fee_amount=F('fee_amount') + row.fee_amount,
+                    net_amount=F('net_amount') + row.net_amount,
+                    sales_count=F('sales_count') + row.sales_count,
+                )
+                row.delete()
+            bump_version(self.model)
+
+    def rebuild(self, start=None, end=None):
+        """
+        Recalcula o resumo a partir das vendas (intervalo de datas locais opcional).
+        Retorna a quantidade de linhas gravadas.
+        """
+        sales = Sale.objects.all()
+        summaries = self.all()
+        if start:
+            sales = sales.filter(business_date__gte=start)
+            summaries = summaries.filter(date__gte=start)
+        if end:
+            sales = sales.filter(business_date__lt=end + timedelta(days=1))
+            summaries = summaries.filter(date__lt=end + timedelta(days=1))
+
+        rows = sales.values('business_date', 'payment_method')\
+            .annotate(
+                gross=Sum('total_amount'),
+                fees=Sum('fee_amount'),
+                net=Sum('net_amount'),
+                count=Count('id'),
+            ).order_by()
+
+        objs = [
+            self.model(
+                date=row['business_date'],
+                payment_method_id=row['payment_method'],
+                gross_amount=row['gross'] or 0,
+                fee_amount=row['fees'] or 0,
+                net_amount=row['net'] or 0,
+                sales_count=row['count'],
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            summaries.delete()
+            self.bulk_create(objs, batch_size=500)
+            bump_version(self.model)
+        return len(objs)
+
+
+class DailySalesSummary(models.Model):
+    """
+    Resumo diário de vendas por forma de pagamento (data local).
+    Mantido pelo SaleViewSet na mesma transação da venda; pode ser
+    reconstruído com `python manage.py rebuild_sales_summary`.
+    """
+    date = models.DateField()
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
+    gross_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fee_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    sales_count = models.IntegerField(default=0)
+
+    objects = DailySalesSummaryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method'], name='unique_daily_sales_summary'),
+            # NULL não conta como repetido no índice acima: um único resumo sem forma por dia
+            models.UniqueConstraint(
+                fields=['date'], condition=models.Q(payment_method__isnull=True), name='unique_daily_sales_summary_null',
+            ),
+        ]
+
+    def __str__(self): return f"{self.date} - {self.payment_method}: R$ {self.gross_amount}"
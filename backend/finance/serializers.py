@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings
 from inventory.models import Product
@@ -11,11 +14,8 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
 class SaleItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     
-    # Define explicitamente que esperamos 'product_id' na entrada
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(), 
-        source='product'
-    )
+    # Esperamos 'product_id' na entrada; a existência é validada em lote no SaleSerializer
+    product_id = serializers.IntegerField()
 
     # CORREÇÃO: O subtotal é calculado no Model, então é apenas leitura na API
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -27,17 +27,65 @@ class SaleItemSerializer(serializers.ModelSerializer):
 class SaleSerializer(serializers.ModelSerializer):
     items = SaleItemSerializer(many=True)
     payment_method_name = serializers.ReadOnlyField(source='payment_method.name')
+    # Opcional: reenvio com a mesma chave devolve a venda já gravada (ver SaleViewSet.create)
+    idempotency_key = serializers.CharField(max_length=64, required=False, allow_null=True)
 
     class Meta:
         model = Sale
-        fields = ['id', 'created_at', 'total_amount', 'payment_method', 'payment_method_name', 'customer_name', 'customer_phone', 'items']
+        fields = ['id', 'created_at', 'business_date', 'total_amount', 'payment_method', 'payment_method_name', 'customer_name', 'customer_phone', 'tax_rate', 'fee_amount', 'net_amount', 'idempotency_key', 'items']
+        read_only_fields = ['business_date', 'tax_rate', 'fee_amount', 'net_amount'] # Calculados na gravação da venda
 
-    def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        sale = Sale.objects.create(**validated_data)
-        for item in items_data:
-            SaleItem.objects.create(sale=sale, **item)
-        return sale
+    def validate_items(self, items):
+        # Uma única query para todos os produtos da cesta (em vez de uma por item)
+        ids = {item['product_id'] for item in items}
+        found = set(Product.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = ids - found
+        if missing:
+            raise serializers.ValidationError(f"Produto(s) não encontrado(s): {', '.join(map(str, sorted(missing)))}.")
+        return items
+
+class SaleSyncSerializer(SaleSerializer):
+    """
+    Uma venda do lote de sincronização offline (sales/bulk-sync).
+    Produtos e formas de pagamento vêm do contexto, carregados uma vez para
+    o lote inteiro: validar milhares de vendas não faz uma query por venda.
+    """
+    idempotency_key = serializers.CharField(max_length=64)
+    payment_method = serializers.IntegerField(required=False, allow_null=True)
+    # Hora da venda no PDV: a venda feita offline às 23h e sincronizada de
+    # manhã entra no dia em que aconteceu (business_date, created_at,
+    # lançamento e resumo diário), não no da sincronização
+    sold_at = serializers.DateTimeField(required=False, allow_null=True, write_only=True)
+    max_clock_skew = timedelta(minutes=5)
+    max_offline_age = timedelta(days=30)
+
+    class Meta(SaleSerializer.Meta):
+        fields = SaleSerializer.Meta.fields + ['sold_at']
+
+    def validate_sold_at(self, value):
+        if value is None:
+            return None
+        now = timezone.now()
+        if value > now + self.max_clock_skew:
+            raise serializers.ValidationError("Data da venda no futuro (confira o relógio do PDV).")
+        if value < now - self.max_offline_age:
+            raise serializers.ValidationError(f"Venda offline com mais de {self.max_offline_age.days} dias.")
+        # Relógio do PDV um pouco adiantado: não lança a venda depois de agora
+        return min(value, now)
+
+    def validate_payment_method(self, value):
+        if value is None:
+            return None
+        method = self.context['payment_methods'].get(value)
+        if method is None:
+            raise serializers.ValidationError(f"Forma de pagamento não encontrada: {value}.")
+        return method
+
+    def validate_items(self, items):
+        missing = {item['product_id'] for item in items} - self.context['product_ids']
+        if missing:
+            raise serializers.ValidationError(f"Produto(s) não encontrado(s): {', '.join(map(str, sorted(missing)))}.")
+        return items
 
 class FinancialTransactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,186 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from core.conditional import bump_version
+
+from inventory.models import Product, StockMovement
+from inventory.services import InsufficientStock, decrement_stock, reopen_checkpoints, stock_movements
+
+from .models import Sale, SaleItem, FinancialTransaction, DailySalesSummary
+
+
+def revenue_transaction(sale):
+    """
+    Lançamento financeiro da venda com o valor LÍQUIDO (taxa congelada em
+    Sale.apply_fees). Crédito fica Pendente por 30 dias.
+    """
+    method_name = sale.payment_method.name.lower() if sale.payment_method else ''
+
+    # Datas e status (data local da venda)
+    trans_status = 'PAID'
+    due_date = sale.business_date
+    if 'crédito' in method_name or 'credito' in method_name:
+        trans_status = 'PENDING'
+        due_date = sale.business_date + timedelta(days=30)
+
+    description = f"Venda #{sale.id}"
+    if sale.customer_name:
+        description += f" - {sale.customer_name}"
+    if sale.fee_amount > 0:
+        description += f" (Taxa {sale.tax_rate}%: -R${sale.fee_amount:.2f})"
+
+    return FinancialTransaction(
+        description=description,
+        amount=sale.net_amount,
+        type='REVENUE',
+        sale=sale,
+        date=sale.business_date,
+        due_date=due_date,
+        status=trans_status,
+    )
+
+
+def create_sales(entries):
+    """
+    Grava vendas já validadas (dados do SaleSerializer, com 'items' e,
+    nas vendas offline, 'sold_at').
+    Tudo ou nada e em statements fixos, qualquer que seja o número de vendas:
+
+    1. Baixa de estoque condicional da soma de todas as cestas (um UPDATE).
+    2. Vendas, itens, Kardex e lançamentos financeiros via bulk_create,
+       todos no dia da venda (business_date).
+    3. Resumo diário: um UPDATE por (dia, forma de pagamento).
+
+    Levanta InsufficientStock se faltar saldo para o conjunto.
+    """
+    demand = {}
+    for entry in entries:
+        for item in entry['items']:
+            demand[item['product_id']] = demand.get(item['product_id'], 0) + item['quantity']
+
+    with transaction.atomic():
+        decrement_stock(Product, demand)
+
+        sales = []
+        for entry in entries:
+            sale = Sale(**{field: value for field, value in entry.items() if field not in ('items', 'sold_at')})
+            if entry.get('sold_at'):
+                sale.business_date = timezone.localdate(entry['sold_at'])  # venda offline: dia do PDV
+            sale.apply_fees()  # bulk_create não chama save()
+            sales.append(sale)
+        Sale.objects.bulk_create(sales)
+
+        # auto_now_add ignora o valor do bulk_create: hora do PDV num UPDATE só
+        sold_at = {sale.id: entry['sold_at'] for sale, entry in zip(sales, entries) if entry.get('sold_at')}
+        if sold_at:
+            Sale.objects.filter(id__in=sold_at).update(created_at=Case(
+                *[When(id=pk, then=Value(moment)) for pk, moment in sold_at.items()],
+                output_field=DateTimeField(),
+            ))
+            for sale in sales:
+                sale.created_at = sold_at.get(sale.id, sale.created_at)
+
+        items = []
+        movements = []
+        for sale, entry in zip(sales, entries):
+            sale_demand = {}
+            for item in entry['items']:
+                items.append(SaleItem(
+                    sale=sale,
+                    product_id=item['product_id'],
+                    quantity=item['quantity'],
+                    unit_price=item['unit_price'],
+                    subtotal=item['quantity'] * item['unit_price'],
+                ))
+                sale_demand[item['product_id']] = sale_demand.get(item['product_id'], 0) + item['quantity']
+            for movement in stock_movements(Product, sale_demand, 'SALE', f"Venda #{sale.id}", sign=-1):
+                movement.date = sale.business_date  # Kardex no dia da venda, não da sincronização
+                movements.append(movement)
+
+        SaleItem.objects.bulk_create(items)
+        StockMovement.objects.bulk_create(movements)
+        earliest = min(sale.business_date for sale in sales)
+        if earliest < timezone.localdate():
+            reopen_checkpoints(earliest)
+        FinancialTransaction.objects.bulk_create([revenue_transaction(sale) for sale in sales])
+        DailySalesSummary.objects.register_sales(sales)
+        bump_version(Sale, SaleItem, FinancialTransaction)  # bulk_create não dispara signals
+    return sales
+
+
+def create_sale(entry):
+    """Uma venda do PDV (ver create_sales)."""
+    return create_sales([entry])[0]
+
+
+def sync_sales(entries, chunk_size=500):
+    """
+    Sincronização do PDV offline: `entries` = vendas validadas, cada uma com
+    `idempotency_key`. Retorna um resultado por venda, na mesma ordem:
+
+        {'idempotency_key', 'status': 'created' | 'duplicate' | 'rejected', 'id', ...}
+
+    Chaves já aceitas (nesta ou em outra sincronização) viram 'duplicate'
+    com o id da venda original. Cada lote de `chunk_size` vendas é gravado
+    em uma transação; se faltar estoque, o lote é dividido ao meio até
+    isolar as vendas recusadas, que ficam de fora sem afetar as demais.
+    A ordem de envio é respeitada: quem vendeu primeiro leva o estoque.
+    """
+    results = [None] * len(entries)
+    accepted = {}
+    for start in range(0, len(entries), chunk_size):
+        chunk = list(enumerate(entries[start:start + chunk_size], start))
+        keys = [entry['idempotency_key'] for _, entry in chunk]
+        accepted.update(Sale.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'id'))
+
+        pending = []
+        repeated = []
+        seen = set()
+        for index, entry in chunk:
+            key = entry['idempotency_key']
+            if key in accepted or key in seen:
+                repeated.append((index, key))
+            else:
+                seen.add(key)
+                pending.append((index, entry))
+
+        with transaction.atomic():
+            _sync_batch(pending, results, accepted)
+
+        # Repetidas dentro do próprio envio apontam para a venda recém-criada
+        for index, key in repeated:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'id': accepted.get(key)}
+    return results
+
+
+def _sync_batch(batch, results, accepted):
+    """Grava `batch` de uma vez; em caso de falha, divide ao meio (savepoints)."""
+    if not batch:
+        return
+    try:
+        with transaction.atomic():
+            sales = create_sales([entry for _, entry in batch])
+    except (InsufficientStock, IntegrityError) as e:
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            _sync_batch(batch[:middle], results, accepted)
+            _sync_batch(batch[middle:], results, accepted)
+            return
+        index, entry = batch[0]
+        key = entry['idempotency_key']
+        if isinstance(e, InsufficientStock):
+            results[index] = {'idempotency_key': key, 'status': 'rejected', 'error': str(e), 'shortages': e.shortages}
+        else:
+            # Chave gravada por outra sincronização concorrente
+            existing = Sale.objects.filter(idempotency_key=key).values_list('id', flat=True).first()
+            if existing is None:
+                raise
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'id': existing}
+        return
+
+    for (index, entry), sale in zip(batch, sales):
+        accepted[entry['idempotency_key']] = sale.id
+        results[index] = {'idempotency_key': entry['idempotency_key'], 'status': 'created', 'id': sale.id}
@@ -0,0 +1,9 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import DailySalesSummary, PaymentMethod
+
+
+@receiver(pre_delete, sender=PaymentMethod)
+def payment_method_deleted(sender, instance, **kwargs):
+    DailySalesSummary.objects.detach_payment_method(instance.id)
@@ -1,3 +1,789 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+import csv
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from core.metrics import registry
+from core.testing import QueryBudgetMixin, executed_plans, query_plan
+from inventory.models import Product, StockCheckpoint, StockMovement
+from inventory.services import create_checkpoint, stock_balances
+from .dashboard import DASHBOARD_GROUPS, _forecast_group, _sales_group
+from .management.commands.bench_dashboard import seed_dashboard_data
+from .management.commands.bench_trama import run_bench
+from .management.commands.seed_trama import seed_trama
+from .management.commands.stress_sales import run_stress
+from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings, DailySalesSummary
+from .services import create_sale
+
+
+class SalesSummaryTests(APITestCase):
+    """Resumo diário de vendas (DailySalesSummary) e o Dashboard."""
+
+    def setUp(self):
+        cache.clear()  # Versões do cache sobrevivem ao rollback de cada teste
+        self.user = User.objects.create_user(username='caixa', password='123')
+        self.client.force_authenticate(self.user)
+        self.pix = PaymentMethod.objects.create(name='Pix', tax_rate=Decimal('0'))
+        self.credit = PaymentMethod.objects.create(name='Crédito', tax_rate=Decimal('5'))
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('50'), stock_quantity=100)
+
+    def sell(self, method, qty=1):
+        payload = {
+            'total_amount': str(self.product.price * qty),
+            'payment_method': method.id,
+            'items': [{'product_id': self.product.id, 'quantity': qty, 'unit_price': str(self.product.price)}],
+        }
+        response = self.client.post('/api/sales/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_sale_updates_summary(self):
+        self.sell(self.pix, 2)
+        self.sell(self.credit, 1)
+        self.sell(self.credit, 1)
+
+        today = timezone.localdate()
+        pix = DailySalesSummary.objects.get(date=today, payment_method=self.pix)
+        credit = DailySalesSummary.objects.get(date=today, payment_method=self.credit)
+        self.assertEqual((pix.sales_count, pix.gross_amount, pix.fee_amount), (1, Decimal('100'), Decimal('0')))
+        self.assertEqual((credit.sales_count, credit.gross_amount, credit.fee_amount), (2, Decimal('100'), Decimal('5')))
+        self.assertEqual(credit.net_amount, Decimal('95'))
+
+    def test_delete_sale_removes_from_summary(self):
+        sale = self.sell(self.credit, 1)
+        self.client.delete(f"/api/sales/{sale['id']}/")
+        summary = DailySalesSummary.objects.get(payment_method=self.credit)
+        self.assertEqual((summary.sales_count, summary.gross_amount), (0, Decimal('0')))
+
+    def test_deleted_methods_merge_into_null_summary(self):
+        self.sell(self.pix, 1)
+        sale = self.sell(self.credit, 2)
+        self.pix.delete()
+        self.credit.delete()
+
+        summary = DailySalesSummary.objects.get()
+        self.assertIsNone(summary.payment_method_id)
+        self.assertEqual((summary.sales_count, summary.gross_amount, summary.fee_amount), (2, Decimal('150'), Decimal('5')))
+
+        # O resumo do dia continua atualizável (sem MultipleObjectsReturned)
+        response = self.client.delete(f"/api/sales/{sale['id']}/")
+        self.assertEqual(response.status_code, 204)
+        summary.refresh_from_db()
+        self.assertEqual((summary.sales_count, summary.gross_amount), (1, Decimal('50')))
+
+    def test_single_null_summary_per_day(self):
+        today = timezone.localdate()
+        DailySalesSummary.objects.create(date=today, payment_method=None)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySalesSummary.objects.create(date=today, payment_method=None)
+
+    def test_rebuild_matches_incremental(self):
+        self.sell(self.pix, 1)
+        self.sell(self.credit, 3)
+        before = list(DailySalesSummary.objects.order_by('payment_method').values_list(
+            'date', 'payment_method', 'gross_amount', 'fee_amount', 'net_amount', 'sales_count'))
+
+        DailySalesSummary.objects.all().delete()
+        call_command('rebuild_sales_summary', stdout=StringIO())
+        after = list(DailySalesSummary.objects.order_by('payment_method').values_list(
+            'date', 'payment_method', 'gross_amount', 'fee_amount', 'net_amount', 'sales_count'))
+        self.assertEqual(before, after)
+
+    def test_dashboard_reads_summary(self):
+        self.sell(self.credit, 2)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        DailySalesSummary.objects.create(date=yesterday, payment_method=self.pix, gross_amount=Decimal('30'), sales_count=1)
+
+        data = self.client.get('/api/dashboard/').data
+        self.assertEqual(data['sales_today'], Decimal('100'))
+        self.assertEqual(data['sales_today_fees'], Decimal('5'))
+        self.assertEqual(data['sales_history'][-1]['value'], Decimal('100'))
+        self.assertEqual(data['sales_history'][-2]['value'], Decimal('30'))
+
+    def test_sale_and_revenue_use_local_business_date(self):
+        data = self.sell(self.pix, 1)
+        sale = Sale.objects.get(id=data['id'])
+        self.assertEqual(sale.business_date, timezone.localdate(sale.created_at))
+        self.assertEqual(sale.financialtransaction_set.get().date, sale.business_date)
+
+    def test_sale_keeps_fee_snapshot(self):
+        data = self.sell(self.credit, 2)
+        self.assertEqual(Decimal(data['fee_amount']), Decimal('5.00'))
+        self.assertEqual(Decimal(data['net_amount']), Decimal('95.00'))
+
+        # Mudar a taxa depois não altera vendas já registradas
+        self.credit.tax_rate = Decimal('10')
+        self.credit.save()
+        sale = Sale.objects.get(id=data['id'])
+        self.assertEqual((sale.tax_rate, sale.fee_amount), (Decimal('5.00'), Decimal('5.00')))
+        self.assertEqual(self.client.get('/api/dashboard/').data['sales_today_fees'], Decimal('5'))
+
+
+class DashboardCacheTests(APITestCase):
+    """Cache do Dashboard por data local, invalidado pelas escritas."""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user(username='gerente', password='123'))
+        self.pix = PaymentMethod.objects.create(name='Pix')
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('50'), stock_quantity=10)
+
+    def dashboard(self, expected_cache):
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response['X-Cache'], expected_cache)
+        return response.data
+
+    def test_suite_uses_process_cache(self):
+        # core.testing.TestRunner: o cache.clear() acima não toca o cache em arquivo do servidor
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def test_hit_skips_the_database(self):
+        self.dashboard('MISS')
+        with self.assertNumQueries(0):
+            data = self.dashboard('HIT')
+        self.assertEqual(data['low_stock_count'], 0)
+
+        out = StringIO()
+        call_command('dashboard_cache_stats', '--reset', stdout=out)
+        self.assertIn('Acertos: 1 | Faltas: 1', out.getvalue())
+
+    def test_writes_invalidate(self):
+        self.dashboard('MISS')
+
+        # Venda (bulk_create + UPDATEs em lote)
+        sale = {
+            'total_amount': '50.00',
+            'payment_method': self.pix.id,
+            'items': [{'product_id': self.product.id, 'quantity': 1, 'unit_price': '50.00'}],
+        }
+        self.assertEqual(self.client.post('/api/sales/', sale, format='json').status_code, 201)
+        self.assertEqual(self.dashboard('MISS')['sales_today'], Decimal('50'))
+        self.dashboard('HIT')
+
+        # Lançamento manual (save)
+        FinancialTransaction.objects.create(description='Aluguel', amount=Decimal('800'), type='EXPENSE', status='PENDING')
+        self.assertEqual(self.dashboard('MISS')['future_out'], Decimal('800'))
+
+        # Estoque do produto
+        response = self.client.patch(f'/api/products/{self.product.id}/', {'stock_quantity': '2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.dashboard('MISS')['low_stock_count'], 1)
+
+
+    def test_writes_replace_the_day_entry(self):
+        key = f'dashboard:{timezone.localdate().isoformat()}'
+        self.dashboard('MISS')
+        digest, _ = cache.get(key)
+        FinancialTransaction.objects.create(description='Aluguel', amount=Decimal('800'), type='EXPENSE')
+        self.dashboard('MISS')
+        # Mesma chave do dia, com o digest das versões novas (não uma entrada a mais por escrita)
+        self.assertNotEqual(cache.get(key)[0], digest)
+        self.dashboard('HIT')
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    """Variante async (grupos de queries em threads com conexões próprias: precisa de dados commitados)."""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='gerente', password='123')
+        self.token = self.client.post('/api/token/', {'username': 'gerente', 'password': '123'}).json()['access']
+        method = PaymentMethod.objects.create(name='Crédito', tax_rate=Decimal('5'))
+        product = Product.objects.create(name='Bolsa', price=Decimal('50'), stock_quantity=3)
+        with transaction.atomic():
+            sale = Sale.objects.create(total_amount=Decimal('100'), payment_method=method)
+            SaleItem.objects.create(sale=sale, product=product, quantity=2, unit_price=Decimal('50'), subtotal=Decimal('100'))
+            FinancialTransaction.objects.create(description='Venda', amount=Decimal('95'), type='REVENUE', status='PENDING', sale=sale)
+            DailySalesSummary.objects.register_sale(sale)
+
+    def test_same_payload_as_sync_view(self):
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        response = self.client.get('/api/dashboard/async/', **auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        # Queries das threads do pool também contam no Server-Timing
+        queries = int(response['Server-Timing'].split('desc="')[1].split(' ')[0])
+        self.assertGreaterEqual(queries, len(DASHBOARD_GROUPS))
+        data = response.json()
+        self.assertEqual(data['sales_today'], 100.0)
+        self.assertEqual(data['future_in'], 95.0)
+        self.assertEqual(data['top_products'], [{'name': 'Bolsa', 'quantity': 2}])
+
+        # Mesmo cálculo e mesma chave de cache da view síncrona
+        sync = self.client.get('/api/dashboard/', **auth)
+        self.assertEqual(sync['X-Cache'], 'HIT')
+        self.assertEqual(sync.json(), data)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/dashboard/', **auth).json(), data)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/dashboard/async/').status_code, 401)
+        self.assertEqual(self.client.get('/api/dashboard/async/', HTTP_AUTHORIZATION='Bearer x').status_code, 401)
+        self.assertEqual(self.client.post('/api/dashboard/async/').status_code, 405)
+
+
+class MetricsTests(APITestCase):
+    """Server-Timing, /api/metrics/ e log de queries lentas (core/metrics.py)."""
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user(username='ops', password='123')
+        Product.objects.create(name='Bolsa', price=Decimal('50'))
+
+    def test_server_timing_counts_queries(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'total', 'db', 'render', 'app'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+
+    def test_prometheus_endpoint(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/products/')
+        self.client.get('/api/dashboard/')
+        self.client.get('/api/dashboard/')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('trama_http_request_duration_seconds_count{route="product-list",method="GET"} 1', body)
+        self.assertIn('trama_http_request_duration_seconds_bucket{route="dashboard-stats",method="GET",le="+Inf"} 2', body)
+        self.assertIn('trama_http_responses_total{route="product-list",method="GET",status="200"} 1', body)
+        self.assertIn('trama_dashboard_cache_hits_total 1', body)
+        self.assertIn('trama_dashboard_cache_misses_total 1', body)
+
+    def test_scraper_token(self):
+        with self.settings(METRICS_TOKEN='segredo'):
+            self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+            self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer outro').status_code, 401)
+        # Sem token configurado, "Bearer " vazio não passa
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+
+    def test_slow_query_log(self):
+        self.client.force_authenticate(self.user)
+        with self.settings(SLOW_QUERY_MS=0), self.assertLogs('trama.slow_queries', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        self.assertIn('/api/products/', logs.output[0])
+
+        response = self.client.get('/api/metrics/slow-queries/')
+        queries = response.data['queries']
+        self.assertTrue(queries)
+        self.assertEqual([q['ms'] for q in queries], sorted((q['ms'] for q in queries), reverse=True))
+        self.assertTrue(any('inventory_product' in q['sql'] for q in queries))
+        self.assertIn('trama_slow_queries_total{route="product-list"}', self.client.get('/api/metrics/').content.decode())
+
+        self.assertEqual(self.client.delete('/api/metrics/slow-queries/').status_code, 204)
+        self.assertEqual(self.client.get('/api/metrics/slow-queries/').data['queries'], [])
+
+
+class ExportTests(APITestCase):
+    """Exportação em streaming (CSV/XLSX) de vendas e lançamentos."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='contador', password='123'))
+        pix = PaymentMethod.objects.create(name='Pix')
+        self.bag = Product.objects.create(name='Bolsa', price=Decimal('50'))
+        self.wallet = Product.objects.create(name='Carteira, couro', price=Decimal('20'))
+        today = timezone.localdate()
+        self.sale = Sale.objects.create(total_amount=Decimal('120'), payment_method=pix, customer_name='=HYPERLINK("x")')
+        SaleItem.objects.create(sale=self.sale, product=self.bag, quantity=2, unit_price=Decimal('50'), subtotal=Decimal('100'))
+        SaleItem.objects.create(sale=self.sale, product=self.wallet, quantity=1, unit_price=Decimal('20'), subtotal=Decimal('20'))
+        old = Sale.objects.create(total_amount=Decimal('10'), payment_method=pix, business_date=today - timedelta(days=40))
+        FinancialTransaction.objects.create(description='Venda', amount=Decimal('120'), type='REVENUE', sale=self.sale, date=today)
+        FinancialTransaction.objects.create(description='Aluguel', amount=Decimal('800'), type='EXPENSE', date=old.business_date)
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_sales_csv_one_row_per_item(self):
+        start = (timezone.localdate() - timedelta(days=1)).isoformat()
+        response, content = self.download(f'/api/sales/export/?start_date={start}')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="vendas.csv"')
+        rows = list(csv.reader(StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['Venda', 'Data', 'Data/Hora'])
+        self.assertEqual([(row[0], row[11], row[12]) for row in rows[1:]], [
+            (str(self.sale.id), 'Bolsa', '2'),
+            (str(self.sale.id), 'Carteira, couro', '1'),
+        ])
+        self.assertEqual(rows[1][3], "'=HYPERLINK(\"x\")")  # Sem fórmula no Excel
+
+    def test_single_query_and_filters(self):
+        with self.assertNumQueries(1):
+            _, content = self.download('/api/transactions/export/')
+        self.assertEqual(len(content.decode('utf-8-sig').splitlines()), 3)
+        end = (timezone.localdate() - timedelta(days=1)).isoformat()
+        _, content = self.download(f'/api/transactions/export/?end_date={end}')
+        self.assertIn('Aluguel', content.decode('utf-8-sig'))
+        self.assertNotIn('Venda', content.decode('utf-8-sig').splitlines()[1])
+
+        self.assertEqual(self.client.get('/api/sales/export/?start_date=ontem').status_code, 400)
+        self.assertEqual(self.client.get('/api/sales/export/?output=pdf').status_code, 400)
+
+    def test_sales_xlsx(self):
+        response, content = self.download('/api/sales/export/?output=xlsx')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="vendas.xlsx"')
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('.//s:row', ns)
+        self.assertEqual(len(rows), 4)  # cabeçalho + venda antiga sem itens + 2 itens
+        cells = rows[2].findall('s:c', ns)
+        self.assertEqual(cells[0].find('s:v', ns).text, str(self.sale.id))
+        self.assertEqual(cells[1].get('s'), '1')  # data formatada
+        self.assertEqual(cells[11].find('s:is/s:t', ns).text, 'Bolsa')
+
+
+class SaleCreateTests(QueryBudgetMixin, APITestCase):
+    """Fluxo de venda do PDV: estoque, itens e número de statements."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='pdv', password='123'))
+        self.method = PaymentMethod.objects.create(name='Dinheiro')
+        self.products = Product.objects.bulk_create(
+            Product(name=f'Produto {i}', price=Decimal('10'), stock_quantity=10) for i in range(40)
+        )
+
+    def payload(self, lines):
+        return {
+            'total_amount': str(sum(Decimal('10') * qty for _, qty in lines)),
+            'payment_method': self.method.id,
+            'items': [{'product_id': p.id, 'quantity': qty, 'unit_price': '10'} for p, qty in lines],
+        }
+
+    def post(self, lines):
+        return self.client.post('/api/sales/', self.payload(lines), format='json')
+
+    def test_statement_count_does_not_grow_with_basket(self):
+        self.post([(self.products[0], 1)])  # a primeira venda do dia cria a linha do resumo diário
+
+        def sale(size):
+            response = self.post([(p, 1) for p in self.products[:size]])
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data['items']), size)
+        self.assertStatementsDoNotGrow(sale, (2, 40))
+
+    def test_repeated_lines_are_summed(self):
+        product = self.products[0]
+        self.assertEqual(self.post([(product, 4), (product, 5)]).status_code, 201)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 1)
+        self.assertEqual(self.post([(product, 1), (product, 1)]).status_code, 400)
+
+    def test_insufficient_stock_changes_nothing(self):
+        a, b = self.products[:2]
+        response = self.post([(a, 3), (b, 11)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b.name, response.data['error'])
+        self.assertEqual(Sale.objects.count(), 0)
+        a.refresh_from_db()
+        self.assertEqual(a.stock_quantity, 10)
+
+    def test_unknown_product(self):
+        payload = self.payload([(self.products[0], 1)])
+        payload['items'][0]['product_id'] = 999999
+        self.assertEqual(self.client.post('/api/sales/', payload, format='json').status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Só no PostgreSQL: o SQLite serializa as transações de escrita")
+class IdempotentRetryTests(TransactionTestCase):
+    """Duas tentativas simultâneas da mesma venda (mesma chave): uma grava, a outra recebe a venda gravada."""
+    client_class = APIClient
+
+    def test_concurrent_retry_returns_existing_sale(self):
+        self.client.force_authenticate(User.objects.create_user(username='pdv', password='123'))
+        method = PaymentMethod.objects.create(name='Dinheiro')
+        product = Product.objects.create(name='Bolsa', price=Decimal('10'), stock_quantity=5)
+        items = [{'product_id': product.id, 'quantity': 1, 'unit_price': Decimal('10')}]
+        started = threading.Event()
+
+        def first_attempt():
+            try:
+                with transaction.atomic():
+                    create_sale({'idempotency_key': 'venda-1', 'total_amount': Decimal('10'), 'payment_method': method, 'items': items})
+                    started.set()
+                    time.sleep(0.5)  # a retentativa passa pela consulta da chave e espera no banco
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=first_attempt)
+        writer.start()
+        started.wait(10)
+        response = self.client.post('/api/sales/', {
+            'idempotency_key': 'venda-1', 'total_amount': '10', 'payment_method': method.id,
+            'items': [{**item, 'unit_price': '10'} for item in items],
+        }, format='json')
+        writer.join()
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['id'], Sale.objects.get().id)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 4)
+
+
+class BulkSyncTests(QueryBudgetMixin, APITestCase):
+    """Sincronização do PDV offline (sales/bulk-sync)."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='offline', password='123'))
+        self.method = PaymentMethod.objects.create(name='Cartão de Crédito', tax_rate=Decimal('5'))
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('10'), stock_quantity=3)
+
+    def entry(self, key, qty=1):
+        return {
+            'idempotency_key': key,
+            'total_amount': str(Decimal('10') * qty),
+            'payment_method': self.method.id,
+            'items': [{'product_id': self.product.id, 'quantity': qty, 'unit_price': '10'}],
+        }
+
+    def sync(self, entries):
+        return self.client.post('/api/sales/bulk-sync/', {'sales': entries}, format='json')
+
+    def test_per_sale_results_in_order(self):
+        bad = self.entry('c')
+        bad['items'][0]['product_id'] = 999999
+        response = self.sync([self.entry('a', 2), self.entry('b', 2), bad, self.entry('d'), self.entry('a')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['created', 'rejected', 'invalid', 'created', 'duplicate'],
+        )
+        self.assertEqual(response.data['results'][4]['id'], response.data['results'][0]['id'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+
+        # Mesma lógica do create: taxa, lançamento pendente e resumo diário
+        sale = Sale.objects.get(idempotency_key='a')
+        self.assertEqual((sale.fee_amount, sale.net_amount), (Decimal('1.00'), Decimal('19.00')))
+        self.assertEqual(FinancialTransaction.objects.get(sale=sale).status, 'PENDING')
+        self.assertEqual(DailySalesSummary.objects.get().sales_count, 2)
+
+    def test_retry_does_not_duplicate(self):
+        self.sync([self.entry('a')])
+        response = self.sync([self.entry('a'), self.entry('b')])
+        self.assertEqual([r['status'] for r in response.data['results']], ['duplicate', 'created'])
+        self.assertEqual(Sale.objects.count(), 2)
+        # O POST avulso com a mesma chave devolve a venda já gravada
+        response = self.client.post('/api/sales/', self.entry('b'), format='json')
+        self.assertEqual((response.status_code, response.data['idempotency_key']), (200, 'b'))
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_offline_sale_keeps_pdv_time(self):
+        yesterday_night = timezone.localtime().replace(hour=23, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        entry = {**self.entry('noite'), 'sold_at': yesterday_night.isoformat()}
+        future = {**self.entry('futuro'), 'sold_at': (timezone.now() + timedelta(hours=1)).isoformat()}
+        response = self.sync([entry, future, self.entry('agora')])
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'invalid', 'created'])
+        self.assertIn('sold_at', response.data['results'][1]['errors'])
+
+        sale = Sale.objects.get(idempotency_key='noite')
+        day = yesterday_night.date()
+        self.assertEqual((sale.created_at, sale.business_date), (yesterday_night, day))
+        self.assertEqual(FinancialTransaction.objects.get(sale=sale).date, day)
+        self.assertEqual(DailySalesSummary.objects.get(date=day).sales_count, 1)
+        self.assertEqual(Sale.objects.get(idempotency_key='agora').business_date, timezone.localdate())
+
+    def test_offline_sale_moves_stock_on_its_day(self):
+        today = timezone.localdate()
+        StockMovement.objects.create(product=self.product, kind='OPENING', quantity=3, date=today - timedelta(days=10))
+        create_checkpoint(today - timedelta(days=1))
+        sold_at = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        self.sync([{**self.entry('backdated'), 'sold_at': sold_at.isoformat()}])
+
+        self.assertEqual(StockMovement.objects.get(kind='SALE').date, sold_at.date())
+        # Checkpoint de ontem refeito com a venda: saldo atual e histórico batem
+        self.assertEqual(StockCheckpoint.objects.get(date=today - timedelta(days=1)).quantity, 2)
+        self.assertEqual(stock_balances(Product), {self.product.id: 2})
+        self.assertEqual(stock_balances(Product, sold_at.date() - timedelta(days=1)), {self.product.id: 3})
+
+    def test_statement_count_does_not_grow_with_batch(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=1000)
+        self.sync([self.entry('warm-up')])
+
+        def sync(size):
+            response = self.sync([self.entry(f'{size}-{i}') for i in range(size)])
+            self.assertEqual(response.data['created'], size)
+        # 50 vendas cabem em um INSERT por tabela mesmo no limite de parâmetros do SQLite
+        self.assertStatementsDoNotGrow(sync, (2, 50))
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Fixa a quantidade de queries dos endpoints financeiros (lista com 10 e
+    1000 linhas e detalhe) e confere o que cada um devolve.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gerente', password='123')
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create(
+            Product(name=f'Produto {i}', price=Decimal('10')) for i in range(3)
+        )
+        self.settings = BusinessSettings.objects.create(hourly_labor_rate=Decimal('20'))
+
+    def grow(self, size):
+        """Completa as tabelas até `size` vendas (com itens), lançamentos, formas de pagamento e usuários."""
+        start = Sale.objects.count()
+        methods = PaymentMethod.objects.bulk_create(
+            PaymentMethod(name=f'Forma {i}', tax_rate=Decimal('1')) for i in range(start, size)
+        )
+        sales = Sale.objects.bulk_create(
+            Sale(total_amount=Decimal('30'), payment_method=methods[i % len(methods)]) for i in range(size - start)
+        )
+        SaleItem.objects.bulk_create(
+            SaleItem(sale=s, product=p, quantity=1, unit_price=Decimal('10'), subtotal=Decimal('10'))
+            for s in sales for p in self.products
+        )
+        FinancialTransaction.objects.bulk_create(
+            FinancialTransaction(description=f'Venda #{s.id}', amount=Decimal('30'), type='REVENUE', sale=s)
+            for s in sales
+        )
+        User.objects.bulk_create(User(username=f'user{i}') for i in range(start, size))
+
+    def test_payment_methods(self):
+        response = self.assertQueryBudget('/api/payment-methods/', 1)
+        self.assertEqual(len(response.data), 1000)
+        method = PaymentMethod.objects.get(name='Forma 0')
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/payment-methods/{method.id}/')
+        self.assertEqual((response.data['name'], response.data['tax_rate']), ('Forma 0', '1.00'))
+
+    def test_sales(self):
+        # vendas + forma de pagamento (JOIN) e itens + produtos (prefetch)
+        response = self.assertQueryBudget('/api/sales/', 2)
+        self.assertEqual(len(response.data), 1000)
+        sale = Sale.objects.select_related('payment_method').first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/sales/{sale.id}/')
+        self.assertEqual(response.data['payment_method_name'], sale.payment_method.name)
+        self.assertEqual(sorted(item['product_name'] for item in response.data['items']), [p.name for p in self.products])
+
+    def test_transactions(self):
+        response = self.assertQueryBudget('/api/transactions/', 1)
+        self.assertEqual(len(response.data), 1000)
+        entry = FinancialTransaction.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/transactions/{entry.id}/')
+        self.assertEqual((response.data['description'], response.data['sale']), (entry.description, entry.sale_id))
+
+    def test_settings(self):
+        response = self.assertQueryBudget('/api/settings/', 1)
+        self.assertEqual([row['id'] for row in response.data], [self.settings.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/settings/{self.settings.id}/')
+        self.assertEqual(response.data['hourly_labor_rate'], '20.00')
+
+    def test_users(self):
+        response = self.assertQueryBudget('/api/users/', 1)
+        self.assertEqual(len(response.data), 1001)
+        self.assertNotIn('password', response.data[0])
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/users/{self.user.id}/')
+        self.assertEqual(response.data['username'], 'gerente')
+
+
+class KeysetPaginationTests(APITestCase):
+    """Paginação por cursor do livro caixa e das vendas."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='financeiro', password='123')
+        self.client.force_authenticate(self.user)
+        today = timezone.localdate()
+        FinancialTransaction.objects.bulk_create(
+            FinancialTransaction(description=f'Lançamento {i}', amount=Decimal('1'), type='EXPENSE',
+                                 date=today - timedelta(days=i % 3))
+            for i in range(30)
+        )
+        # Empates de data e created_at: o desempate precisa ser pelo id
+        FinancialTransaction.objects.update(created_at=timezone.now())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        return ids
+
+    def test_pages_cover_legacy_list_in_order(self):
+        legacy = [row['id'] for row in self.client.get('/api/transactions/?paginate=false').data]
+        self.assertEqual(len(legacy), 30)
+        self.assertEqual(self.walk('/api/transactions/?page_size=7'), legacy)
+
+    def test_page_size_is_capped(self):
+        data = self.client.get('/api/transactions/?page_size=100000').data
+        self.assertEqual(len(data['results']), 30)
+        self.assertIsNone(data['next'])
+
+    def test_filters_are_kept_between_pages(self):
+        start = timezone.localdate().isoformat()
+        ids = self.walk(f'/api/transactions/?start_date={start}&page_size=4')
+        self.assertEqual(len(ids), 10)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/transactions/?cursor=xyz').status_code, 404)
+
+    def test_pagination_is_opt_in(self):
+        data = self.client.get('/api/transactions/').data
+        self.assertEqual(len(data), 30)  # lista simples, como os clientes antigos esperam
+        self.assertEqual(len(self.client.get('/api/sales/').data), 0)
+
+    def test_totals_cover_the_whole_period(self):
+        FinancialTransaction.objects.create(description='Venda', amount=Decimal('50'), type='REVENUE')
+        FinancialTransaction.objects.create(description='A receber', amount=Decimal('9'), type='REVENUE', status='PENDING')
+        start = timezone.localdate().isoformat()
+        self.assertEqual(len(self.client.get(f'/api/transactions/?start_date={start}&page_size=4').data['results']), 4)
+        data = self.client.get(f'/api/transactions/totals/?start_date={start}').data
+        self.assertEqual(
+            (data['revenue'], data['expense'], data['balance']),
+            (Decimal('50'), Decimal('10'), Decimal('40')),
+        )
+
+
+class IndexUsageTests(TestCase):
+    """As queries quentes do Dashboard e do livro caixa precisam usar índice (SQLite e PostgreSQL)."""
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = query_plan(queryset)
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def assertQueriesUseIndex(self, plans, index_name):
+        self.assertTrue(plans)
+        for sql, plan in plans:
+            self.assertIn(index_name, plan, sql)
+
+    def test_dashboard_forecast_uses_partial_index(self):
+        # As duas somas do _forecast_group, como o Dashboard roda (aggregate)
+        plans = executed_plans(_forecast_group, timezone.localdate(), table='finance_financialtransaction')
+        self.assertEqual(len(plans), 2)
+        self.assertQueriesUseIndex(plans, 'fintrans_pending_idx')
+
+    def test_dashboard_summary_uses_date_index(self):
+        today = timezone.localdate()
+        qs = DailySalesSummary.objects.filter(date__gte=today - timedelta(days=30), date__lte=today)
+        # No SQLite o índice da UniqueConstraint recebe nome automático
+        self.assertUsesIndex(qs, 'unique_daily_sales_summary', 'sqlite_autoindex_finance_dailysalessummary')
+
+    def test_ledger_uses_date_index(self):
+        qs = FinancialTransaction.objects.filter(date__gte='2026-01-01', date__lte='2026-01-31')\
+            .order_by('-date', '-created_at', '-id')
+        self.assertUsesIndex(qs, 'fintrans_ledger_idx')
+
+    def test_sale_listing_uses_created_index(self):
+        self.assertUsesIndex(Sale.objects.order_by('-created_at', '-id')[:50], 'sale_created_idx')
+
+    def test_dashboard_sales_use_business_date_index(self):
+        # Listas de vendas do dia e do mês do _sales_group
+        plans = executed_plans(_sales_group, timezone.localdate(), table='"finance_sale"')
+        self.assertEqual(len(plans), 2)
+        self.assertQueriesUseIndex(plans, 'sale_business_date_idx')
+
+    def test_sale_items_use_composite_index(self):
+        self.assertUsesIndex(SaleItem.objects.filter(sale_id=1), 'saleitem_sale_product_idx')
+
+
+class ConcurrentSaleTests(TransactionTestCase):
+    """Vários caixas vendendo o mesmo produto ao mesmo tempo não podem vender além do estoque."""
+
+    def test_no_oversell_under_concurrency(self):
+        result = run_stress(threads=6, attempts=10, stock=25)
+        self.assertFalse(result['oversold'], result)
+        self.assertEqual(result['sold'], 25, result)
+        self.assertEqual(result['final_stock'], 0)
+        self.assertEqual(result['rejected'], 6 * 10 - 25)
+        self.assertEqual(result['errors'], 0)
+
+
+class SeedBenchTests(TestCase):
+    """seed_trama (base sintética determinística) e bench_trama (cenários nos endpoints reais)."""
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self):
+        return seed_trama(materials=8, products=30, sales=300, purchases=20, years=1, seed=7)
+
+    def fingerprint(self):
+        return (
+            list(Sale.objects.order_by('id').values_list('business_date', 'total_amount', 'payment_method__name')),
+            list(Product.objects.order_by('sku').values_list('sku', 'price', 'stock_quantity', 'suggested_price')),
+        )
+
+    def test_seed_is_deterministic_and_consistent(self):
+        with transaction.atomic():
+            counts = self.seed()
+            first = self.fingerprint()
+            transaction.set_rollback(True)
+        self.assertEqual(self.seed(), counts)
+        self.assertEqual(self.fingerprint(), first)
+        self.assertEqual(counts['sales'], 300)
+
+        # Kardex fecha com o saldo, resumo diário com as vendas, custos calculados
+        self.assertEqual(stock_balances(Product), {
+            pk: qty for pk, qty in Product.objects.values_list('id', 'stock_quantity') if qty
+        })
+        self.assertEqual(
+            DailySalesSummary.objects.aggregate(total=Sum('gross_amount'))['total'],
+            Sale.objects.aggregate(total=Sum('total_amount'))['total'],
+        )
+        self.assertFalse(Product.objects.filter(suggested_price=0).exists())
+        self.assertFalse(Sale.objects.exclude(created_at__date=F('business_date')).exists())
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_bench_runs_every_scenario(self):
+        self.seed()
+        report = run_bench(repeat=1, warmup=0)
+        self.assertEqual(report['meta']['sales'], 300 + 1)  # + a venda do cenário do PDV
+        self.assertEqual({name for name, r in report['scenarios'].items() if r['errors']}, set())
+        self.assertEqual(report['scenarios']['dashboard (cache)']['queries'], 0)
+
+
+    def test_dashboard_seed_keeps_the_ledger(self):
+        seed_dashboard_data(sales=20, products=10, days=5)
+        out = StringIO()
+        call_command('verify_stock_ledger', stdout=out)
+        self.assertIn('OK', out.getvalue())
+
+@skipUnless(connection.vendor == 'sqlite', "Perfil do SQLite")
+class SQLiteProfileTests(TransactionTestCase):
+    """Pragmas e BEGIN IMMEDIATE do perfil de produção do SQLite (core/settings.py)."""
+
+    def test_pragmas_and_immediate_transactions(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                PaymentMethod.objects.create(name='Pix')
+        self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
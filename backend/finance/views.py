@@ -1,126 +1,202 @@
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotAuthenticated, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 # Importação da Permissão (A correção do erro está aqui)
 from rest_framework.permissions import IsAuthenticated 
-from django.db import transaction
-from django.db.models import F, Sum
-from django.utils import timezone
-from datetime import timedelta
-from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q, Sum
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
 
 # Importação dos Modelos (Incluindo User do Django)
 from django.contrib.auth.models import User
-from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings
+from .models import PaymentMethod, Sale, SaleItem, FinancialTransaction, BusinessSettings, DailySalesSummary
 from inventory.models import Product
+from inventory.services import InsufficientStock, refresh_product_costs
+from core.conditional import ConditionalGetMixin
+from core.export import date_range, export_response
+from core.pagination import KeysetPagination
+from core.utils import parse_ids
+from .dashboard import adashboard_stats, dashboard_stats
+from .services import create_sale, sync_sales
 
 # Importação dos Serializers
 from .serializers import (
     PaymentMethodSerializer, 
     SaleSerializer, 
+    SaleSyncSerializer,
     FinancialTransactionSerializer, 
     BusinessSettingsSerializer,
     UserSerializer
 )
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+class PaymentMethodViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
+    etag_models = (PaymentMethod,)
 
 class SaleViewSet(viewsets.ModelViewSet):
     """
     Gerencia Vendas.
     Ao criar uma venda:
-    1. Verifica estoque.
+    1. Baixa o estoque de forma condicional (falha se faltar saldo).
     2. Cria a venda e os itens.
-    3. Baixa o estoque.
-    4. Gera o lançamento financeiro (Receita Líquida - descontando taxas).
+    3. Gera o lançamento financeiro (Receita Líquida - descontando taxas).
+    4. Atualiza o resumo diário (DailySalesSummary) usado pelo Dashboard.
     """
-    queryset = Sale.objects.all().order_by('-created_at')
+    queryset = Sale.objects.select_related('payment_method').prefetch_related(
+        Prefetch('items', queryset=SaleItem.objects.select_related('product'))
+    ).order_by('-created_at', '-id')
     serializer_class = SaleSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
+    bulk_sync_limit = 5000
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # Reenvio (timeout/retentativa do PDV): devolve a venda já gravada
+        key = serializer.validated_data.get('idempotency_key')
+        if key:
+            existing = self.get_queryset().filter(idempotency_key=key).first()
+            if existing:
+                return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+
         try:
             with transaction.atomic():
-                items_data = serializer.validated_data.pop('items')
-                sale_data = serializer.validated_data
-                
-                # Verificação de Estoque
-                for item in items_data:
-                    product = item['product'] 
-                    qty = item['quantity']
-                    product_db = Product.objects.select_for_update().get(id=product.id)
-                    if product_db.stock_quantity < qty:
-                        raise ValueError(f"Estoque insuficiente para {product.name}.")
-
-                sale = Sale.objects.create(**sale_data)
-
-                # Baixa de Estoque e Criação dos Itens
-                for item in items_data:
-                    product = item['product']
-                    qty = item['quantity']
-                    price = item['unit_price']
-                    SaleItem.objects.create(sale=sale, product=product, quantity=qty, unit_price=price)
-                    Product.objects.filter(id=product.id).update(stock_quantity=F('stock_quantity') - qty)
-
-                # --- LÓGICA FINANCEIRA ---
-                method = sale.payment_method
-                method_name = method.name.lower()
-                
-                # 1. Calcular o valor LÍQUIDO (descontando a taxa)
-                tax_rate = method.tax_rate if hasattr(method, 'tax_rate') and method.tax_rate else Decimal(0)
-                
-                fee_amount = sale.total_amount * (tax_rate / Decimal(100))
-                net_amount = sale.total_amount - fee_amount # Valor que entra no caixa
-                
-                # 2. Definir datas e status
-                trans_status = 'PAID'
-                due_date = sale.created_at.date()
-                
-                # Regra: Crédito = Pendente (30 dias)
-                if 'crédito' in method_name or 'credito' in method_name:
-                    trans_status = 'PENDING'
-                    due_date = sale.created_at.date() + timedelta(days=30)
-                
-                # 3. Criar Transação com valor LÍQUIDO
-                description = f"Venda #{sale.id}"
-                if sale.customer_name:
-                    description += f" - {sale.customer_name}"
-                
-                if fee_amount > 0:
-                    description += f" (Taxa {tax_rate}%: -R${fee_amount:.2f})"
-
-                FinancialTransaction.objects.create(
-                    description=description,
-                    amount=net_amount, # Salva o valor líquido
-                    type='REVENUE',
-                    sale=sale,
-                    date=sale.created_at.date(),
-                    due_date=due_date,
-                    status=trans_status
-                )
-
-                full_serializer = self.get_serializer(sale)
+                # Estoque, venda, itens, Kardex, financeiro e resumo diário (ver finance.services)
+                sale = create_sale(serializer.validated_data)
+
+                # Recarrega com select/prefetch do queryset (sem N+1 na resposta)
+                full_serializer = self.get_serializer(self.get_queryset().get(pk=sale.pk))
                 return Response(full_serializer.data, status=status.HTTP_201_CREATED)
 
+        except InsufficientStock as e:
+            return Response({"error": str(e), "shortages": e.shortages}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            print(f"Erro venda: {e}")
+        except IntegrityError:
+            # Retentativa simultânea com a mesma chave gravou primeiro (a consulta
+            # acima não a viu): é a mesma venda, não um erro
+            existing = self.get_queryset().filter(idempotency_key=key).first() if key else None
+            if existing is not None:
+                return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+            logger.exception("Erro venda")
+            return Response({"error": "Erro interno ao processar venda."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception:
+            logger.exception("Erro venda")
             return Response({"error": "Erro interno ao processar venda."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='bulk-sync')
+    def bulk_sync(self, request):
+        """
+        Sincroniza as vendas feitas offline no PDV em uma única requisição.
+        POST {"sales": [{"idempotency_key": "...", ...venda...}, ...]}
+
+        Cada venda passa pela mesma lógica de estoque, taxas e financeiro do
+        create. Resposta com um resultado por venda, na ordem de envio:
+        created | duplicate (chave já aceita) | rejected (sem estoque) | invalid.
+        """
+        entries = request.data.get('sales') if isinstance(request.data, dict) else request.data
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "Envie a lista de vendas em 'sales'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.bulk_sync_limit:
+            return Response({"error": f"Máximo de {self.bulk_sync_limit} vendas por sincronização."}, status=status.HTTP_400_BAD_REQUEST)
+        entries = [entry if isinstance(entry, dict) else {} for entry in entries]
+
+        # Produtos e formas de pagamento do lote inteiro: duas queries
+        product_ids = parse_ids(
+            item.get('product_id')
+            for entry in entries if isinstance(entry.get('items'), list)
+            for item in entry['items'] if isinstance(item, dict)
+        )
+        context = {
+            **self.get_serializer_context(),
+            'product_ids': set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True)),
+            'payment_methods': PaymentMethod.objects.in_bulk(parse_ids(entry.get('payment_method') for entry in entries)),
+        }
+
+        # Um único serializer para o lote (montar os campos custa mais que validar)
+        validator = SaleSyncSerializer(context=context)
+        results = [None] * len(entries)
+        valid = []
+        positions = []
+        for index, entry in enumerate(entries):
+            try:
+                valid.append(validator.run_validation(entry))
+                positions.append(index)
+            except ValidationError as e:
+                results[index] = {'idempotency_key': entry.get('idempotency_key'), 'status': 'invalid', 'errors': e.detail}
+
+        try:
+            for index, result in zip(positions, sync_sales(valid)):
+                results[index] = result
+        except Exception:
+            logger.exception("Erro na sincronização")
+            return Response({"error": "Erro interno ao sincronizar vendas."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        totals = {name: 0 for name in ('created', 'duplicate', 'rejected', 'invalid')}
+        for result in results:
+            totals[result['status']] += 1
+        return Response({**totals, 'results': results})
+
+    def perform_update(self, serializer):
+        # Remove os valores antigos do resumo e soma os novos
+        with transaction.atomic():
+            old = serializer.instance
+            DailySalesSummary.objects.register_sale(old, sign=-1)
+            fee_key = (old.payment_method_id, old.total_amount)
+
+            sale = serializer.save()
+            # Só recalcula a taxa se o valor ou a forma de pagamento mudaram
+            if (sale.payment_method_id, sale.total_amount) != fee_key:
+                sale.apply_fees()
+                sale.save(update_fields=['tax_rate', 'fee_amount', 'net_amount'])
+            DailySalesSummary.objects.register_sale(sale)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            DailySalesSummary.objects.register_sale(instance, sign=-1)
+            instance.delete()
+
+    # Uma linha por item (venda sem itens sai numa linha só, sem produto)
+    export_columns = [
+        ('id', 'Venda'), ('business_date', 'Data'), ('created_at', 'Data/Hora'),
+        ('customer_name', 'Cliente'), ('customer_phone', 'Telefone'),
+        ('payment_method__name', 'Forma de Pagamento'), ('status', 'Status'),
+        ('total_amount', 'Total da Venda'), ('tax_rate', 'Taxa (%)'), ('fee_amount', 'Valor da Taxa'),
+        ('net_amount', 'Valor Líquido'), ('items__product__name', 'Produto'),
+        ('items__quantity', 'Quantidade'), ('items__unit_price', 'Preço Unitário'), ('items__subtotal', 'Subtotal'),
+    ]
+
+    @action(detail=False)
+    def export(self, request):
+        """GET sales/export/?start_date=&end_date=&output=csv|xlsx (datas locais da venda)."""
+        queryset = Sale.objects.filter(**date_range(request, 'business_date')).order_by('business_date', 'id', 'items__id')
+        return export_response(request, queryset, self.export_columns, 'vendas')
+
 class FinancialTransactionViewSet(viewsets.ModelViewSet):
     """
     Gerencia o Livro Caixa (Receitas e Despesas).
     """
     queryset = FinancialTransaction.objects.all()
     serializer_class = FinancialTransactionSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-date', '-created_at', '-id')
 
     def get_queryset(self):
-        queryset = FinancialTransaction.objects.all().order_by('-date', '-created_at')
+        queryset = FinancialTransaction.objects.all().order_by('-date', '-created_at', '-id')
         
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -132,9 +208,48 @@ class FinancialTransactionViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class BusinessSettingsViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def totals(self, request):
+        """
+        GET transactions/totals/?start_date=&end_date=
+        Receitas e despesas pagas do período inteiro (o extrato vem paginado).
+        """
+        paid = Q(status='PAID')
+        totals = self.get_queryset().aggregate(
+            revenue=Sum('amount', filter=paid & Q(type='REVENUE')),
+            expense=Sum('amount', filter=paid & Q(type='EXPENSE')),
+        )
+        revenue, expense = totals['revenue'] or 0, totals['expense'] or 0
+        return Response({'revenue': revenue, 'expense': expense, 'balance': revenue - expense})
+
+    export_columns = [
+        ('id', 'Lançamento'), ('date', 'Data'), ('due_date', 'Vencimento'), ('description', 'Descrição'),
+        ('type', 'Tipo'), ('status', 'Status'), ('amount', 'Valor'), ('sale', 'Venda'),
+    ]
+
+    @action(detail=False)
+    def export(self, request):
+        """GET transactions/export/?start_date=&end_date=&output=csv|xlsx"""
+        queryset = FinancialTransaction.objects.filter(**date_range(request, 'date')).order_by('date', 'id')
+        return export_response(request, queryset, self.export_columns, 'lancamentos')
+
+class BusinessSettingsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = BusinessSettings.objects.all()
     serializer_class = BusinessSettingsSerializer
+    etag_models = (BusinessSettings,)
+
+    # Valor da hora entra no custo de mão de obra de todos os produtos
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+            refresh_product_costs()
+
+    def perform_update(self, serializer):
+        old_rate = serializer.instance.hourly_labor_rate
+        with transaction.atomic():
+            settings = serializer.save()
+            if settings.hourly_labor_rate != old_rate:
+                refresh_product_costs()
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -146,95 +261,37 @@ class UserViewSet(viewsets.ModelViewSet):
 
 class DashboardStatsView(APIView):
     """
-    Fornece os KPIs para o Dashboard.
+    Fornece os KPIs para o Dashboard (ver finance/dashboard.py).
+    Cacheado por data local; o header X-Cache indica HIT ou MISS.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Timezone fix: Converte UTC para Local antes de pegar a data
-        now = timezone.localtime(timezone.now())
-        today = now.date()
-        first_day_month = today.replace(day=1)
-
-        # --- 1. VENDAS (Baseado no modelo Sale = Valor Bruto) ---
-        sales_today_qs = Sale.objects.filter(created_at__date=today)
-        sales_month_qs = Sale.objects.filter(created_at__date__gte=first_day_month)
-
-        # Totais Brutos
-        sales_today_total = sales_today_qs.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        sales_month_total = sales_month_qs.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-        # Cálculo das Taxas (Iterando sobre as vendas)
-        sales_today_fees = sum(
-            sale.total_amount * (sale.payment_method.tax_rate / Decimal(100)) 
-            for sale in sales_today_qs if hasattr(sale.payment_method, 'tax_rate') and sale.payment_method.tax_rate
-        )
+        payload, hit = dashboard_stats()
+        return Response(payload, headers={'X-Cache': 'HIT' if hit else 'MISS'})
 
-        sales_month_fees = sum(
-            sale.total_amount * (sale.payment_method.tax_rate / Decimal(100)) 
-            for sale in sales_month_qs if hasattr(sale.payment_method, 'tax_rate') and sale.payment_method.tax_rate
-        )
 
-        # Listas para detalhamento (Modal)
-        sales_today_list = [
-            {
-                "id": s.id, 
-                "amount": s.total_amount, 
-                "description": s.created_at.astimezone().strftime('%H:%M'), 
-                "sale__customer_name": s.customer_name
-            } 
-            for s in sales_today_qs.order_by('-created_at')
-        ]
-        
-        sales_month_list = [
-            {
-                "id": s.id, 
-                "amount": s.total_amount, 
-                "description": s.created_at.astimezone().strftime('%d/%m'), 
-                "sale__customer_name": s.customer_name
-            } 
-            for s in sales_month_qs.order_by('-created_at')[:10]
-        ]
-
-        # --- 2. FINANCEIRO (Previsão Futura) ---
-        future_in = FinancialTransaction.objects.filter(type='REVENUE', status='PENDING').aggregate(total=Sum('amount'))['total'] or 0
-        future_out = FinancialTransaction.objects.filter(type='EXPENSE', status='PENDING').aggregate(total=Sum('amount'))['total'] or 0
-
-        # --- 3. ESTOQUE ---
-        low_stock_qs = Product.objects.filter(stock_quantity__lte=5)
-        low_stock_count = low_stock_qs.count()
-        low_stock_list = low_stock_qs.values('id', 'name', 'stock_quantity')
-
-        # --- 4. GRÁFICO (Últimos 7 dias - Vendas Brutas) ---
-        sales_history = []
-        for i in range(6, -1, -1):
-            day = today - timedelta(days=i)
-            total = Sale.objects.filter(created_at__date=day).aggregate(t=Sum('total_amount'))['t'] or 0
-            sales_history.append({"date": day.strftime("%d/%m"), "value": total})
-
-        # --- 5. TOP PRODUTOS ---
-        top_products_qs = SaleItem.objects.filter(sale__created_at__date__gte=first_day_month)\
-            .values('product__name')\
-            .annotate(total_qty=Sum('quantity'))\
-            .order_by('-total_qty')[:5]
-        
-        top_products = [{"name": i['product__name'], "quantity": i['total_qty']} for i in top_products_qs]
+def _api_user(request):
+    """Autentica com as classes do DRF (JWT), para views fora do DRF."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
 
-        return Response({
-            "sales_today": sales_today_total,
-            "sales_today_fees": sales_today_fees,
-            "sales_today_list": sales_today_list,
-            
-            "sales_month": sales_month_total,
-            "sales_month_fees": sales_month_fees,
-            "sales_month_list": sales_month_list,
-            
-            "future_in": future_in,
-            "future_out": future_out,
-            
-            "low_stock_count": low_stock_count,
-            "low_stock_list": list(low_stock_list),
-            
-            "sales_history": sales_history,
-            "top_products": top_products
-        })
\ No newline at end of file
+
+@require_GET
+async def dashboard_stats_async(request):
+    """
+    Variante async do Dashboard (mesmo payload e cache de DashboardStatsView).
+    Sob ASGI, os grupos de queries independentes rodam ao mesmo tempo
+    (finance.dashboard.acompute_dashboard): latência ~ do grupo mais lento.
+    """
+    try:
+        user = await sync_to_async(_api_user)(request)
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+    except APIException as e:
+        return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+    payload, hit = await adashboard_stats()
+    response = HttpResponse(JSONRenderer().render(payload), content_type='application/json')
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
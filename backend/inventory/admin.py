@@ -1,6 +1,6 @@
 from django.contrib import admin
 # Note que aqui importamos APENAS coisas de estoque
-from .models import Category, Material, Product, ProductComposition
+from .models import Category, Material, Product, ProductComposition, StockMovement
 
 class ProductCompositionInline(admin.TabularInline):
     model = ProductComposition
@@ -12,4 +12,16 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductCompositionInline]
 
 admin.site.register(Category)
-admin.site.register(Material)
\ No newline at end of file
+admin.site.register(Material)
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('date', 'kind', 'material', 'product', 'quantity', 'reference')
+    list_filter = ('kind', 'date')
+
+    # Kardex é somente inclusão: correções entram como novo ajuste
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class InventoryConfig(AppConfig):
     name = 'inventory'
+
+    def ready(self):
+        from core.conditional import track_versions
+        from . import signals  # noqa: F401
+        from .models import Category, Material, Product, ProductComposition
+
+        track_versions(Category, Material, Product, ProductComposition)
+        post_migrate.connect(_ensure_search_index, sender=self)
+
+
+def _ensure_search_index(using, **kwargs):
+    from django.db import connections
+    from .search import ensure_search_index
+
+    ensure_search_index(connections[using])
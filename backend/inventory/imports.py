@@ -0,0 +1,397 @@
+"""
+Importação em lote do cadastro a partir de planilhas (CSV/XLSX):
+materiais, produtos e fichas técnicas.
+
+O arquivo inteiro é validado em memória contra os cadastros pré-carregados
+(uma query por tabela, nenhuma por linha). Com qualquer erro nada é gravado
+e o relatório traz os erros por linha; `dry_run` só valida e conta o que
+seria criado/atualizado. Sem erros, tudo é gravado em lotes (bulk_create
+com upsert / bulk_update) numa transação só, com Kardex, custos, catálogo
+do PDV e versões (ETag) atualizados como nas telas de cadastro.
+
+A validação roda fora da transação (segundos em arquivos grandes) e sem
+travar o cadastro, então a gravação não confia no que foi lido: cada linha
+grava só as colunas que preencheu, e o estoque entra como diferença
+(estoque += arquivo - lido, o mesmo valor do ajuste no Kardex). Vendas
+feitas durante a importação continuam baixadas.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from core.conditional import bump_version
+
+from .models import Category, Material, Product, ProductComposition
+from .services import increment_stock, record_movements, refresh_product_costs, touch_catalog
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 500
+
+# Cabeçalhos aceitos (já normalizados por core.spreadsheet) => campo
+MATERIAL_COLUMNS = {
+    'name': 'name', 'nome': 'name', 'material': 'name',
+    'unit': 'unit', 'unidade': 'unit',
+    'current_cost': 'current_cost', 'custo': 'current_cost', 'custo_atual': 'current_cost',
+    'stock_quantity': 'stock_quantity', 'estoque': 'stock_quantity',
+}
+PRODUCT_COLUMNS = {
+    'sku': 'sku', 'codigo': 'sku',
+    'name': 'name', 'nome': 'name', 'produto': 'name',
+    'price': 'price', 'preco': 'price', 'preco_de_venda': 'price',
+    'category': 'category', 'categoria': 'category',
+    'stock_quantity': 'stock_quantity', 'estoque': 'stock_quantity',
+    'labor_time_minutes': 'labor_time_minutes', 'tempo_minutos': 'labor_time_minutes', 'mao_de_obra_minutos': 'labor_time_minutes',
+    'profit_margin': 'profit_margin', 'margem': 'profit_margin', 'margem_de_lucro': 'profit_margin',
+    'acquisition_price': 'acquisition_price', 'preco_de_aquisicao': 'acquisition_price',
+}
+RECIPE_COLUMNS = {
+    'product_sku': 'product_sku', 'sku': 'product_sku', 'produto_sku': 'product_sku',
+    'material': 'material', 'material_name': 'material', 'nome_material': 'material',
+    'quantity': 'quantity', 'quantidade': 'quantity',
+}
+
+MATERIAL_UNITS = {unit for unit, _ in Material._meta.get_field('unit').choices}
+PRODUCT_FIELDS = ('name', 'price', 'category', 'stock_quantity', 'labor_time_minutes', 'profit_margin', 'acquisition_price')
+
+
+def parse_decimal(value, max_digits=10, decimal_places=2):
+    """'1.234,56', '1234.56' ou 'R$ 10,5' => Decimal; ValueError se inválido ou fora do limite."""
+    text = value.replace('R$', '').replace(' ', '')
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError("Número inválido.")
+    if not number.is_finite():
+        raise ValueError("Número inválido.")
+    if number < 0:
+        raise ValueError("Não pode ser negativo.")
+    number = number.quantize(Decimal(1).scaleb(-decimal_places))
+    if number >= Decimal(10) ** (max_digits - decimal_places):
+        raise ValueError("Valor acima do limite.")
+    return number
+
+
+def _field(row, name, errors, required=False, **limits):
+    """Valor de um campo numérico/texto da linha (None = não informado)."""
+    value = row.get(name, '')
+    if value == '':
+        if required:
+            errors[name] = "Campo obrigatório."
+        return None
+    if not limits:
+        return value
+    try:
+        return parse_decimal(value, **limits)
+    except ValueError as e:
+        errors[name] = str(e)
+        return None
+
+
+def _columns(columns, aliases):
+    """Campos presentes no cabeçalho (colunas desconhecidas são ignoradas)."""
+    return {aliases[column] for column in columns if column in aliases}
+
+
+def _rename(row, aliases):
+    return {aliases[key]: value for key, value in row.items() if key in aliases}
+
+
+class _Report:
+    def __init__(self, kind, lines, dry_run):
+        self.data = {'kind': kind, 'dry_run': dry_run, 'rows': len(lines), 'created': 0, 'updated': 0,
+                     'error_count': 0, 'errors': []}
+
+    def error(self, line, errors):
+        self.data['error_count'] += 1
+        if len(self.data['errors']) < MAX_REPORTED_ERRORS:
+            self.data['errors'].append({'line': line, 'errors': errors})
+
+    def missing_columns(self, present, required):
+        missing = [name for name in required if name not in present]
+        if missing:
+            self.error(1, {name: "Coluna obrigatória ausente." for name in missing})
+        return bool(missing)
+
+    @property
+    def failed(self):
+        return self.data['error_count'] > 0
+
+
+# --- MATERIAIS ---
+
+def _plan_materials(columns, lines, report):
+    fields = _columns(columns, MATERIAL_COLUMNS)
+    if report.missing_columns(fields, ['name']):
+        return None
+
+    # Nome (sem caixa) => material; havendo repetidos no banco, vale o mais antigo
+    existing = {}
+    for material in Material.objects.order_by('-id'):
+        existing[material.name.strip().lower()] = material
+
+    seen = {}
+    plan = {'create': [], 'update': {}, 'adjustments': {}, 'cost_changed': []}
+    for number, raw in lines:
+        row = _rename(raw, MATERIAL_COLUMNS)
+        errors = {}
+        name = _field(row, 'name', errors, required=True)
+        key = name.lower() if name else None
+        if name and len(name) > 200:
+            errors['name'] = "Máximo de 200 caracteres."
+        if key in seen:
+            errors['name'] = f"Material repetido no arquivo (linha {seen[key]})."
+        material = existing.get(key)
+
+        unit = _field(row, 'unit', errors, required=material is None)
+        if unit is not None:
+            unit = unit.upper()
+            if unit not in MATERIAL_UNITS:
+                errors['unit'] = f"Unidade inválida (use {', '.join(sorted(MATERIAL_UNITS))})."
+        cost = _field(row, 'current_cost', errors, max_digits=10, decimal_places=2)
+        stock = _field(row, 'stock_quantity', errors, max_digits=10, decimal_places=3)
+
+        if errors:
+            report.error(number, errors)
+            continue
+        seen[key] = number
+
+        if material is None:
+            material = Material(name=name, unit=unit, current_cost=cost or 0, stock_quantity=stock or 0)
+            plan['create'].append(material)
+            continue
+
+        changes = {'unit': unit, 'current_cost': cost}
+        changes = {attr: value for attr, value in changes.items() if value is not None and getattr(material, attr) != value}
+        if stock is not None and stock != material.stock_quantity:
+            plan['adjustments'][material.id] = stock - material.stock_quantity
+        if cost is not None and cost != material.current_cost:
+            plan['cost_changed'].append(material.id)
+        for attr, value in changes.items():
+            setattr(material, attr, value)
+        report.data['updated'] += 1
+        if changes:
+            plan['update'].setdefault(tuple(sorted(changes)), []).append(material)
+
+    report.data['created'] = len(plan['create'])
+    return plan
+
+
+def _write_materials(plan):
+    created = Material.objects.bulk_create(plan['create'], batch_size=BATCH_SIZE)
+    for fields, materials in plan['update'].items():
+        Material.objects.bulk_update(materials, fields, batch_size=BATCH_SIZE)
+    increment_stock(Material, plan['adjustments'])
+    bump_version(Material)
+
+    record_movements(Material, {m.id: m.stock_quantity for m in created}, 'OPENING', 'Importação')
+    record_movements(Material, plan['adjustments'], 'ADJUSTMENT', 'Importação')
+    if plan['cost_changed']:
+        refresh_product_costs(materials=plan['cost_changed'])
+
+
+# --- PRODUTOS ---
+
+def _plan_products(columns, lines, report):
+    fields = _columns(columns, PRODUCT_COLUMNS)
+    if report.missing_columns(fields, ['sku']):
+        return None
+    if not any(name in fields for name in PRODUCT_FIELDS):
+        report.error(1, {'columns': "Nenhuma coluna de produto para importar além do SKU."})
+        return None
+
+    existing = {product.sku: product for product in Product.objects.exclude(sku=None).only('id', 'sku', *PRODUCT_FIELDS)}
+    categories = {}
+    for category in Category.objects.order_by('-id'):
+        categories[category.name.strip().lower()] = category.id
+
+    seen = {}
+    plan = {'products': [], 'new_categories': {}, 'opening': {}, 'adjustments': {}}
+    for number, raw in lines:
+        row = _rename(raw, PRODUCT_COLUMNS)
+        errors = {}
+        sku = _field(row, 'sku', errors, required=True)
+        if sku and len(sku) > 50:
+            errors['sku'] = "Máximo de 50 caracteres."
+        if sku in seen:
+            errors['sku'] = f"SKU repetido no arquivo (linha {seen[sku]})."
+        current = existing.get(sku)
+
+        name = _field(row, 'name', errors, required=current is None)
+        if name and len(name) > 200:
+            errors['name'] = "Máximo de 200 caracteres."
+        values = {
+            'name': name,
+            'price': _field(row, 'price', errors, required=current is None, max_digits=10, decimal_places=2),
+            'stock_quantity': _field(row, 'stock_quantity', errors, max_digits=10, decimal_places=2),
+            'profit_margin': _field(row, 'profit_margin', errors, max_digits=5, decimal_places=2),
+            'acquisition_price': _field(row, 'acquisition_price', errors, max_digits=10, decimal_places=2),
+        }
+        minutes = _field(row, 'labor_time_minutes', errors)
+        if minutes is not None:
+            if not minutes.isdigit():
+                errors['labor_time_minutes'] = "Informe um número inteiro de minutos."
+            else:
+                values['labor_time_minutes'] = int(minutes)
+        category = _field(row, 'category', errors)
+        if category and len(category) > 100:
+            errors['category'] = "Máximo de 100 caracteres."
+
+        if errors:
+            report.error(number, errors)
+            continue
+        seen[sku] = number
+
+        # Objeto completo (o INSERT de um SKU novo grava todas as colunas):
+        # parte do produto atual e sobrescreve só o que veio preenchido
+        product = Product(sku=sku)
+        if current is not None:
+            for attr in PRODUCT_FIELDS:
+                setattr(product, f'{attr}_id' if attr == 'category' else attr,
+                        getattr(current, 'category_id' if attr == 'category' else attr))
+        for attr, value in values.items():
+            if value is not None:
+                setattr(product, attr, value)
+
+        # Colunas que o upsert reescreve num SKU existente: só as preenchidas,
+        # e o estoque nunca (entra como diferença em _write_products)
+        sent = {attr for attr, value in values.items() if value is not None and attr != 'stock_quantity'}
+        category_name = None
+        if category:
+            sent.add('category')
+            key = category.lower()
+            if key in categories:
+                product.category_id = categories[key]
+            else:
+                plan['new_categories'].setdefault(key, category)
+                category_name = key
+
+        if current is None:
+            report.data['created'] += 1
+            if product.stock_quantity:
+                plan['opening'][sku] = product.stock_quantity
+        else:
+            report.data['updated'] += 1
+            if values['stock_quantity'] is not None and values['stock_quantity'] != current.stock_quantity:
+                plan['adjustments'][sku] = values['stock_quantity'] - current.stock_quantity
+        plan['products'].append((product, category_name, tuple(sorted(sent)) or ('sku',)))
+
+    report.data['categories_created'] = len(plan['new_categories'])
+    return plan
+
+
+def _write_products(plan):
+    if plan['new_categories']:
+        created = Category.objects.bulk_create([Category(name=name) for name in plan['new_categories'].values()])
+        ids = {category.name.lower(): category.id for category in created}
+        for product, category_name, _ in plan['products']:
+            if category_name:
+                product.category_id = ids[category_name]
+        bump_version(Category)
+
+    groups = {}
+    for product, _, fields in plan['products']:
+        groups.setdefault(fields, []).append(product)
+    for fields, rows in groups.items():
+        Product.objects.bulk_create(
+            rows, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['sku'], update_fields=list(fields),
+        )
+    products = [product for product, _, _ in plan['products']]
+    # Ids dos produtos (o upsert devolve também os já existentes onde o banco suporta)
+    if any(product.pk is None for product in products):
+        skus = [product.sku for product in products]
+        ids = {}
+        for start in range(0, len(skus), BATCH_SIZE):
+            ids.update(Product.objects.filter(sku__in=skus[start:start + BATCH_SIZE]).values_list('sku', 'id'))
+        for product in products:
+            product.pk = ids[product.sku]
+    ids = {product.sku: product.pk for product in products}
+
+    adjustments = {ids[sku]: qty for sku, qty in plan['adjustments'].items()}
+    increment_stock(Product, adjustments)
+    touch_catalog(ids.values())
+    bump_version(Product)
+    record_movements(Product, {ids[sku]: qty for sku, qty in plan['opening'].items()}, 'OPENING', 'Importação')
+    record_movements(Product, adjustments, 'ADJUSTMENT', 'Importação')
+    refresh_product_costs(products=list(ids.values()))
+
+
+# --- FICHAS TÉCNICAS ---
+
+def _plan_recipes(columns, lines, report):
+    fields = _columns(columns, RECIPE_COLUMNS)
+    if report.missing_columns(fields, ['product_sku', 'material', 'quantity']):
+        return None
+
+    products = dict(Product.objects.exclude(sku=None).values_list('sku', 'id'))
+    materials = {}
+    for pk, name in Material.objects.order_by('-id').values_list('id', 'name'):
+        materials[name.strip().lower()] = pk
+    existing = set(ProductComposition.objects.values_list('product_id', 'material_id'))
+
+    seen = {}
+    plan = {'compositions': []}
+    for number, raw in lines:
+        row = _rename(raw, RECIPE_COLUMNS)
+        errors = {}
+        sku = _field(row, 'product_sku', errors, required=True)
+        material = _field(row, 'material', errors, required=True)
+        quantity = _field(row, 'quantity', errors, required=True, max_digits=10, decimal_places=3)
+        product_id = products.get(sku)
+        material_id = materials.get(material.lower()) if material else None
+        if sku and product_id is None:
+            errors['product_sku'] = "Produto não encontrado."
+        if material and material_id is None:
+            errors['material'] = "Material não encontrado."
+        if quantity is not None and quantity <= 0:
+            errors['quantity'] = "A quantidade deve ser maior que zero."
+        key = (product_id, material_id)
+        if not errors and key in seen:
+            errors['material'] = f"Material repetido na ficha deste produto (linha {seen[key]})."
+
+        if errors:
+            report.error(number, errors)
+            continue
+        seen[key] = number
+        report.data['updated' if key in existing else 'created'] += 1
+        plan['compositions'].append(ProductComposition(product_id=product_id, material_id=material_id, quantity=quantity))
+    return plan
+
+
+def _write_recipes(plan):
+    # Linhas novas entram; (produto, material) já existente tem a quantidade
+    # atualizada. Materiais fora do arquivo continuam na ficha.
+    compositions = plan['compositions']
+    ProductComposition.objects.bulk_create(
+        compositions, batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['product', 'material'], update_fields=['quantity'],
+    )
+    bump_version(ProductComposition)
+    refresh_product_costs(products={composition.product_id for composition in compositions})
+
+
+IMPORTERS = {
+    'materials': (_plan_materials, _write_materials),
+    'products': (_plan_products, _write_products),
+    'recipes': (_plan_recipes, _write_recipes),
+}
+
+
+def import_catalog(kind, columns, lines, dry_run=False):
+    """
+    Importa as linhas lidas por core.spreadsheet.read_rows.
+    `kind`: 'materials', 'products' ou 'recipes'.
+
+    Retorna o relatório: {'kind', 'dry_run', 'rows', 'created', 'updated',
+    'error_count', 'errors': [{'line', 'errors': {campo: mensagem}}]}.
+    Nada é gravado se houver erro ou em dry_run.
+    """
+    plan_rows, write = IMPORTERS[kind]
+    report = _Report(kind, lines, dry_run)
+    plan = plan_rows(columns, lines, report)
+    if plan is not None and not report.failed and not dry_run:
+        with transaction.atomic():
+            write(plan)
+    return report.data
@@ -0,0 +1,80 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.models import Product
+from inventory.search import search_products
+
+WORDS = [
+    'Colar', 'Pulseira', 'Brinco', 'Anel', 'Tornozeleira', 'Chaveiro', 'Tiara', 'Broche',
+    'Pérola', 'Miçanga', 'Cristal', 'Macramê', 'Crochê', 'Couro', 'Algodão', 'Prata',
+    'Dourado', 'Azul', 'Verde', 'Lilás', 'Coração', 'Estrela', 'Lua', 'Flor', 'Árvore',
+]
+QUERIES = ['col', 'perola', 'MICANGA azul', 'croche lil', 'cora', 'pulseira couro verde', 'an', 'arv dou']
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_benchmark(products=100_000, repeat=50, limit=20):
+    """
+    Cria `products` produtos sintéticos numa transação, mede a busca e
+    desfaz tudo no fim (o banco não muda). Retorna tempos em milissegundos.
+    """
+    rng = random.Random(42)
+    result = {}
+    try:
+        with transaction.atomic():
+            started = time.perf_counter()
+            batch = []
+            for index in range(products):
+                name = ' '.join(rng.sample(WORDS, 3))
+                batch.append(Product(name=f'{name} {index}', sku=f'BENCH-{index:06d}', price=Decimal('10')))
+                if len(batch) == 5000:
+                    Product.objects.bulk_create(batch)
+                    batch = []
+            Product.objects.bulk_create(batch)
+            result['load_seconds'] = time.perf_counter() - started
+
+            queries = QUERIES + [f'BENCH-{rng.randrange(products):06d}' for _ in range(4)]
+            timings = []
+            for _ in range(repeat):
+                for query in queries:
+                    started = time.perf_counter()
+                    search_products(query, limit)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            result.update({
+                'queries': len(timings),
+                'p50': statistics.median(timings),
+                'p95': timings[int(len(timings) * 0.95) - 1],
+                'max': timings[-1],
+            })
+            raise _Rollback
+    except _Rollback:
+        pass
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a busca de produtos do PDV (products/search) com muitos produtos. "
+        "Os produtos de teste são criados numa transação desfeita no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=50, help="Rodadas do conjunto de buscas.")
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        r = run_benchmark(options['products'], options['repeat'], options['limit'])
+        self.stdout.write(f"Banco: {connection.vendor} | {options['products']} produtos carregados em {r['load_seconds']:.1f}s")
+        self.stdout.write(
+            f"{r['queries']} buscas: p50 {r['p50']:.2f} ms | p95 {r['p95']:.2f} ms | máx {r['max']:.2f} ms"
+        )
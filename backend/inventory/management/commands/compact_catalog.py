@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import compact_catalog_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta o log de versões do catálogo do PDV, mantendo só a última "
+        "alteração de cada produto (os deltas continuam corretos)."
+    )
+
+    def handle(self, *args, **options):
+        removed = compact_catalog_changes()
+        self.stdout.write(self.style.SUCCESS(f"Log do catálogo compactado: {removed} linhas removidas."))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.spreadsheet import SpreadsheetError, read_rows
+from inventory.imports import IMPORTERS, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa materiais, produtos ou fichas técnicas de uma planilha CSV/XLSX "
+        "(mesmas regras do endpoint imports/). Com qualquer erro nada é gravado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="Arquivo .csv ou .xlsx")
+        parser.add_argument('--dry-run', action='store_true', help="Só valida e mostra o relatório.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                columns, lines = read_rows(file, options['path'])
+        except (OSError, SpreadsheetError) as e:
+            raise CommandError(str(e))
+
+        report = import_catalog(options['kind'], columns, lines, options['dry_run'])
+        for error in report['errors']:
+            details = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+            self.stderr.write(f"Linha {error['line']}: {details}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"... e mais {report['error_count'] - len(report['errors'])} linha(s) com erro.")
+
+        summary = {key: report[key] for key in ('rows', 'created', 'updated', 'categories_created') if key in report}
+        self.stdout.write(json.dumps(summary))
+        if report['error_count']:
+            raise CommandError(f"{report['error_count']} linha(s) com erro: nada foi gravado.")
+        if report['dry_run']:
+            self.stdout.write(self.style.WARNING("Simulação (--dry-run): nada foi gravado."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Importação concluída."))
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory.services import create_checkpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava o saldo de estoque de todos os itens no fim de um dia (checkpoint do Kardex). "
+        "Agende diariamente ou no fim de cada mês."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Dia a fechar (AAAA-MM-DD). Padrão: ontem.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else today - timedelta(days=1)
+        except ValueError as e:
+            raise CommandError(f"Data inválida: {e}")
+        # Movimentos de hoje ainda podem chegar: só dias encerrados
+        if day >= today:
+            raise CommandError("Só é possível fechar dias anteriores a hoje.")
+
+        rows = create_checkpoint(day)
+        self.stdout.write(self.style.SUCCESS(f"Checkpoint de {day}: {rows} itens com saldo."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.models import Material, Product
+from inventory.services import ledger_differences, record_movements
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere o Kardex contra o estoque atual (stock_quantity) de materiais e produtos. "
+        "Com --fix, grava um ajuste para cada diferença."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Registra ajustes para igualar o Kardex ao estoque.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, label in ((Material, 'Material'), (Product, 'Produto')):
+            differences = ledger_differences(model)
+            total += len(differences)
+            for d in differences:
+                self.stdout.write(f"{label} #{d['id']} {d['name']}: Kardex {d['ledger']} x estoque {d['stock']}")
+            if differences and options['fix']:
+                with transaction.atomic():
+                    record_movements(model, {d['id']: d['stock'] - d['ledger'] for d in differences},
+                                     'ADJUSTMENT', 'Conciliação')
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS("OK: Kardex confere com o estoque."))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(f"{total} diferença(s) ajustada(s)."))
+        else:
+            raise CommandError(f"{total} diferença(s) entre o Kardex e o estoque.")
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_quantity'], name='product_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['date', 'created_at', 'id'], name='purchase_listing_idx'),
+        ),
+    ]
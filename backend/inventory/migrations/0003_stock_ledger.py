@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-17 21:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Saldo atual de cada material/produto vira o movimento de abertura do Kardex."""
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    movements = []
+    for model_name, field in (('Material', 'material_id'), ('Product', 'product_id')):
+        model = apps.get_model('inventory', model_name)
+        for pk, quantity in model.objects.exclude(stock_quantity=0).values_list('id', 'stock_quantity'):
+            movements.append(StockMovement(**{field: pk}, kind='OPENING', quantity=quantity, reference='Saldo inicial'))
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inventory.material')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='stockcheckpoint_date_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('material__isnull', False)), fields=('material', 'date'), name='unique_material_checkpoint'), models.UniqueConstraint(condition=models.Q(('product__isnull', False)), fields=('product', 'date'), name='unique_product_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OPENING', 'Saldo Inicial'), ('PURCHASE', 'Compra'), ('PRODUCTION_OUT', 'Consumo na Produção'), ('PRODUCTION_IN', 'Entrada da Produção'), ('SALE', 'Venda'), ('ADJUSTMENT', 'Ajuste')], max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reference', models.CharField(blank=True, help_text='Ex.: Venda #10, Compra #3', max_length=50)),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.material')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['material', 'date'], name='stockmovement_material_idx'), models.Index(fields=['product', 'date'], name='stockmovement_product_idx'), models.Index(fields=['date'], name='stockmovement_date_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('material__isnull', False), ('product__isnull', True)), models.Q(('material__isnull', True), ('product__isnull', False)), _connector='OR'), name='stockmovement_one_item')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-17 21:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def compute_costs(apps, schema_editor):
+    """Preenche os custos materializados de todos os produtos."""
+    Product = apps.get_model('inventory', 'Product')
+    ProductComposition = apps.get_model('inventory', 'ProductComposition')
+    BusinessSettings = apps.get_model('finance', 'BusinessSettings')
+
+    settings = BusinessSettings.objects.first()
+    hourly_rate = settings.hourly_labor_rate if settings else Decimal(0)
+    material_cost = {}
+    for product_id, quantity, cost in ProductComposition.objects.values_list('product_id', 'quantity', 'material__current_cost'):
+        material_cost[product_id] = material_cost.get(product_id, 0) + quantity * cost
+
+    cents = Decimal('0.01')
+    products = list(Product.objects.only('id', 'labor_time_minutes', 'profit_margin'))
+    for product in products:
+        product.material_cost = Decimal(material_cost.get(product.id, 0)).quantize(cents)
+        product.labor_cost = (Decimal(product.labor_time_minutes or 0) / 60 * hourly_rate).quantize(cents)
+        margin = 1 + Decimal(product.profit_margin or 0) / 100
+        product.suggested_price = ((product.material_cost + product.labor_cost) * margin).quantize(cents)
+    Product.objects.bulk_update(products, ['material_cost', 'labor_cost', 'suggested_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stock_ledger'),
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='labor_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='material_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='suggested_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(compute_costs, migrations.RunPython.noop),
+    ]
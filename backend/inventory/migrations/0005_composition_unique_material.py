@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 21:21
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Material repetido na mesma ficha técnica vira uma linha só (quantidades somadas)."""
+    ProductComposition = apps.get_model('inventory', 'ProductComposition')
+    duplicates = ProductComposition.objects.values('product_id', 'material_id')\
+        .annotate(rows=Count('id'), total=Sum('quantity')).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        lines = ProductComposition.objects.filter(product_id=row['product_id'], material_id=row['material_id']).order_by('id')
+        keep = lines.first()
+        lines.exclude(pk=keep.pk).delete()
+        ProductComposition.objects.filter(pk=keep.pk).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_product_costs'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productcomposition',
+            constraint=models.UniqueConstraint(fields=('product', 'material'), name='unique_product_material'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 6.0 on 2026-10-17 21:28
+
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations
+
+# SQLite: índice FTS5 externo (conteúdo fica em inventory_product), sem acento
+# e sem caixa, com índices de prefixo; triggers mantêm o índice em qualquer
+# escrita (inclusive UPDATE/bulk_create, que não passam pelo save()).
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE inventory_product_fts USING fts5(
+        name, sku,
+        content='inventory_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_update AFTER UPDATE OF name, sku ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO inventory_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    "INSERT INTO inventory_product_fts(inventory_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS inventory_product_fts_update",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_delete",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_insert",
+    "DROP TABLE IF EXISTS inventory_product_fts",
+]
+
+# PostgreSQL: tsvector (prefixo com :*) sobre nome + SKU sem acento; o índice
+# de expressão é mantido pelo próprio banco. A extensão unaccent vem do
+# CreateExtension abaixo, que só a cria se ainda não estiver instalada: é
+# "trusted" a partir do PostgreSQL 13 (basta o dono do banco); em versões
+# anteriores, um superusuário precisa rodar CREATE EXTENSION unaccent antes.
+POSTGRES_FORWARD = [
+    """
+    CREATE OR REPLACE FUNCTION trama_unaccent(text) RETURNS text AS $$
+        SELECT public.unaccent('public.unaccent', $1)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    """
+    CREATE INDEX product_search_idx ON inventory_product
+    USING gin (to_tsvector('simple', trama_unaccent(name || ' ' || coalesce(sku, ''))))
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS product_search_idx",
+    "DROP FUNCTION IF EXISTS trama_unaccent(text)",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor_statements = statements.get(schema_editor.connection.vendor, [])
+        for sql in vendor_statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_catalog_change'),
+    ]
+
+    operations = [
+        CreateExtension('unaccent'),
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_versions(apps, schema_editor):
+    """As mudanças já gravadas estão confirmadas: a versão delas é o próprio id."""
+    CatalogChange = apps.get_model('inventory', 'CatalogChange')
+    CatalogVersion = apps.get_model('inventory', 'CatalogVersion')
+    CatalogChange.objects.update(version=F('id'))
+    last = CatalogChange.objects.aggregate(last=Max('id'))['last'] or 0
+    CatalogVersion.objects.update_or_create(pk=1, defaults={'value': last})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='catalogchange',
+            name='version',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='catalogchange',
+            index=models.Index(fields=['version'], name='catalogchange_version_idx'),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
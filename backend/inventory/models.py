@@ -28,14 +28,40 @@ class Product(models.Model):
     profit_margin = models.DecimalField(max_digits=5, decimal_places=2, default=50.00)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    # Custos materializados (ver services.refresh_product_costs): recalculados
+    # quando muda a ficha técnica, o custo de um material ou o valor da hora
+    material_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    labor_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    suggested_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Alerta de estoque baixo (stock_quantity <= N)
+            models.Index(fields=['stock_quantity'], name='product_stock_idx'),
+        ]
+
     def __str__(self): 
         return self.name
 
+    def compute_costs(self, material_cost, hourly_rate):
+        """Mesma conta da tela de produto: insumos + mão de obra, preço sugerido por markup."""
+        cents = Decimal('0.01')
+        self.material_cost = Decimal(material_cost).quantize(cents)
+        self.labor_cost = (Decimal(self.labor_time_minutes or 0) / 60 * Decimal(hourly_rate)).quantize(cents)
+        margin = 1 + Decimal(self.profit_margin or 0) / 100
+        self.suggested_price = ((self.material_cost + self.labor_cost) * margin).quantize(cents)
+
 class ProductComposition(models.Model):
     product = models.ForeignKey(Product, related_name='composition', on_delete=models.CASCADE)
     material = models.ForeignKey(Material, on_delete=models.PROTECT)
     quantity = models.DecimalField(max_digits=10, decimal_places=3)
 
+    class Meta:
+        constraints = [
+            # Uma linha por material na ficha técnica (base do diff em sync_compositions)
+            models.UniqueConstraint(fields=['product', 'material'], name='unique_product_material'),
+        ]
+
     # CORREÇÃO: Propriedade calculada necessária para o Serializer
     @property
     def total_cost(self):
@@ -56,6 +82,11 @@ class Purchase(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'created_at', 'id'], name='purchase_listing_idx'),
+        ]
+
     def __str__(self): 
         return f"Compra #{self.id} - {self.supplier} ({self.date})"
 
@@ -71,4 +102,99 @@ class PurchaseItem(models.Model):
     effective_unit_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Custo Final (Com Frete)")
 
     def __str__(self):
-        return f"{self.quantity}x {self.material.name}"
\ No newline at end of file
+        return f"{self.quantity}x {self.material.name}"
+
+# --- KARDEX (Movimentação de Estoque) ---
+
+class StockMovement(models.Model):
+    """
+    Toda entrada e saída de estoque (somente inclusão, nunca alterado).
+    Quantidade positiva = entrada, negativa = saída.
+    Cada linha é de um Material OU de um Produto.
+    """
+    KINDS = [
+        ('OPENING', 'Saldo Inicial'),
+        ('PURCHASE', 'Compra'),
+        ('PRODUCTION_OUT', 'Consumo na Produção'),
+        ('PRODUCTION_IN', 'Entrada da Produção'),
+        ('SALE', 'Venda'),
+        ('ADJUSTMENT', 'Ajuste'),
+    ]
+
+    material = models.ForeignKey(Material, related_name='movements', on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, related_name='movements', on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    quantity = models.DecimalField(max_digits=12, decimal_places=3)
+    # Data local do movimento (base dos relatórios e checkpoints)
+    date = models.DateField(default=timezone.localdate)
+    created_at = models.DateTimeField(auto_now_add=True)
+    reference = models.CharField(max_length=50, blank=True, help_text="Ex.: Venda #10, Compra #3")
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(material__isnull=False, product__isnull=True) | models.Q(material__isnull=True, product__isnull=False),
+                name='stockmovement_one_item',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['material', 'date'], name='stockmovement_material_idx'),
+            models.Index(fields=['product', 'date'], name='stockmovement_product_idx'),
+            models.Index(fields=['date'], name='stockmovement_date_idx'),
+        ]
+
+    def __str__(self):
+        item = self.material or self.product
+        return f"{self.get_kind_display()}: {self.quantity} {item} ({self.date})"
+
+class StockCheckpoint(models.Model):
+    """
+    Saldo de cada item no fim de um dia (gerado por `manage.py stock_checkpoint`).
+    O saldo numa data = último checkpoint + movimentos depois dele.
+    """
+    material = models.ForeignKey(Material, related_name='checkpoints', on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, related_name='checkpoints', on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'date'], condition=models.Q(material__isnull=False), name='unique_material_checkpoint'),
+            models.UniqueConstraint(fields=['product', 'date'], condition=models.Q(product__isnull=False), name='unique_product_checkpoint'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='stockcheckpoint_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.material or self.product}: {self.quantity} em {self.date}"
+
+# --- CATÁLOGO DO PDV ---
+
+class CatalogChange(models.Model):
+    """
+    Log de alterações do catálogo do PDV (somente inclusão).
+    `version` é a versão do catálogo: `catalog/?since=<versão>` devolve só os
+    produtos alterados ou excluídos depois dela. Ela é dada depois do commit
+    (services.catalog_version), na ordem em que as mudanças ficam visíveis;
+    o id sai no INSERT e não serve (transação lenta com id menor confirma depois).
+    """
+    # Sem FK: o produto pode ter sido excluído
+    product_id = models.BigIntegerField()
+    version = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version'], name='catalogchange_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"v{self.version}: produto #{self.product_id}"
+
+
+class CatalogVersion(models.Model):
+    """Linha única com a última versão dada ao catálogo (CatalogChange.version)."""
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"v{self.value}"
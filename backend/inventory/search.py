@@ -0,0 +1,118 @@
+"""
+Busca de produtos do PDV por nome (prefixo, sem acento) e SKU.
+
+- SQLite: tabela FTS5 `inventory_product_fts` mantida por triggers.
+- PostgreSQL: índice GIN de tsvector sobre nome + SKU sem acento.
+- Outros bancos: icontains (sem índice).
+
+O índice é criado pela migração 0007; `ensure_search_index` (post_migrate)
+recria os triggers do SQLite se uma migração futura reconstruir a tabela
+de produtos (o SQLite apaga os triggers junto com a tabela antiga).
+"""
+import re
+
+from django.db import connection
+
+from .models import Product
+
+SEARCH_FIELDS = ('id', 'name', 'sku', 'price', 'stock_quantity', 'category', 'category__name')
+MAX_TOKENS = 8
+
+SQLITE_TRIGGERS = {
+    'inventory_product_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+        END
+    """,
+    'inventory_product_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        END
+    """,
+    'inventory_product_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS inventory_product_fts_update AFTER UPDATE OF name, sku ON inventory_product BEGIN
+            INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+            INSERT INTO inventory_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+        END
+    """,
+}
+
+POSTGRES_DOCUMENT = "to_tsvector('simple', trama_unaccent(name || ' ' || coalesce(sku, '')))"
+
+
+def ensure_search_index(using_connection=None):
+    """Recria os triggers do FTS5 que faltarem e reindexa (só SQLite)."""
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'inventory_product_fts'")
+        if cursor.fetchone() is None:
+            return  # Migração 0007 ainda não aplicada
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'inventory_product_fts_%'")
+        missing = set(SQLITE_TRIGGERS) - {row[0] for row in cursor.fetchall()}
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            cursor.execute("INSERT INTO inventory_product_fts(inventory_product_fts) VALUES ('rebuild')")
+
+
+def _tokens(query):
+    return re.findall(r'\w+', query)[:MAX_TOKENS]
+
+
+def _matching_ids(tokens, limit):
+    """Ids em ordem de relevância (todos os termos, cada um como prefixo)."""
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            # bm25 sobre todos os casamentos, com o LIMIT dentro do próprio FTS5
+            cursor.execute(
+                "SELECT rowid FROM inventory_product_fts WHERE inventory_product_fts MATCH %s "
+                "ORDER BY bm25(inventory_product_fts), rowid DESC LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    if connection.vendor == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM inventory_product "
+                f"WHERE {POSTGRES_DOCUMENT} @@ to_tsquery('simple', trama_unaccent(%s)) "
+                f"ORDER BY ts_rank({POSTGRES_DOCUMENT}, to_tsquery('simple', trama_unaccent(%s))) DESC, name "
+                f"LIMIT %s",
+                [query, query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    queryset = Product.objects.all()
+    for token in tokens:
+        queryset = queryset.filter(name__icontains=token)
+    return list(queryset.order_by('name').values_list('id', flat=True)[:limit])
+
+
+def search_products(query, limit=20):
+    """
+    Até `limit` produtos para o termo digitado no PDV: SKU exato (leitor de
+    código de barras) responde só com o produto; senão, nome/SKU por prefixo
+    de cada palavra (sem acento, sem caixa), por relevância.
+    Retorna a mesma projeção do catálogo do PDV.
+    """
+    query = (query or '').strip()
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+
+    ids = list(Product.objects.filter(sku=query).values_list('id', flat=True))
+    if not ids:
+        ids = _matching_ids(tokens, limit)
+
+    rows = {row['id']: row for row in Product.objects.filter(id__in=ids).values(*SEARCH_FIELDS)}
+    results = []
+    for pk in ids:
+        if pk in rows:
+            row = rows[pk]
+            row['category_name'] = row.pop('category__name')
+            results.append(row)
+    return results
@@ -1,5 +1,7 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import Category, Material, Product, ProductComposition, Purchase, PurchaseItem
+from .models import Category, Material, Product, ProductComposition, Purchase, PurchaseItem, StockMovement
+from .services import receive_materials, refresh_product_costs, sync_compositions
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,16 +13,21 @@ class MaterialSerializer(serializers.ModelSerializer):
         model = Material
         fields = '__all__'
 
+    def update(self, instance, validated_data):
+        # Só as colunas enviadas: um save() completo regravaria o saldo lido
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 # --- SERIALIZERS DE COMPRA ---
 
 class PurchaseItemSerializer(serializers.ModelSerializer):
     material_name = serializers.ReadOnlyField(source='material.name')
     material_unit = serializers.ReadOnlyField(source='material.unit')
     
-    # Recebemos o ID na escrita
-    material_id = serializers.PrimaryKeyRelatedField(
-        queryset=Material.objects.all(), source='material'
-    )
+    # Recebemos o ID na escrita (existência validada em lote no PurchaseSerializer)
+    material_id = serializers.IntegerField()
 
     class Meta:
         model = PurchaseItem
@@ -34,15 +41,51 @@ class PurchaseSerializer(serializers.ModelSerializer):
         model = Purchase
         fields = ['id', 'supplier', 'date', 'freight_cost', 'total_amount', 'items']
 
+    def validate_items(self, items):
+        # Uma única query para todos os materiais da nota
+        ids = {item['material_id'] for item in items}
+        found = set(Material.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = ids - found
+        if missing:
+            raise serializers.ValidationError(f"Material(is) não encontrado(s): {', '.join(map(str, sorted(missing)))}.")
+        return items
+
     def create(self, validated_data):
-        # Remove os itens do payload para criar o cabeçalho primeiro
+        """
+        Grava a nota em statements fixos, qualquer que seja o número de linhas:
+        1. Rateio do frete (proporcional ao valor de cada linha) em uma passada.
+        2. Cabeçalho já com o total e itens via bulk_create com o custo efetivo.
+        3. Estoque e custo atual dos materiais em um único UPDATE.
+        """
         items_data = validated_data.pop('items')
-        purchase = Purchase.objects.create(**validated_data)
-        
-        # Cria os itens vinculados
-        for item_data in items_data:
-            PurchaseItem.objects.create(purchase=purchase, **item_data)
-            
+        freight = validated_data.get('freight_cost') or Decimal(0)
+
+        # Calcula subtotal dos produtos (para peso financeiro)
+        subtotal_products = sum(item['quantity'] * item['unit_cost'] for item in items_data)
+
+        items = []
+        received = {}
+        costs = {}
+        for item in items_data:
+            item_total_raw = item['quantity'] * item['unit_cost']
+            if subtotal_products > 0:
+                # Parcela do frete proporcional ao valor da linha
+                item_freight_share = freight * (item_total_raw / subtotal_products)
+                new_unit_cost = (item_total_raw + item_freight_share) / item['quantity']
+                # "Último Preço Pago" como custo padrão do material
+                costs[item['material_id']] = new_unit_cost.quantize(Decimal('0.01'))
+            else:
+                new_unit_cost = item['unit_cost']
+
+            items.append(PurchaseItem(effective_unit_cost=new_unit_cost.quantize(Decimal('0.01')), **item))
+            received[item['material_id']] = received.get(item['material_id'], 0) + item['quantity']
+
+        purchase = Purchase.objects.create(total_amount=subtotal_products + freight, **validated_data)
+        for item in items:
+            item.purchase = purchase
+        PurchaseItem.objects.bulk_create(items)
+
+        receive_materials(received, costs, reference=f"Compra #{purchase.id}")
         return purchase
 
 # --- SERIALIZERS DE PRODUTO ---
@@ -55,7 +98,8 @@ class ProductCompositionSerializer(serializers.ModelSerializer):
     # CORREÇÃO: Definimos explicitamente como leitura para o DRF mapear a property do Model
     total_cost = serializers.ReadOnlyField() 
     
-    material_id = serializers.PrimaryKeyRelatedField(queryset=Material.objects.all(), source='material')
+    # Recebemos o ID na escrita (existência validada em lote no ProductSerializer)
+    material_id = serializers.IntegerField()
 
     class Meta:
         model = ProductComposition
@@ -68,24 +112,65 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['material_cost', 'labor_cost', 'suggested_price'] # Ver refresh_product_costs
+
+    def validate_composition(self, composition):
+        # Uma única query para todos os materiais da ficha (ou nenhuma, se o
+        # contexto já trouxer os ids válidos, como na edição em lote)
+        ids = {comp['material_id'] for comp in composition}
+        known = self.context.get('material_ids')
+        found = ids & known if known is not None else set(Material.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = ids - found
+        if missing:
+            raise serializers.ValidationError(f"Material(is) não encontrado(s): {', '.join(map(str, sorted(missing)))}.")
+        return composition
 
     def create(self, validated_data):
         composition_data = validated_data.pop('composition', [])
         product = Product.objects.create(**validated_data)
-        for comp in composition_data:
-            ProductComposition.objects.create(product=product, **comp)
+        sync_compositions({product.id: composition_data})
+        refresh_product_costs(products=[product])
         return product
 
     def update(self, instance, validated_data):
-        composition_data = validated_data.pop('composition', [])
+        composition_data = validated_data.pop('composition', None)
         # Atualização genérica de campos simples
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # Só as colunas enviadas: o saldo fica com increment/decrement_stock
+        instance.save(update_fields=list(validated_data))
 
-        # Atualiza composição (Limpa e recria)
+        # Composição: só o que mudou (diff por material); ausente = mantém
         if composition_data is not None:
-            instance.composition.all().delete()
-            for comp in composition_data:
-                ProductComposition.objects.create(product=instance, **comp)
-        return instance
\ No newline at end of file
+            sync_compositions({instance.id: composition_data})
+        refresh_product_costs(products=[instance])
+        return instance
+
+# --- SERIALIZERS DE PRODUÇÃO ---
+
+class ProductionOrderItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+class ProductionOrderSerializer(serializers.Serializer):
+    items = ProductionOrderItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        ids = {item['product_id'] for item in items}
+        found = set(Product.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = ids - found
+        if missing:
+            raise serializers.ValidationError(f"Produto(s) não encontrado(s): {', '.join(map(str, sorted(missing)))}.")
+        return items
+
+# --- SERIALIZERS DO KARDEX ---
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    material_name = serializers.ReadOnlyField(source='material.name')
+    product_name = serializers.ReadOnlyField(source='product.name')
+    kind_display = serializers.ReadOnlyField(source='get_kind_display')
+
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'date', 'created_at', 'kind', 'kind_display', 'material', 'material_name',
+                  'product', 'product_name', 'quantity', 'reference']
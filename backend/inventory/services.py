@@ -0,0 +1,420 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+
+from core.conditional import bump_version
+from finance.models import BusinessSettings
+
+from .models import CatalogChange, CatalogVersion, Material, Product, ProductComposition, StockCheckpoint, StockMovement
+
+
+class InsufficientStock(Exception):
+    """Um ou mais itens não têm saldo para a baixa pedida."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(s['name'] for s in shortages) or 'um dos itens'
+        super().__init__(f"Estoque insuficiente para {names}.")
+
+
+def _quantity_case(demand):
+    """CASE id WHEN 1 THEN q1 WHEN 2 THEN q2 ... END"""
+    return Case(
+        *[When(id=pk, then=Value(Decimal(qty))) for pk, qty in demand.items()],
+        output_field=DecimalField(max_digits=12, decimal_places=3),
+    )
+
+
+def decrement_stock(model, demand):
+    """
+    Baixa de estoque sem lock prévio (Material ou Product).
+
+    `demand` = {id: quantidade}. Um único statement para todos os itens:
+
+        UPDATE ... SET stock_quantity = stock_quantity - CASE id ... END
+        WHERE id IN (...) AND stock_quantity >= CASE id ... END
+
+    O banco só altera as linhas que ainda têm saldo no momento da escrita,
+    então não existe janela entre "verificar" e "baixar". Se alguma linha
+    não foi afetada, tudo é desfeito (savepoint) e InsufficientStock traz
+    o relatório completo do que faltou.
+    """
+    demand = {pk: qty for pk, qty in demand.items() if qty}
+    if not demand:
+        return
+
+    quantity = _quantity_case(demand)
+    with transaction.atomic():
+        updated = model.objects.filter(id__in=demand, stock_quantity__gte=quantity)\
+            .update(stock_quantity=F('stock_quantity') - quantity)
+        if updated == len(demand):
+            bump_version(model)
+            if model is Product:
+                touch_catalog(demand)
+            return
+        # Força o rollback do savepoint antes de montar o relatório
+        transaction.set_rollback(True)
+
+    raise InsufficientStock(stock_shortages(model, demand))
+
+
+def increment_stock(model, demand):
+    """Entrada de estoque: um único UPDATE ... CASE para todos os itens."""
+    demand = {pk: qty for pk, qty in demand.items() if qty}
+    if demand:
+        model.objects.filter(id__in=demand).update(stock_quantity=F('stock_quantity') + _quantity_case(demand))
+        bump_version(model)
+        if model is Product:
+            touch_catalog(demand)
+
+
+def receive_materials(quantities, costs, reference=''):
+    """
+    Entrada de compra: soma `quantities` ao estoque e grava `costs` como custo
+    atual, tudo em um único UPDATE (sem save() que reescreve a linha inteira).
+    """
+    if not quantities:
+        return
+    record_movements(Material, quantities, 'PURCHASE', reference)
+    changes = {'stock_quantity': F('stock_quantity') + _quantity_case(quantities)}
+    if costs:
+        changes['current_cost'] = Case(
+            *[When(id=pk, then=Value(cost)) for pk, cost in costs.items()],
+            default=F('current_cost'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    Material.objects.filter(id__in=quantities).update(**changes)
+    bump_version(Material)
+    if costs:
+        refresh_product_costs(materials=costs)
+
+
+def refresh_product_costs(products=None, materials=None):
+    """
+    Recalcula material_cost, labor_cost e suggested_price dos produtos.
+
+    - `materials`: só os produtos que usam esses materiais (busca reversa
+      pela ficha técnica, índice de ProductComposition.material).
+    - `products`: só esses produtos (ids ou instâncias; instâncias já
+      carregadas são atualizadas em memória também).
+    - nenhum dos dois: todos (ex.: mudou o valor da hora).
+
+    Três leituras e poucas escritas, qualquer que seja o número de produtos:
+    produtos com os mesmos custos (mesma ficha, ex.: variações de cor) vão
+    num único UPDATE ... WHERE id IN (...); os de custo único, num
+    bulk_update (CASE WHEN) em lotes de 500.
+    Retorna quantos produtos foram recalculados.
+    """
+    queryset = Product.objects.only('id', 'labor_time_minutes', 'profit_margin')
+    if materials is not None:
+        targets = list(queryset.filter(composition__material_id__in=list(materials)).distinct())
+    elif products is not None:
+        products = list(products)
+        if all(isinstance(p, Product) for p in products):
+            targets = products
+        else:
+            targets = list(queryset.filter(id__in=products))
+    else:
+        targets = list(queryset)
+    if not targets:
+        return 0
+
+    material_cost = {}
+    compositions = ProductComposition.objects.filter(product_id__in=[p.id for p in targets])\
+        .values_list('product_id', 'quantity', 'material__current_cost')
+    for product_id, quantity, cost in compositions:
+        material_cost[product_id] = material_cost.get(product_id, 0) + quantity * cost
+
+    settings = BusinessSettings.objects.first()
+    hourly_rate = settings.hourly_labor_rate if settings else 0
+    for product in targets:
+        product.compute_costs(material_cost.get(product.id, 0), hourly_rate)
+
+    groups = {}
+    for product in targets:
+        groups.setdefault((product.material_cost, product.labor_cost, product.suggested_price), []).append(product)
+    singles = []
+    for (cost, labor, price), group in groups.items():
+        if len(group) == 1:
+            singles.extend(group)
+            continue
+        ids = [p.id for p in group]
+        for start in range(0, len(ids), 500):
+            Product.objects.filter(id__in=ids[start:start + 500])\
+                .update(material_cost=cost, labor_cost=labor, suggested_price=price)
+    Product.objects.bulk_update(singles, ['material_cost', 'labor_cost', 'suggested_price'], batch_size=500)
+    bump_version(Product)
+    return len(targets)
+
+
+def sync_compositions(recipes):
+    """
+    Grava a ficha técnica de vários produtos como diff contra o que já existe.
+    `recipes` = {product_id: [{'material_id': id, 'quantity': q}, ...]}
+    (material repetido tem as quantidades somadas).
+
+    Linhas iguais ficam intocadas; quantidades alteradas vão em um
+    bulk_update, materiais novos em um bulk_create e os removidos em um
+    único DELETE. Retorna o conjunto de produtos cuja ficha mudou.
+    """
+    desired = {}
+    for product_id, lines in recipes.items():
+        for line in lines:
+            key = (product_id, line['material_id'])
+            desired[key] = desired.get(key, 0) + line['quantity']
+
+    existing = {
+        (row.product_id, row.material_id): row
+        for row in ProductComposition.objects.filter(product_id__in=list(recipes))
+    }
+    to_update = []
+    to_create = []
+    for key, quantity in desired.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(ProductComposition(product_id=key[0], material_id=key[1], quantity=quantity))
+        elif row.quantity != quantity:
+            row.quantity = quantity
+            to_update.append(row)
+    to_delete = [row for key, row in existing.items() if key not in desired]
+
+    with transaction.atomic():
+        if to_delete:
+            ProductComposition.objects.filter(id__in=[row.id for row in to_delete]).delete()
+        if to_update:
+            ProductComposition.objects.bulk_update(to_update, ['quantity'], batch_size=500)
+        if to_create:
+            ProductComposition.objects.bulk_create(to_create, batch_size=500)
+        if to_delete or to_update or to_create:
+            bump_version(ProductComposition)
+    return {row.product_id for row in to_delete + to_update + to_create}
+
+
+def update_products(changes):
+    """
+    Edição de vários produtos de uma vez: `changes` = [(produto, dados validados)].
+    Os produtos devem vir travados (select_for_update) na transação do
+    chamador: o ajuste de saldo no Kardex parte do estoque lido.
+
+    Cada produto grava só os campos que enviou (um bulk_update por conjunto
+    de campos): um produto sem `stock_quantity` no lote não tem o estoque
+    reescrito. Fichas técnicas por diff, ajuste de saldo no Kardex e custos
+    recalculados, tudo na mesma transação.
+    """
+    sent = {}
+    recipes = {}
+    adjustments = {}
+    products = {}
+    for product, data in changes:
+        data = dict(data)
+        composition = data.pop('composition', None)
+        if composition is not None:
+            recipes[product.id] = composition
+        if 'stock_quantity' in data:
+            adjustments[product.id] = adjustments.get(product.id, 0) + data['stock_quantity'] - product.stock_quantity
+        for attr, value in data.items():
+            setattr(product, attr, value)
+        sent.setdefault(product.id, set()).update(data)
+        products[product.id] = product
+
+    groups = {}
+    for pk, fields in sent.items():
+        if fields:
+            groups.setdefault(tuple(sorted(fields)), []).append(products[pk])
+
+    with transaction.atomic():
+        for fields, rows in groups.items():
+            Product.objects.bulk_update(rows, fields, batch_size=500)
+        if groups:
+            touch_catalog([product.id for rows in groups.values() for product in rows])
+        sync_compositions(recipes)
+        record_movements(Product, adjustments, 'ADJUSTMENT', 'Ajuste em lote')
+        refresh_product_costs(products=list(products.values()))
+    return list(products.values())
+
+
+def produce_products(orders):
+    """
+    Ordem de produção com vários produtos: `orders` = {product_id: quantidade}.
+
+    Soma a necessidade de cada material em todas as fichas técnicas (uma
+    query), baixa todos os insumos no mesmo UPDATE condicional (cada material
+    travado uma única vez) e dá entrada dos produtos acabados em outro.
+    Retorna a necessidade calculada {material_id: quantidade}.
+    """
+    demand = {}
+    compositions = ProductComposition.objects.filter(product_id__in=orders)\
+        .values_list('product_id', 'material_id', 'quantity')
+    for product_id, material_id, quantity in compositions:
+        demand[material_id] = demand.get(material_id, 0) + quantity * orders[product_id]
+
+    with transaction.atomic():
+        decrement_stock(Material, demand)
+        increment_stock(Product, orders)
+        record_movements(Material, demand, 'PRODUCTION_OUT', 'Produção', sign=-1)
+        record_movements(Product, orders, 'PRODUCTION_IN', 'Produção')
+    return demand
+
+
+def stock_shortages(model, demand):
+    """Lista os itens de `demand` cujo saldo atual não cobre a quantidade pedida."""
+    fields = ['id', 'name', 'stock_quantity'] + (['unit'] if model is Material else [])
+    current = {row['id']: row for row in model.objects.filter(id__in=demand).values(*fields)}
+    shortages = []
+    for pk, qty in demand.items():
+        row = current.get(pk, {'name': f'#{pk}', 'stock_quantity': Decimal(0)})
+        if row['stock_quantity'] < qty:
+            shortage = {
+                'id': pk,
+                'name': row['name'],
+                'required': qty,
+                'available': row['stock_quantity'],
+            }
+            if 'unit' in row:
+                shortage['unit'] = row['unit']
+            shortages.append(shortage)
+    return shortages
+
+
+# --- KARDEX ---
+
+def _item_field(model):
+    return 'material' if model is Material else 'product'
+
+
+def stock_movements(model, quantities, kind, reference='', sign=1):
+    """Movimentos (ainda não gravados) de `quantities` ({id: quantidade}). `sign=-1` para saídas."""
+    field = f'{_item_field(model)}_id'
+    return [
+        StockMovement(**{field: pk}, kind=kind, quantity=sign * qty, reference=reference)
+        for pk, qty in quantities.items() if qty
+    ]
+
+
+def record_movements(model, quantities, kind, reference='', sign=1):
+    """Grava no Kardex um movimento por item de `quantities` em um único INSERT."""
+    StockMovement.objects.bulk_create(stock_movements(model, quantities, kind, reference, sign))
+
+
+def stock_balances(model, day=None):
+    """
+    Saldo de cada item (Material ou Product) no fim de `day` (hoje se None):
+    {id: saldo}. Itens sem movimento ficam de fora (saldo zero).
+
+    Lê apenas o último checkpoint até `day` e os movimentos depois dele,
+    nunca o histórico inteiro.
+    """
+    field = _item_field(model)
+    movements = StockMovement.objects.filter(**{f'{field}__isnull': False})
+    checkpoints = StockCheckpoint.objects.all()
+    if day is not None:
+        movements = movements.filter(date__lte=day)
+        checkpoints = checkpoints.filter(date__lte=day)
+
+    balances = {}
+    checkpoint_date = checkpoints.aggregate(last=Max('date'))['last']
+    if checkpoint_date is not None:
+        balances = dict(
+            StockCheckpoint.objects.filter(date=checkpoint_date, **{f'{field}__isnull': False})
+            .values_list(f'{field}_id', 'quantity')
+        )
+        movements = movements.filter(date__gt=checkpoint_date)
+
+    totals = movements.values(f'{field}_id').annotate(total=Sum('quantity')).values_list(f'{field}_id', 'total')
+    for pk, total in totals:
+        balances[pk] = balances.get(pk, 0) + total
+    return balances
+
+
+def create_checkpoint(day):
+    """
+    Fecha o saldo de todos os itens no fim de `day` (dia já encerrado).
+    Refazer o mesmo dia substitui as linhas anteriores.
+    """
+    with transaction.atomic():
+        StockCheckpoint.objects.filter(date=day).delete()
+        rows = []
+        for model in (Material, Product):
+            field = f'{_item_field(model)}_id'
+            rows += [
+                StockCheckpoint(**{field: pk}, date=day, quantity=quantity)
+                for pk, quantity in stock_balances(model, day).items() if quantity
+            ]
+        StockCheckpoint.objects.bulk_create(rows)
+    return len(rows)
+
+
+def reopen_checkpoints(day):
+    """
+    Movimento lançado num dia já fechado (venda offline sincronizada depois
+    do checkpoint): refaz, em ordem, os checkpoints de `day` em diante.
+    """
+    days = sorted(set(StockCheckpoint.objects.filter(date__gte=day).values_list('date', flat=True)))
+    for closed in days:
+        create_checkpoint(closed)
+    return days
+
+
+def ledger_differences(model):
+    """
+    Confronta o saldo do Kardex com a coluna stock_quantity.
+    Retorna [{'id', 'name', 'ledger', 'stock'}] dos itens que não batem.
+    """
+    ledger = stock_balances(model)
+    differences = []
+    for pk, name, stock in model.objects.values_list('id', 'name', 'stock_quantity').order_by('id'):
+        balance = ledger.get(pk, Decimal(0))
+        if balance != stock:
+            differences.append({'id': pk, 'name': name, 'ledger': balance, 'stock': stock})
+    return differences
+
+
+# --- CATÁLOGO DO PDV ---
+
+def touch_catalog(product_ids):
+    """
+    Registra que estes produtos mudaram (nome, preço, estoque, categoria ou
+    exclusão): uma linha por produto no log, em um único INSERT.
+    Saves de Product/Category chegam aqui pelos signals; UPDATEs em lote
+    (baixa de estoque, edição em lote) chamam diretamente.
+    """
+    CatalogChange.objects.bulk_create([CatalogChange(product_id=pk) for pk in product_ids])
+
+
+def catalog_version():
+    """
+    Versão atual do catálogo (0 se vazio).
+
+    Antes de ler, numera com a próxima versão as mudanças já confirmadas que
+    ainda não têm uma. Mudanças de transações em andamento não aparecem no
+    UPDATE e ficam para a próxima numeração, então tudo que recebe a versão v
+    já estava confirmado: um cliente em `since=v` não perde nada que confirme
+    depois. Os escritores (touch_catalog) não pegam lock nenhum; o lock da
+    linha do contador só ordena duas numerações simultâneas.
+    """
+    if not CatalogChange.objects.filter(version__isnull=True).exists():
+        return CatalogVersion.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    with transaction.atomic():
+        counter, _ = CatalogVersion.objects.select_for_update().get_or_create(pk=1)
+        if CatalogChange.objects.filter(version__isnull=True).update(version=counter.value + 1):
+            counter.value += 1
+            counter.save(update_fields=['value'])
+    return counter.value
+
+
+def compact_catalog_changes():
+    """
+    Mantém só a linha mais recente de cada produto: para o delta basta saber
+    a última versão em que o produto mudou. Linhas ainda sem versão ficam.
+    Retorna quantas linhas saíram.
+    """
+    last = CatalogChange.objects.filter(product_id=OuterRef('product_id'))\
+        .values('product_id').annotate(last=Max('version')).values('last')
+    older, _ = CatalogChange.objects.filter(version__lt=Subquery(last)).delete()
+    # Repetidas na mesma versão (várias mudanças numeradas juntas)
+    latest = CatalogChange.objects.filter(version__isnull=False)\
+        .values('product_id').annotate(last=Max('id')).values('last')
+    repeated, _ = CatalogChange.objects.filter(version__isnull=False).exclude(id__in=latest).delete()
+    return older + repeated
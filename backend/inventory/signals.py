@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Category, Product
+from .services import touch_catalog
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    touch_catalog([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Nome da categoria faz parte do catálogo (e a exclusão zera o vínculo)
+    touch_catalog(instance.product_set.values_list('id', flat=True))
@@ -1,3 +1,849 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient, APITestCase
+
+from core.export import xlsx_stream
+from core.spreadsheet import read_rows
+from core.testing import QueryBudgetMixin, query_plan
+from finance.models import BusinessSettings, PaymentMethod
+
+from .imports import IMPORTERS, _Report
+from .models import CatalogChange, Category, Material, Product, ProductComposition, Purchase, PurchaseItem, StockMovement
+from .services import (
+    catalog_version, create_checkpoint, decrement_stock, record_movements, refresh_product_costs, stock_balances,
+    touch_catalog, update_products,
+)
+from .views import MaterialViewSet
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Fixa a quantidade de queries dos endpoints de estoque (lista com 10 e
+    1000 linhas e detalhe) e confere o que cada um devolve.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='estoque', password='123')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Bolsas')
+        self.materials = Material.objects.bulk_create(
+            Material(name=f'Material {i}', unit='MT', current_cost=Decimal('2.50'), stock_quantity=100)
+            for i in range(3)
+        )
+
+    def grow(self, size):
+        """Completa as tabelas até `size` produtos (com ficha técnica) e compras."""
+        start = Product.objects.count()
+        products = Product.objects.bulk_create(
+            Product(name=f'Produto {i}', sku=f'SKU-{i}', category=self.category, price=Decimal('10'))
+            for i in range(start, size)
+        )
+        ProductComposition.objects.bulk_create(
+            ProductComposition(product=p, material=m, quantity=Decimal('1.5'))
+            for p in products for m in self.materials
+        )
+        Category.objects.bulk_create(Category(name=f'Categoria {i}') for i in range(start, size))
+        Material.objects.bulk_create(
+            Material(name=f'Extra {i}', unit='UN') for i in range(start, size)
+        )
+        purchases = Purchase.objects.bulk_create(
+            Purchase(supplier=f'Fornecedor {i}', total_amount=Decimal('10')) for i in range(start, size)
+        )
+        PurchaseItem.objects.bulk_create(
+            PurchaseItem(purchase=p, material=m, quantity=Decimal('2'), unit_cost=Decimal('5'))
+            for p in purchases for m in self.materials
+        )
+
+    def test_categories(self):
+        response = self.assertQueryBudget('/api/categories/', 1)
+        self.assertEqual(len(response.data), 1001)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/categories/{self.category.id}/')
+        self.assertEqual(response.data['name'], 'Bolsas')
+
+    def test_materials(self):
+        response = self.assertQueryBudget('/api/materials/', 1)
+        self.assertEqual(len(response.data), 1003)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/materials/{self.materials[0].id}/')
+        self.assertEqual((response.data['name'], response.data['stock_quantity']), ('Material 0', '100.000'))
+
+    def test_products(self):
+        # produtos + categoria (JOIN) e composição + materiais (prefetch)
+        response = self.assertQueryBudget('/api/products/', 2)
+        self.assertEqual(len(response.data), 1000)
+        self.assertEqual({row['category_name'] for row in response.data}, {'Bolsas'})
+        product = Product.objects.get(sku='SKU-0')
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/{product.id}/')
+        self.assertEqual(
+            sorted((c['material_name'], c['quantity']) for c in response.data['composition']),
+            [(m.name, '1.500') for m in self.materials],
+        )
+
+    def test_purchases(self):
+        response = self.assertQueryBudget('/api/purchases/', 2)
+        self.assertEqual(len(response.data), 1000)
+        purchase = Purchase.objects.get(supplier='Fornecedor 0')
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/purchases/{purchase.id}/')
+        self.assertEqual(response.data['supplier'], 'Fornecedor 0')
+        self.assertEqual([item['material_name'] for item in response.data['items']], [m.name for m in self.materials])
+
+
+class PurchasePaginationTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='compras', password='123'))
+        Purchase.objects.bulk_create(Purchase(supplier=f'Fornecedor {i}') for i in range(12))
+
+    def test_cursor_pages(self):
+        first = self.client.get('/api/purchases/?page_size=5').data
+        self.assertEqual(len(first['results']), 5)
+        second = self.client.get(first['next']).data
+        ids = [p['id'] for p in first['results'] + second['results']]
+        self.assertEqual(ids, list(Purchase.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True)[:10]))
+
+    def test_plain_list_without_page_size(self):
+        self.assertEqual(len(self.client.get('/api/purchases/').data), 12)
+        self.assertEqual(len(self.client.get('/api/purchases/?paginate=false').data), 12)
+
+    def test_export_flattens_items(self):
+        material = Material.objects.create(name='Couro', unit='MT', current_cost=Decimal('10'))
+        purchase = Purchase.objects.create(supplier='Curtume', total_amount=Decimal('30'))
+        PurchaseItem.objects.create(purchase=purchase, material=material, quantity=3, unit_cost=Decimal('10'), effective_unit_cost=Decimal('10'))
+        purchase.refresh_from_db()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/purchases/export/')
+            lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 1 + 12 + 1)
+        self.assertIn(f'{purchase.id},{purchase.date.isoformat()},Curtume,0.00,30.00,Couro,MT,3.000,10.00,10.00', lines)
+
+
+class IndexUsageTests(TestCase):
+
+    def test_low_stock_uses_index(self):
+        plan = query_plan(Product.objects.filter(stock_quantity__lte=5))
+        self.assertIn('product_stock_idx', plan, plan)
+
+    def test_purchase_listing_uses_index(self):
+        plan = query_plan(Purchase.objects.order_by('-date', '-created_at', '-id')[:50])
+        self.assertIn('purchase_listing_idx', plan, plan)
+
+
+class ProduceTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='oficina', password='123'))
+        self.leather = Material.objects.create(name='Couro', unit='MT', stock_quantity=Decimal('3'))
+        self.zipper = Material.objects.create(name='Zíper', unit='UN', stock_quantity=Decimal('10'))
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        ProductComposition.objects.bulk_create([
+            ProductComposition(product=self.product, material=self.leather, quantity=Decimal('1.5')),
+            ProductComposition(product=self.product, material=self.zipper, quantity=Decimal('1')),
+        ])
+
+    def test_produce_moves_stock(self):
+        response = self.client.post(f'/api/products/{self.product.id}/produce/', {'quantity': 2})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.leather.refresh_from_db()
+        self.zipper.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.leather.stock_quantity, self.zipper.stock_quantity), (0, 8))
+        self.assertEqual(self.product.stock_quantity, 2)
+
+    def test_shortage_is_all_or_nothing(self):
+        response = self.client.post(f'/api/products/{self.product.id}/produce/', {'quantity': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([s['name'] for s in response.data['shortages']], ['Couro'])
+        self.zipper.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.zipper.stock_quantity, self.product.stock_quantity), (10, 0))
+
+
+class PurchaseCreateTests(QueryBudgetMixin, APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='comprador', password='123'))
+        self.materials = Material.objects.bulk_create(
+            Material(name=f'Material {i}', unit='UN', current_cost=Decimal('1'), stock_quantity=Decimal('5'))
+            for i in range(100)
+        )
+
+    def post(self, lines, freight='0'):
+        payload = {
+            'supplier': 'Fornecedor',
+            'freight_cost': freight,
+            'items': [{'material_id': m.id, 'quantity': str(q), 'unit_cost': str(c)} for m, q, c in lines],
+        }
+        return self.client.post('/api/purchases/', payload, format='json')
+
+    def test_freight_is_apportioned_by_value(self):
+        a, b = self.materials[:2]
+        # a: 10 x 3,00 = 30 (75%)  b: 5 x 2,00 = 10 (25%)  frete 8,00
+        response = self.post([(a, 10, '3.00'), (b, 5, '2.00')], freight='8.00')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal('48.00'))
+        costs = {i['material_id']: Decimal(i['effective_unit_cost']) for i in response.data['items']}
+        self.assertEqual(costs, {a.id: Decimal('3.60'), b.id: Decimal('2.40')})
+
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock_quantity, a.current_cost), (Decimal('15'), Decimal('3.60')))
+        self.assertEqual((b.stock_quantity, b.current_cost), (Decimal('10'), Decimal('2.40')))
+
+    def test_repeated_material_lines(self):
+        a = self.materials[0]
+        self.assertEqual(self.post([(a, 1, '2.00'), (a, 2, '4.00')]).status_code, 201)
+        a.refresh_from_db()
+        self.assertEqual((a.stock_quantity, a.current_cost), (Decimal('8'), Decimal('4.00')))
+
+    def test_statement_count_does_not_grow_with_lines(self):
+        def purchase(size):
+            response = self.post([(m, 1, '1.00') for m in self.materials[:size]], freight='10')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data['items']), size)
+        self.assertStatementsDoNotGrow(purchase, (2, 100))
+
+    def test_unknown_material(self):
+        payload = {'items': [{'material_id': 999999, 'quantity': '1', 'unit_cost': '1'}]}
+        self.assertEqual(self.client.post('/api/purchases/', payload, format='json').status_code, 400)
+
+
+class ProductionOrderTests(QueryBudgetMixin, APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='producao', password='123'))
+        self.leather = Material.objects.create(name='Couro', unit='MT', stock_quantity=Decimal('10'))
+        self.zipper = Material.objects.create(name='Zíper', unit='UN', stock_quantity=Decimal('4'))
+        self.bag = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        self.wallet = Product.objects.create(name='Carteira', price=Decimal('40'))
+        ProductComposition.objects.bulk_create([
+            ProductComposition(product=self.bag, material=self.leather, quantity=Decimal('2')),
+            ProductComposition(product=self.bag, material=self.zipper, quantity=Decimal('1')),
+            ProductComposition(product=self.wallet, material=self.leather, quantity=Decimal('0.5')),
+            ProductComposition(product=self.wallet, material=self.zipper, quantity=Decimal('1')),
+        ])
+
+    def order(self, *lines):
+        items = [{'product_id': p.id, 'quantity': str(q)} for p, q in lines]
+        return self.client.post('/api/production-orders/', {'items': items}, format='json')
+
+    def test_demand_is_aggregated_across_products(self):
+        # Couro: 3 x 2 + 2 x 0,5 = 7   Zíper: 3 + 2 = 5 (só há 4)
+        response = self.order((self.bag, 3), (self.wallet, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([s['name'] for s in response.data['shortages']], ['Zíper'])
+
+        response = self.order((self.bag, 2), (self.wallet, 2))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.leather.refresh_from_db()
+        self.zipper.refresh_from_db()
+        self.assertEqual((self.leather.stock_quantity, self.zipper.stock_quantity), (Decimal('5'), Decimal('0')))
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'stock_quantity')),
+            {'Bolsa': Decimal('2'), 'Carteira': Decimal('2')},
+        )
+
+    def test_shortage_report_lists_every_material(self):
+        response = self.order((self.bag, 6))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual({s['name'] for s in response.data['shortages']}, {'Couro', 'Zíper'})
+        self.leather.refresh_from_db()
+        self.assertEqual(self.leather.stock_quantity, Decimal('10'))
+
+    def test_statement_count_does_not_grow_with_order(self):
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=Decimal('1')) for i in range(30))
+        ProductComposition.objects.bulk_create(
+            ProductComposition(product=p, material=self.leather, quantity=Decimal('0.01')) for p in products
+        )
+
+        def order(size):
+            response = self.order(*[(p, 1) for p in products[:size]])
+            self.assertEqual(response.status_code, 201, response.data)
+        self.assertStatementsDoNotGrow(order, (1, 30))
+
+
+class StockLedgerTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='kardex', password='123'))
+        self.leather = self.client.post('/api/materials/', {'name': 'Couro', 'unit': 'MT', 'stock_quantity': '2'}).data
+        self.bag = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        ProductComposition.objects.create(product=self.bag, material_id=self.leather['id'], quantity=Decimal('1.5'))
+
+    def verify(self):
+        out = StringIO()
+        call_command('verify_stock_ledger', stdout=out)
+        return out.getvalue()
+
+    def test_every_path_writes_the_ledger(self):
+        purchase = {'supplier': 'F', 'items': [{'material_id': self.leather['id'], 'quantity': '4', 'unit_cost': '10'}]}
+        self.assertEqual(self.client.post('/api/purchases/', purchase, format='json').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/products/{self.bag.id}/produce/', {'quantity': 2}).status_code, 200)
+        sale = {
+            'total_amount': '100.00',
+            'payment_method': PaymentMethod.objects.create(name='Pix').id,
+            'items': [{'product_id': self.bag.id, 'quantity': 1, 'unit_price': '100.00'}],
+        }
+        self.assertEqual(self.client.post('/api/sales/', sale, format='json').status_code, 201)
+        self.client.patch(f'/api/materials/{self.leather["id"]}/', {'stock_quantity': '2.5'})
+
+        self.assertEqual(
+            list(StockMovement.objects.order_by('id').values_list('kind', 'quantity')),
+            [('OPENING', 2), ('PURCHASE', 4), ('PRODUCTION_OUT', -3), ('PRODUCTION_IN', 2), ('SALE', -1), ('ADJUSTMENT', Decimal('-0.5'))],
+        )
+        self.assertIn('OK', self.verify())
+
+    def test_balance_reads_last_checkpoint_and_later_movements(self):
+        material_id = self.leather['id']
+        StockMovement.objects.all().delete()
+        StockMovement.objects.bulk_create([
+            StockMovement(material_id=material_id, kind='OPENING', quantity=10, date=date(2026, 1, 5)),
+            StockMovement(material_id=material_id, kind='PURCHASE', quantity=5, date=date(2026, 1, 20)),
+            StockMovement(material_id=material_id, kind='PRODUCTION_OUT', quantity=-3, date=date(2026, 2, 3)),
+        ])
+        create_checkpoint(date(2026, 1, 31))
+        # Histórico anterior ao checkpoint não é mais lido
+        StockMovement.objects.filter(date__lte=date(2026, 1, 31)).update(quantity=0)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_balances(Material, date(2026, 2, 10)), {material_id: 12})
+        self.assertEqual(stock_balances(Material, date(2026, 1, 31)), {material_id: 15})
+
+        response = self.client.get('/api/stock-movements/balances/?type=material&date=2026-02-10')
+        self.assertEqual(response.data, [{'id': material_id, 'name': 'Couro', 'unit': 'MT', 'quantity': '12.000'}])
+
+    def test_verifier_reports_and_fixes_drift(self):
+        Material.objects.filter(id=self.leather['id']).update(stock_quantity=7)
+        with self.assertRaises(CommandError):
+            self.verify()
+        call_command('verify_stock_ledger', '--fix', stdout=StringIO())
+        self.assertIn('OK', self.verify())
+
+    def test_stale_edit_keeps_sales(self):
+        wallet = self.client.post('/api/products/', {'name': 'Carteira', 'price': '50', 'stock_quantity': '5'}).data
+        form = self.client.get(f'/api/products/{wallet["id"]}/').data
+        sale = {
+            'total_amount': '50.00',
+            'payment_method': PaymentMethod.objects.create(name='Pix').id,
+            'items': [{'product_id': wallet['id'], 'quantity': 1, 'unit_price': '50.00'}],
+        }
+        self.assertEqual(self.client.post('/api/sales/', sale, format='json').status_code, 201)
+
+        # Mesmo corpo que o ProductForm envia, montado antes da venda
+        payload = {key: form[key] for key in ('name', 'sku', 'category', 'price', 'profit_margin', 'labor_time_minutes')}
+        payload.update(name='Carteira slim', composition=[])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(f'/api/products/{wallet["id"]}/', payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Decimal(response.data['stock_quantity']), Decimal('4'))
+        self.assertEqual(Product.objects.get(id=wallet['id']).stock_quantity, Decimal('4'))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "inventory_product"')]
+        self.assertTrue(updates)
+        self.assertFalse([sql for sql in updates if 'stock_quantity' in sql])  # o PUT não regrava o saldo
+        self.assertIn('OK', self.verify())
+
+    def test_adjustment_is_taken_from_the_locked_balance(self):
+        read = MaterialViewSet.get_object
+
+        def read_then_consume(view):
+            material = read(view)
+            # Baixa confirmada depois que a edição leu a linha
+            decrement_stock(Material, {material.id: 1})
+            record_movements(Material, {material.id: 1}, 'PRODUCTION_OUT', 'Concorrente', sign=-1)
+            return material
+
+        with mock.patch.object(MaterialViewSet, 'get_object', read_then_consume):
+            response = self.client.patch(f'/api/materials/{self.leather["id"]}/', {'stock_quantity': '5'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Material.objects.get(id=self.leather['id']).stock_quantity, Decimal('5'))
+        # 2 - 1 (baixa) + 4 (ajuste sobre o saldo travado)
+        self.assertEqual(StockMovement.objects.get(kind='ADJUSTMENT').quantity, Decimal('4'))
+        self.assertIn('OK', self.verify())
+
+
+class ProductCostTests(QueryBudgetMixin, APITestCase):
+    """Custos materializados no produto (material_cost, labor_cost, suggested_price)."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='custos', password='123'))
+        self.settings = BusinessSettings.objects.create(hourly_labor_rate=Decimal('30'))
+        self.leather = Material.objects.create(name='Couro', unit='MT', current_cost=Decimal('10'))
+        self.thread = Material.objects.create(name='Linha', unit='UN', current_cost=Decimal('1'))
+        response = self.client.post('/api/products/', {
+            'name': 'Bolsa', 'price': '100', 'labor_time_minutes': 30, 'profit_margin': '50',
+            'composition': [
+                {'material_id': self.leather.id, 'quantity': '2'},
+                {'material_id': self.thread.id, 'quantity': '3'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.bag = Product.objects.get(pk=response.data['id'])
+        self.other = Product.objects.create(name='Chaveiro', price=Decimal('5'))
+        ProductComposition.objects.create(product=self.other, material=self.thread, quantity=Decimal('1'))
+
+    def costs(self, product):
+        product.refresh_from_db()
+        return (product.material_cost, product.labor_cost, product.suggested_price)
+
+    def test_costs_are_stored_on_save(self):
+        # insumos 2 x 10 + 3 x 1 = 23; mão de obra 30 min x 30/h = 15; (23 + 15) x 1,5 = 57
+        self.assertEqual(self.costs(self.bag), (Decimal('23'), Decimal('15'), Decimal('57')))
+        data = self.client.get(f'/api/products/{self.bag.id}/').data
+        self.assertEqual(Decimal(data['suggested_price']), Decimal('57'))
+
+    def test_purchase_recomputes_only_affected_products(self):
+        Product.objects.filter(pk=self.other.pk).update(material_cost=Decimal('99'))
+        purchase = {'items': [{'material_id': self.leather.id, 'quantity': '1', 'unit_cost': '12'}]}
+        self.assertEqual(self.client.post('/api/purchases/', purchase, format='json').status_code, 201)
+        self.assertEqual(self.costs(self.bag)[0], Decimal('27'))
+        # Não usa couro: fica como estava
+        self.assertEqual(self.costs(self.other)[0], Decimal('99'))
+
+    def test_labor_rate_change_recomputes_all(self):
+        self.client.patch(f'/api/settings/{self.settings.id}/', {'hourly_labor_rate': '60'})
+        self.assertEqual(self.costs(self.bag), (Decimal('23'), Decimal('30'), Decimal('79.50')))
+
+    def test_statement_count_does_not_grow_with_products(self):
+        def add_products(size):
+            products = Product.objects.bulk_create(Product(name=f'P{i}', price=Decimal('1')) for i in range(size))
+            ProductComposition.objects.bulk_create(
+                ProductComposition(product=p, material=self.leather, quantity=Decimal('1')) for p in products
+            )
+        # Tamanhos dentro do limite de parâmetros do SQLite (um UPDATE por lote)
+        self.assertStatementsDoNotGrow(
+            lambda size: refresh_product_costs(materials=[self.leather.id]), (2, 50), prepare=add_products
+        )
+        self.assertEqual(Product.objects.filter(name__startswith='P', material_cost=Decimal('10')).count(), 52)
+
+
+class CompositionDiffTests(QueryBudgetMixin, APITestCase):
+    """Ficha técnica gravada como diff por material (sem apagar e recriar)."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='ficha', password='123'))
+        self.materials = Material.objects.bulk_create(
+            Material(name=f'Material {i}', unit='UN', current_cost=Decimal('1')) for i in range(4)
+        )
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        ProductComposition.objects.bulk_create([
+            ProductComposition(product=self.product, material=self.materials[0], quantity=Decimal('1')),
+            ProductComposition(product=self.product, material=self.materials[1], quantity=Decimal('2')),
+            ProductComposition(product=self.product, material=self.materials[2], quantity=Decimal('3')),
+        ])
+
+    def rows(self):
+        return {row.material_id: (row.id, row.quantity) for row in ProductComposition.objects.filter(product=self.product)}
+
+    def recipe(self, *lines):
+        return [{'material_id': m.id, 'quantity': str(q)} for m, q in lines]
+
+    def test_only_changes_are_written(self):
+        before = self.rows()
+        a, b, c, d = self.materials
+        response = self.client.patch(f'/api/products/{self.product.id}/', {
+            'composition': self.recipe((a, 1), (b, 5), (d, 1)),
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        after = self.rows()
+        self.assertEqual(after[a.id], before[a.id])  # intocada
+        self.assertEqual(after[b.id], (before[b.id][0], Decimal('5')))  # mesma linha, nova quantidade
+        self.assertNotIn(c.id, after)
+        self.assertIn(d.id, after)
+
+    def test_same_recipe_writes_nothing(self):
+        a, b, c, _ = self.materials
+        payload = {'composition': self.recipe((a, 1), (b, 2), (c, 3))}
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(f'/api/products/{self.product.id}/', payload, format='json')
+        writes = [q['sql'] for q in ctx.captured_queries if 'inventory_productcomposition' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_patch_without_composition_keeps_it(self):
+        before = self.rows()
+        self.client.patch(f'/api/products/{self.product.id}/', {'price': '120'}, format='json')
+        self.assertEqual(self.rows(), before)
+
+    def test_bulk_update(self):
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=Decimal('1')) for i in range(22))
+        batches = {2: products[:2], 20: products[2:]}
+
+        def bulk_update(size):
+            payload = {'products': [
+                {'id': p.id, 'price': '9.90', 'composition': self.recipe((self.materials[0], size))}
+                for p in batches[size]
+            ]}
+            response = self.client.patch('/api/products/bulk-update/', payload, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(len(response.data), size)
+        self.assertStatementsDoNotGrow(bulk_update, (2, 20))
+        self.assertEqual(Product.objects.get(pk=products[2].pk).material_cost, Decimal('20'))
+
+    def test_bulk_update_writes_only_sent_fields(self):
+        counted, other = Product.objects.bulk_create(
+            Product(name=name, price=Decimal('10'), stock_quantity=5) for name in ('Contada', 'Outra')
+        )
+        changes = [(counted, {'stock_quantity': Decimal('8')}), (other, {'price': Decimal('12')})]
+        # Venda confirmada depois da leitura: o produto que só mudou o preço mantém a baixa
+        decrement_stock(Product, {other.id: 1})
+        update_products(changes)
+
+        other.refresh_from_db()
+        self.assertEqual((other.price, other.stock_quantity), (Decimal('12'), Decimal('4')))
+        self.assertEqual(Product.objects.get(pk=counted.pk).stock_quantity, Decimal('8'))
+
+    def test_bulk_update_locks_products(self):
+        payload = {'products': [{'id': self.product.id, 'stock_quantity': '3'}]}
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch('/api/products/bulk-update/', payload, format='json')
+        if connection.features.has_select_for_update:
+            self.assertTrue(any('FOR UPDATE' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(stock_balances(Product)[self.product.id], Decimal('3'))
+
+    def test_bulk_update_is_all_or_nothing(self):
+        payload = {'products': [
+            {'id': self.product.id, 'price': '50'},
+            {'id': self.product.id, 'composition': [{'material_id': 999999, 'quantity': '1'}]},
+            {'id': 999999, 'price': '1'},
+        ]}
+        response = self.client.patch('/api/products/bulk-update/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(e) for e in response.data['errors']], [False, True, True])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('100'))
+
+
+class CatalogTests(APITestCase):
+    """Catálogo versionado do PDV (catalog/?since=)."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='caixa', password='123'))
+        self.category = Category.objects.create(name='Bolsas')
+        self.bag = Product.objects.create(name='Bolsa', sku='B1', price=Decimal('100'), stock_quantity=5, category=self.category)
+        self.wallet = Product.objects.create(name='Carteira', price=Decimal('40'), stock_quantity=2)
+
+    def test_full_then_delta(self):
+        full = self.client.get('/api/catalog/').data
+        self.assertTrue(full['full'])
+        self.assertEqual(
+            full['products'][0],
+            {'id': self.bag.id, 'name': 'Bolsa', 'sku': 'B1', 'price': Decimal('100.00'),
+             'stock_quantity': Decimal('5.00'), 'category': self.category.id, 'category_name': 'Bolsas'},
+        )
+        version = full['version']
+
+        # Nada mudou
+        self.assertEqual(self.client.get(f'/api/catalog/?since={version}').status_code, 304)
+        self.assertEqual(self.client.get('/api/catalog/', HTTP_IF_NONE_MATCH=f'"catalog-{version}"').status_code, 304)
+
+        # Venda (UPDATE em lote) e exclusão entram no delta
+        sale = {
+            'total_amount': '100.00',
+            'payment_method': PaymentMethod.objects.create(name='Pix').id,
+            'items': [{'product_id': self.bag.id, 'quantity': 1, 'unit_price': '100.00'}],
+        }
+        self.assertEqual(self.client.post('/api/sales/', sale, format='json').status_code, 201)
+        wallet_id = self.wallet.id
+        self.wallet.delete()
+
+        delta = self.client.get(f'/api/catalog/?since={version}').data
+        self.assertFalse(delta['full'])
+        self.assertEqual([(p['id'], p['stock_quantity']) for p in delta['products']], [(self.bag.id, Decimal('4'))])
+        self.assertEqual(delta['deleted'], [wallet_id])
+        self.assertGreater(delta['version'], version)
+
+    def test_category_rename_and_compaction(self):
+        version = self.client.get('/api/catalog/').data['version']
+        self.category.name = 'Bolsas de Couro'
+        self.category.save()
+        Product.objects.get(pk=self.bag.pk).save()
+        catalog_version()  # numera as duas mudanças juntas
+        call_command('compact_catalog', stdout=StringIO())
+        self.assertEqual(CatalogChange.objects.filter(product_id=self.bag.id).count(), 1)
+
+        delta = self.client.get(f'/api/catalog/?since={version}').data
+        self.assertEqual([p['category_name'] for p in delta['products']], ['Bolsas de Couro'])
+
+    def test_gzip(self):
+        # Catálogo de verdade: com 2 produtos o gzip (com padding aleatório) às vezes não compensa
+        Product.objects.bulk_create(Product(name=f'Brinco {i}', price=Decimal('20')) for i in range(20))
+        response = self.client.get('/api/catalog/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+@skipUnless(connection.vendor == 'postgresql', "Só no PostgreSQL: o SQLite serializa as transações de escrita")
+class CatalogCommitOrderTests(TransactionTestCase):
+    """
+    Duas conexões: a versão do catálogo segue a ordem de commit. Uma transação
+    lenta que registrou a mudança antes (id menor) e confirma depois de outra
+    não pode ficar abaixo de uma versão que o cliente já leu.
+    """
+    client_class = APIClient
+
+    def test_slow_transaction_is_not_skipped(self):
+        self.client.force_authenticate(User.objects.create_user(username='caixa', password='123'))
+        bag = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        wallet = Product.objects.create(name='Carteira', price=Decimal('40'))
+        catalog_version()
+        touched, release = threading.Event(), threading.Event()
+
+        def slow():
+            try:
+                with transaction.atomic():
+                    touch_catalog([bag.id])
+                    touched.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        def fast():
+            try:
+                touch_catalog([wallet.id])
+            finally:
+                connection.close()
+
+        slow_writer = threading.Thread(target=slow)
+        slow_writer.start()
+        touched.wait(10)
+        fast_writer = threading.Thread(target=fast)
+        fast_writer.start()
+        fast_writer.join()
+
+        # O cliente sincroniza enquanto a transação lenta ainda está aberta
+        seen = self.client.get('/api/catalog/').data['version']
+        release.set()
+        slow_writer.join()
+        fast_writer.join()
+
+        response = self.client.get(f'/api/catalog/?since={seen}')
+        self.assertEqual(response.status_code, 200)  # 304 = a mudança lenta se perdeu
+        self.assertIn(bag.id, [p['id'] for p in response.data['products']])
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag / Last-Modified nos cadastros: 304 sem tocar no banco."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='etag', password='123'))
+        self.material = Material.objects.create(name='Couro', unit='MT', current_cost=Decimal('10'))
+        self.product = Product.objects.create(name='Bolsa', price=Decimal('100'))
+        ProductComposition.objects.create(product=self.product, material=self.material, quantity=Decimal('1'))
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_skips_the_database(self):
+        etag = self.client.get('/api/materials/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.revalidate('/api/materials/', etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        materials = self.client.get('/api/materials/')['ETag']
+        products = self.client.get('/api/products/')['ETag']
+
+        # UPDATE em lote (compra) muda material e, pela ficha técnica, o produto
+        purchase = {'items': [{'material_id': self.material.id, 'quantity': '1', 'unit_cost': '12'}]}
+        self.assertEqual(self.client.post('/api/purchases/', purchase, format='json').status_code, 201)
+        self.assertEqual(self.revalidate('/api/materials/', materials).status_code, 200)
+        self.assertEqual(self.revalidate('/api/products/', products).status_code, 200)
+
+        # save() comum (signal)
+        categories = self.client.get('/api/categories/')['ETag']
+        Category.objects.create(name='Nova')
+        self.assertEqual(self.revalidate('/api/categories/', categories).status_code, 200)
+
+    def test_if_modified_since(self):
+        cache.set('model-version:finance.paymentmethod', time.time() - 60, None)
+        response = self.client.get('/api/payment-methods/')
+        self.assertEqual(self.client.get('/api/payment-methods/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        PaymentMethod.objects.create(name='Pix')
+        self.assertEqual(self.client.get('/api/payment-methods/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+
+class ProductSearchTests(APITestCase):
+    """Busca do PDV (products/search/) sobre o índice de texto."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='caixa', password='123'))
+        self.necklace = Product.objects.create(name='Colar de Pérolas', sku='COL-01', price=Decimal('80'))
+        self.bracelet = Product.objects.create(name='Pulseira de Miçangas', sku='PUL-01', price=Decimal('30'))
+        self.ring = Product.objects.create(name='Anel Coração', sku='ANE-01', price=Decimal('25'))
+
+    def search(self, q):
+        response = self.client.get('/api/products/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    def test_prefix_and_accent_insensitive(self):
+        self.assertEqual(self.search('perol'), ['Colar de Pérolas'])
+        self.assertEqual(self.search('MICANGA pul'), ['Pulseira de Miçangas'])
+        self.assertEqual(self.search('cora'), ['Anel Coração'])
+        self.assertEqual(self.search('col xyz'), [])
+        self.assertEqual(self.search('  '), [])
+
+    def test_exact_sku(self):
+        response = self.client.get('/api/products/search/', {'q': 'PUL-01'})
+        self.assertEqual(response.data, [{
+            'id': self.bracelet.id, 'name': 'Pulseira de Miçangas', 'sku': 'PUL-01', 'price': Decimal('30.00'),
+            'stock_quantity': Decimal('0.00'), 'category': None, 'category_name': None,
+        }])
+
+    def test_index_follows_writes(self):
+        self.necklace.name = 'Gargantilha Dourada'
+        self.necklace.save()
+        Product.objects.filter(id=self.ring.id).update(name='Anel Solitário')  # UPDATE direto também
+        self.bracelet.delete()
+
+        self.assertEqual(self.search('perol'), [])
+        self.assertEqual(self.search('garg'), ['Gargantilha Dourada'])
+        self.assertEqual(self.search('solit'), ['Anel Solitário'])
+        self.assertEqual(self.search('pulseira'), [])
+
+    def test_limit(self):
+        Product.objects.bulk_create([Product(name=f'Colar {i}', price=Decimal('1')) for i in range(5)])
+        response = self.client.get('/api/products/search/', {'q': 'colar', 'limit': 3})
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(self.client.get('/api/products/search/', {'q': 'colar', 'limit': 'x'}).status_code, 400)
+
+    def test_ranks_across_every_match(self):
+        Product.objects.create(name='Tiara', price=Decimal('1'))
+        # Muitos casamentos mais novos e menos relevantes (nome longo)
+        Product.objects.bulk_create(
+            [Product(name=f'Tiara bordada com strass e pérolas {i}', price=Decimal('1')) for i in range(600)]
+        )
+        response = self.client.get('/api/products/search/', {'q': 'tiara', 'limit': 1})
+        self.assertEqual([row['name'] for row in response.data], ['Tiara'])
+
+
+class CatalogImportTests(APITestCase):
+    """Importação do cadastro por planilha (imports/<tipo>/)."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='importa', password='123'))
+        BusinessSettings.objects.create(hourly_labor_rate=Decimal('60'))
+        self.leather = Material.objects.create(name='Couro', unit='MT', current_cost=Decimal('10'))
+
+    def upload(self, kind, content, name='planilha.csv', **params):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        query = '?dry_run=true' if params.get('dry_run') else ''
+        return self.client.post(f'/api/imports/{kind}/{query}', {'file': SimpleUploadedFile(name, content)},
+                                format='multipart')
+
+    def test_products_upsert_by_sku(self):
+        Product.objects.create(name='Bolsa', sku='BOL-01', price=Decimal('100'), stock_quantity=Decimal('2'))
+        response = self.upload('products', (
+            'SKU;Nome;Preço;Categoria;Estoque;Tempo Minutos\n'
+            'BOL-01;Bolsa Couro;1.250,90;Bolsas;5;30\n'
+            'CAR-01;Carteira;80;bolsas;;\n'
+        ))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['categories_created']), (1, 1, 1))
+
+        bag = Product.objects.get(sku='BOL-01')
+        self.assertEqual((bag.name, bag.price, bag.stock_quantity), ('Bolsa Couro', Decimal('1250.90'), Decimal('5')))
+        self.assertEqual(bag.labor_cost, Decimal('30'))  # 30 min a R$ 60/h
+        wallet = Product.objects.get(sku='CAR-01')
+        self.assertEqual(wallet.category_id, bag.category_id)
+        self.assertEqual(Category.objects.filter(name='Bolsas').count(), 1)
+        self.assertEqual(
+            StockMovement.objects.get(product=bag).quantity, Decimal('3'),  # ajuste de 2 para 5
+        )
+
+    def test_stock_is_applied_as_difference(self):
+        bag = Product.objects.create(name='Bolsa', sku='BOL-01', price=Decimal('100'), stock_quantity=Decimal('10'))
+        wallet = Product.objects.create(name='Carteira', sku='CAR-01', price=Decimal('40'), stock_quantity=Decimal('10'))
+        self.leather.stock_quantity = Decimal('10')
+        self.leather.save()
+        plan_products, write_products = IMPORTERS['products']
+        plan_materials, write_materials = IMPORTERS['materials']
+        columns, lines = read_rows(StringIO('sku,estoque,preco\nBOL-01,12,\nCAR-01,,45\n'))
+        products = plan_products(columns, lines, _Report('products', lines, False))
+        columns, lines = read_rows(StringIO('nome,estoque,custo\nCouro,,12\n'))
+        materials = plan_materials(columns, lines, _Report('materials', lines, False))
+
+        # Baixas confirmadas enquanto a planilha era validada
+        decrement_stock(Product, {bag.id: 1, wallet.id: 1})
+        decrement_stock(Material, {self.leather.id: 2})
+        with transaction.atomic():
+            write_products(products)
+            write_materials(materials)
+
+        bag.refresh_from_db()
+        wallet.refresh_from_db()
+        self.leather.refresh_from_db()
+        self.assertEqual((bag.stock_quantity, bag.price), (Decimal('11'), Decimal('100')))  # 10 - 1 + (12 - 10)
+        self.assertEqual((wallet.stock_quantity, wallet.price), (Decimal('9'), Decimal('45')))
+        self.assertEqual((self.leather.stock_quantity, self.leather.current_cost), (Decimal('8'), Decimal('12')))
+        self.assertEqual(StockMovement.objects.get(product=bag, kind='ADJUSTMENT').quantity, Decimal('2'))
+
+    def test_errors_are_reported_per_line_and_nothing_is_written(self):
+        response = self.upload('products', (
+            'sku,nome,preco\n'
+            'A-1,Anel,10\n'
+            ',Sem SKU,10\n'
+            'A-1,Repetido,abc\n'
+        ))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual([e['line'] for e in response.data['errors']], [3, 4])
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'sku', 'price'})
+        self.assertFalse(Product.objects.exists())
+
+        response = self.upload('materials', 'unidade\nUN\n')
+        self.assertEqual(response.data['errors'], [{'line': 1, 'errors': {'name': "Coluna obrigatória ausente."}}])
+
+    def test_dry_run_only_counts(self):
+        response = self.upload('materials', 'Nome,Unidade,Custo\nCouro,,12\nFecho,UN,"0,50"\n', dry_run=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['dry_run']), (1, 1, True))
+        self.assertEqual(Material.objects.count(), 1)
+        self.leather.refresh_from_db()
+        self.assertEqual(self.leather.current_cost, Decimal('10'))
+
+    def test_recipes_update_product_costs(self):
+        clasp = Material.objects.create(name='Fecho', unit='UN', current_cost=Decimal('2'))
+        bag = Product.objects.create(name='Bolsa', sku='BOL-01', price=Decimal('100'))
+        ProductComposition.objects.create(product=bag, material=clasp, quantity=Decimal('1'))
+
+        response = self.upload('recipes', 'sku,material,quantidade\nBOL-01,couro,"1,5"\nBOL-01,Fecho,2\n')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        bag.refresh_from_db()
+        self.assertEqual(bag.material_cost, Decimal('19'))  # 1,5 x 10 + 2 x 2
+
+        # Material novo muda o custo dos produtos que o usam
+        response = self.upload('materials', 'nome,custo\nCouro,20\n')
+        self.assertEqual(response.status_code, 200, response.data)
+        bag.refresh_from_db()
+        self.assertEqual(bag.material_cost, Decimal('34'))
+
+    def test_xlsx_and_unknown_kind(self):
+        columns = [('sku', 'SKU'), ('name', 'Nome'), ('price', 'Preço')]
+        rows = [{'sku': 'X-1', 'name': 'Brinco', 'price': Decimal('15.5')}, {'sku': 'X-2', 'name': 'Anel', 'price': 7}]
+        content = b''.join(xlsx_stream(columns, rows))
+        response = self.upload('products', content, name='produtos.xlsx')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            list(Product.objects.order_by('sku').values_list('sku', 'price')),
+            [('X-1', Decimal('15.50')), ('X-2', Decimal('7.00'))],
+        )
+
+        self.assertEqual(self.upload('clients', 'nome\nA\n').status_code, 404)
+        self.assertEqual(self.upload('products', b'PK\x03\x04quebrado', name='x.xlsx').status_code, 400)
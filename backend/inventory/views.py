@@ -1,27 +1,92 @@
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from decimal import Decimal
-from .models import Category, Material, Product, Purchase
-from .serializers import CategorySerializer, MaterialSerializer, ProductSerializer, PurchaseSerializer
+from core.conditional import ConditionalGetMixin
+from core.export import date_range, export_response
+from core.pagination import KeysetPagination
+from core.spreadsheet import SpreadsheetError, read_rows
+from core.utils import parse_ids
+from .models import CatalogChange, Category, Material, Product, ProductComposition, Purchase, PurchaseItem, StockMovement
+from .services import (
+    InsufficientStock, catalog_version, increment_stock, produce_products, record_movements,
+    refresh_product_costs, stock_balances, update_products
+)
+from .imports import IMPORTERS, import_catalog
+from .search import search_products
+from .serializers import (
+    CategorySerializer, MaterialSerializer, ProductSerializer, PurchaseSerializer,
+    ProductionOrderSerializer, StockMovementSerializer
+)
+
+logger = logging.getLogger(__name__)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    etag_models = (Category,)
+
+class StockAdjustmentMixin:
+    """
+    Saldo digitado no cadastro vira movimento no Kardex: saldo inicial na
+    criação e ajuste (diferença) na edição.
+    """
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            obj = serializer.save()
+            record_movements(type(obj), {obj.id: obj.stock_quantity}, 'OPENING', 'Cadastro')
 
-class MaterialViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        model = type(serializer.instance)
+        with transaction.atomic():
+            # Relê a linha travada: vendas/compras concorrentes esperam e o
+            # ajuste é calculado sobre o saldo atual, não o lido no início
+            locked = model.objects.select_for_update().get(pk=serializer.instance.pk)
+            serializer.instance = locked
+            stock = serializer.validated_data.pop('stock_quantity', None)
+            obj = serializer.save()
+            if stock is not None and stock != locked.stock_quantity:
+                delta = {obj.id: stock - locked.stock_quantity}
+                increment_stock(model, delta)
+                record_movements(model, delta, 'ADJUSTMENT', 'Ajuste manual')
+                obj.stock_quantity = stock
+
+class MaterialViewSet(ConditionalGetMixin, StockAdjustmentMixin, viewsets.ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
+    etag_models = (Material,)
+
+    def perform_update(self, serializer):
+        old_cost = serializer.instance.current_cost
+        with transaction.atomic():
+            super().perform_update(serializer)
+            # Custo alterado à mão: recalcula só os produtos que usam o material
+            if serializer.instance.current_cost != old_cost:
+                refresh_product_costs(materials=[serializer.instance.id])
 
 class PurchaseViewSet(viewsets.ModelViewSet):
     """
     Gerencia as Compras (Entradas).
-    Ao criar, calcula o rateio do frete e atualiza o estoque/custo dos materiais.
+    Ao criar, calcula o rateio do frete e atualiza o estoque/custo dos materiais
+    (ver PurchaseSerializer.create).
     """
-    queryset = Purchase.objects.all().order_by('-date', '-created_at')
+    queryset = Purchase.objects.prefetch_related(
+        Prefetch('items', queryset=PurchaseItem.objects.select_related('material'))
+    ).order_by('-date', '-created_at', '-id')
     serializer_class = PurchaseSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-date', '-created_at', '-id')
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -29,68 +94,113 @@ class PurchaseViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                # 1. Salva o Cabeçalho e os Itens (via Serializer)
+                # Cabeçalho, itens (com rateio do frete) e entrada dos materiais
                 purchase = serializer.save()
-                
-                # --- LÓGICA DE RATEIO DE FRETE ---
-                freight = purchase.freight_cost
-                items = purchase.items.all()
-                
-                # Calcula subtotal dos produtos (para peso financeiro)
-                subtotal_products = sum(item.quantity * item.unit_cost for item in items)
-                
-                if subtotal_products > 0:
-                    for item in items:
-                        # Cálculo do Rateio
-                        item_total_raw = item.quantity * item.unit_cost
-                        ratio = item_total_raw / subtotal_products
-                        item_freight_share = freight * ratio
-                        
-                        # Custo total da linha (Produto + Parcela do Frete)
-                        line_total_with_freight = item_total_raw + item_freight_share
-                        
-                        # Novo Custo Unitário Efetivo
-                        new_unit_cost = line_total_with_freight / item.quantity
-                        
-                        # Atualiza o item da compra
-                        item.effective_unit_cost = new_unit_cost
-                        item.save()
-
-                        # --- ATUALIZAÇÃO DO MATERIAL ---
-                        material = item.material
-                        
-                        # 1. Aumenta o Estoque (Entrada)
-                        # Usamos F() para evitar 'race conditions'
-                        Material.objects.filter(id=material.id).update(
-                            stock_quantity=F('stock_quantity') + item.quantity
-                        )
-                        
-                        # 2. Atualiza o Custo Atual (Média ou Último Preço)
-                        # Aqui estamos usando o "Último Preço Pago" como custo padrão
-                        material.current_cost = new_unit_cost
-                        material.save()
-                        
-                # Atualiza total da nota
-                purchase.total_amount = subtotal_products + freight
-                purchase.save()
-
-                headers = self.get_success_headers(serializer.data)
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+                # Recarrega com o prefetch do queryset (sem N+1 na resposta)
+                data = self.get_serializer(self.get_queryset().get(pk=purchase.pk)).data
+                headers = self.get_success_headers(data)
+                return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
         except Exception as e:
-            print(f"Erro ao salvar compra: {e}")
+            logger.exception("Erro ao salvar compra")
             return Response({"error": "Erro ao processar compra.", "detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    # Uma linha por item da nota
+    export_columns = [
+        ('id', 'Compra'), ('date', 'Data'), ('supplier', 'Fornecedor'), ('freight_cost', 'Frete'),
+        ('total_amount', 'Total da Nota'), ('items__material__name', 'Material'), ('items__material__unit', 'Unidade'),
+        ('items__quantity', 'Quantidade'), ('items__unit_cost', 'Custo Unitário'),
+        ('items__effective_unit_cost', 'Custo com Frete'),
+    ]
+
+    @action(detail=False)
+    def export(self, request):
+        """GET purchases/export/?start_date=&end_date=&output=csv|xlsx"""
+        queryset = Purchase.objects.filter(**date_range(request, 'date')).order_by('date', 'id', 'items__id')
+        return export_response(request, queryset, self.export_columns, 'compras')
+
+class ProductViewSet(ConditionalGetMixin, StockAdjustmentMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related('category').prefetch_related(
+        Prefetch('composition', queryset=ProductComposition.objects.select_related('material'))
+    )
     serializer_class = ProductSerializer
+    # Resposta inclui categoria e ficha técnica com nome/custo dos materiais
+    etag_models = (Product, Category, ProductComposition, Material)
+    bulk_update_limit = 1000
+    search_limit = 50
+
+    @action(detail=False, methods=['patch'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Edição em lote: PATCH {"products": [{"id": 1, "price": "90.00", "composition": [...]}, ...]}
+
+        Campos ausentes ficam como estão; a ficha técnica, quando enviada, é
+        gravada como diff por material. Tudo ou nada: com qualquer erro nada
+        é gravado e `errors` traz um item por produto, na ordem de envio.
+        """
+        entries = request.data.get('products') if isinstance(request.data, dict) else request.data
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "Envie a lista de produtos em 'products'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.bulk_update_limit:
+            return Response({"error": f"Máximo de {self.bulk_update_limit} produtos por requisição."}, status=status.HTTP_400_BAD_REQUEST)
+        entries = [entry if isinstance(entry, dict) else {} for entry in entries]
+
+        with transaction.atomic():
+            # Produtos (travados até o fim: o saldo lido aqui é o que será
+            # ajustado, sem venda do PDV no meio) e materiais: duas queries
+            product_ids = parse_ids(entry.get('id') for entry in entries)
+            products = {p.id: p for p in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')}
+            material_ids = parse_ids(
+                comp.get('material_id')
+                for entry in entries if isinstance(entry.get('composition'), list)
+                for comp in entry['composition'] if isinstance(comp, dict)
+            )
+            context = {
+                **self.get_serializer_context(),
+                'material_ids': set(Material.objects.filter(id__in=material_ids).values_list('id', flat=True)),
+            }
+
+            changes = []
+            errors = []
+            for entry in entries:
+                product = products.get(next(iter(parse_ids([entry.get('id')])), None))
+                if product is None:
+                    errors.append({"id": ["Produto não encontrado."]})
+                    continue
+                serializer = self.get_serializer(product, data=entry, partial=True, context=context)
+                if serializer.is_valid():
+                    changes.append((product, serializer.validated_data))
+                    errors.append({})
+                else:
+                    errors.append(serializer.errors)
+            if any(errors):
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            updated = update_products(changes)
+        queryset = self.get_queryset().filter(id__in=[p.id for p in updated]).order_by('id')
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    @action(detail=False)
+    def search(self, request):
+        """
+        Busca do PDV: GET ?q=<termo>&limit=20 (máx. 50)
+
+        SKU exato => só o produto; senão, produtos cujo nome/SKU começa com cada
+        palavra digitada (sem acento e sem caixa). Mesma projeção do catálogo.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.search_limit)
+        except ValueError:
+            raise ValidationError({"limit": "Número inválido."})
+        return Response(search_products(request.query_params.get('q', ''), limit))
 
     @action(detail=True, methods=['post'])
     def produce(self, request, pk=None):
         """
         Registra a Produção.
         1. Verifica se tem insumos suficientes.
-        2. Baixa o estoque dos insumos.
+        2. Baixa o estoque dos insumos (1 e 2 no mesmo UPDATE condicional).
         3. Aumenta o estoque do produto acabado.
         """
         product = self.get_object()
@@ -103,48 +213,9 @@ class ProductViewSet(viewsets.ModelViewSet):
         if quantity_produced <= 0:
             return Response({"error": "A quantidade deve ser maior que zero"}, status=status.HTTP_400_BAD_REQUEST)
 
-        print(f"--- 🏭 PRODUÇÃO: {product.name} (Qtd: {quantity_produced}) ---")
-
         try:
-            with transaction.atomic():
-                composition = product.composition.all()
-                
-                if not composition.exists():
-                    print("⚠️ AVISO: Produto sem ficha técnica. Baixa de insumos ignorada.")
-
-                # 1. VERIFICAÇÃO DE ESTOQUE (Bloqueia as linhas para evitar conflito)
-                for item in composition:
-                    # Carrega o material garantindo os dados mais recentes
-                    material = Material.objects.select_for_update().get(id=item.material.id)
-                    
-                    required_qty = item.quantity * quantity_produced
-                    
-                    print(f"Checking: {material.name} | Precisa: {required_qty} | Tem: {material.stock_quantity}")
-
-                    if material.stock_quantity < required_qty:
-                        return Response(
-                            {
-                                "error": f"Estoque insuficiente de {material.name}.",
-                                "detail": f"Necessário: {required_qty} {material.unit}. Disponível: {material.stock_quantity} {material.unit}."
-                            },
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-
-                # 2. BAIXA DE ESTOQUE DOS INSUMOS
-                for item in composition:
-                    required_qty = item.quantity * quantity_produced
-                    
-                    # UPDATE inventory_material SET stock_quantity = stock_quantity - required_qty
-                    Material.objects.filter(id=item.material.id).update(
-                        stock_quantity=F('stock_quantity') - required_qty
-                    )
-                    print(f"🔻 Baixou {required_qty} de {item.material.name}")
-
-                # 3. ENTRADA DO PRODUTO ACABADO
-                Product.objects.filter(id=product.id).update(
-                    stock_quantity=F('stock_quantity') + quantity_produced
-                )
-                print(f"✅ Produziu {quantity_produced} de {product.name}")
+            # Baixa dos insumos (UPDATE condicional, tudo-ou-nada) e entrada do produto
+            produce_products({product.id: quantity_produced})
 
             # Recarrega para retornar os dados atualizados
             product.refresh_from_db()
@@ -156,6 +227,181 @@ class ProductViewSet(viewsets.ModelViewSet):
                 "new_stock": str(product.stock_quantity)
             })
 
+        except InsufficientStock as e:
+            return shortage_response(e)
         except Exception as e:
-            print(f"Erro na produção: {e}")
-            return Response({"error": "Erro interno ao registrar produção.", "detail": str(e)}, status=500)
\ No newline at end of file
+            logger.exception("Erro na produção")
+            return Response({"error": "Erro interno ao registrar produção.", "detail": str(e)}, status=500)
+
+
+class ProductionOrderView(APIView):
+    """
+    Ordem de Produção em lote: vários produtos em uma única requisição.
+    POST {"items": [{"product_id": 1, "quantity": 10}, ...]}
+
+    A necessidade de insumos de todos os produtos é somada antes da baixa;
+    se faltar qualquer material nada é alterado e a resposta traz a lista
+    completa do que falta.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ProductionOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        orders = {}
+        for item in serializer.validated_data['items']:
+            orders[item['product_id']] = orders.get(item['product_id'], 0) + item['quantity']
+
+        try:
+            demand = produce_products(orders)
+        except InsufficientStock as e:
+            return shortage_response(e)
+
+        products = Product.objects.filter(id__in=orders).values('id', 'name', 'stock_quantity')
+        materials = Material.objects.filter(id__in=demand).values('id', 'name', 'unit', 'stock_quantity')
+        return Response({
+            "status": "Produção registrada com sucesso",
+            "products": [
+                {"id": p['id'], "name": p['name'], "produced": str(orders[p['id']]), "new_stock": str(p['stock_quantity'])}
+                for p in products
+            ],
+            "materials": [
+                {"id": m['id'], "name": m['name'], "unit": m['unit'], "consumed": str(demand[m['id']]), "new_stock": str(m['stock_quantity'])}
+                for m in materials
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+
+@method_decorator(gzip_page, name='dispatch')
+class CatalogView(APIView):
+    """
+    Catálogo enxuto do PDV: id, nome, SKU, preço, estoque e categoria.
+
+    GET catalog/              -> catálogo completo + versão
+    GET catalog/?since=<v>    -> só o que mudou depois da versão v
+                                 (`products` alterados, `deleted` = ids excluídos)
+
+    Sem mudanças (since = versão atual ou If-None-Match igual) => 304.
+    """
+    permission_classes = [IsAuthenticated]
+    fields = ('id', 'name', 'sku', 'price', 'stock_quantity', 'category', 'category__name')
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        try:
+            since = int(since) if since else None
+        except ValueError:
+            raise ValidationError({"since": "Versão inválida."})
+
+        # A versão é lida ANTES dos produtos: uma mudança confirmada no meio
+        # já sai nesta resposta e volta no próximo delta (versão maior)
+        version = catalog_version()
+        if since is not None and since > version:
+            since = None  # Versão de outro banco (ex.: base restaurada): manda tudo
+        etag = f'"catalog-{version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if since == version or etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        products = Product.objects.order_by('name')
+        deleted = []
+        if since is not None:
+            changed = set(CatalogChange.objects.filter(version__gt=since, version__lte=version).values_list('product_id', flat=True))
+            products = products.filter(id__in=changed)
+
+        rows = []
+        for row in products.values(*self.fields):
+            row['category_name'] = row.pop('category__name')
+            rows.append(row)
+        if since is not None:
+            deleted = sorted(changed - {row['id'] for row in rows})
+
+        return Response({
+            'version': version,
+            'full': since is None,
+            'products': rows,
+            'deleted': deleted,
+        }, headers=headers)
+
+
+class CatalogImportView(APIView):
+    """
+    Importação do cadastro por planilha (CSV ou XLSX, campo `file`):
+
+    POST imports/materials/  -> nome, unidade, custo, estoque (chave: nome)
+    POST imports/products/   -> sku, nome, preço, categoria, estoque, ... (chave: SKU)
+    POST imports/recipes/    -> sku, material, quantidade (chave: produto + material)
+
+    `?dry_run=true` só valida. 200 com o relatório; 400 com os erros por
+    linha e nada gravado (ver inventory/imports.py).
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, kind):
+        if kind not in IMPORTERS:
+            raise NotFound(f"Importação desconhecida (use {', '.join(IMPORTERS)}).")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Envie a planilha no campo 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            columns, lines = read_rows(upload, upload.name)
+        except SpreadsheetError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes', 'sim')
+        report = import_catalog(kind, columns, lines, dry_run)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if report['error_count'] else status.HTTP_200_OK)
+
+
+class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Kardex (somente leitura).
+    Filtros: ?material=ID, ?product=ID, ?start_date=, ?end_date=
+    """
+    serializer_class = StockMovementSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-date', '-created_at', '-id')
+
+    def get_queryset(self):
+        queryset = StockMovement.objects.select_related('material', 'product')
+        params = self.request.query_params
+        for field in ('material', 'product'):
+            if params.get(field):
+                queryset = queryset.filter(**{f'{field}_id': params[field]})
+        if params.get('start_date'):
+            queryset = queryset.filter(date__gte=params['start_date'])
+        if params.get('end_date'):
+            queryset = queryset.filter(date__lte=params['end_date'])
+        return queryset.order_by(*self.ordering)
+
+    @action(detail=False)
+    def balances(self, request):
+        """
+        Saldo de cada item no fim de uma data.
+        GET ?type=material|product&date=AAAA-MM-DD (padrão: hoje)
+        """
+        model = Product if request.query_params.get('type') == 'product' else Material
+        day = None
+        if request.query_params.get('date'):
+            day = parse_date(request.query_params['date'])
+            if day is None:
+                raise ValidationError({"date": "Data inválida (use AAAA-MM-DD)."})
+
+        balances = stock_balances(model, day)
+        fields = ['id', 'name'] + (['unit'] if model is Material else [])
+        items = model.objects.filter(id__in=balances).values(*fields).order_by('name')
+        return Response([{**item, 'quantity': str(balances[item['id']])} for item in items])
+
+
+def shortage_response(error):
+    """Resposta 400 com o relatório de falta de insumos."""
+    details = []
+    for item in error.shortages:
+        unit = f" {item['unit']}" if item.get('unit') else ''
+        details.append(f"{item['name']}: necessário {item['required']}{unit}, disponível {item['available']}{unit}")
+    return Response(
+        {"error": str(error), "detail": "; ".join(details), "shortages": error.shortages},
+        status=status.HTTP_400_BAD_REQUEST
+    )
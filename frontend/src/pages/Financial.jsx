@@ -6,7 +6,8 @@ import {
   FunnelIcon,
   CheckCircleIcon,
   ClockIcon,
-  PlusIcon
+  PlusIcon,
+  ArrowDownTrayIcon
 } from '@heroicons/react/24/outline'
 
 import api from '../api'
@@ -15,6 +16,9 @@ import Modal from '../components/Modal'
 function Financial() {
   const [loading, setLoading] = useState(true)
   const [transactions, setTransactions] = useState([])
+  const [nextPage, setNextPage] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [totals, setTotals] = useState({ revenue: 0, expense: 0, balance: 0 })
   
   const date = new Date()
   const firstDay = new Date(date.getFullYear(), date.getMonth(), 1).toISOString().split('T')[0]
@@ -36,23 +40,57 @@ function Financial() {
   })
   const [saving, setSaving] = useState(false)
 
-  const fetchTransactions = () => {
+  // Primeira página do extrato (cursor) + totais do período inteiro
+  const fetchTransactions = async () => {
     setLoading(true)
-    api.get(`transactions/?start_date=${filters.start_date}&end_date=${filters.end_date}`)
+    try {
+      const params = { start_date: filters.start_date, end_date: filters.end_date }
+      const [pageRes, totalsRes] = await Promise.all([
+        api.get('transactions/', { params: { ...params, page_size: 50 } }),
+        api.get('transactions/totals/', { params })
+      ])
+      setTransactions(pageRes.data.results)
+      setNextPage(pageRes.data.next)
+      setTotals(totalsRes.data)
+    } catch {
+      toast.error("Erro ao carregar extrato.")
+    }
+    setLoading(false)
+  }
+
+  // Próxima página (paginação por cursor)
+  const handleLoadMore = () => {
+    setLoadingMore(true)
+    api.get(nextPage)
       .then(res => {
-        setTransactions(res.data)
-        setLoading(false)
-      })
-      .catch(() => {
-        toast.error("Erro ao carregar extrato.")
-        setLoading(false)
+        setTransactions(prev => [...prev, ...res.data.results])
+        setNextPage(res.data.next)
       })
+      .catch(() => toast.error("Erro ao carregar extrato."))
+      .finally(() => setLoadingMore(false))
   }
 
   useEffect(() => {
     fetchTransactions()
   }, [filters])
 
+  // Exportação do período (arquivo gerado em streaming pelo servidor)
+  const handleExport = async (output) => {
+    try {
+      const res = await api.get('transactions/export/', {
+        params: { ...filters, output },
+        responseType: 'blob'
+      })
+      const link = document.createElement('a')
+      link.href = URL.createObjectURL(res.data)
+      link.download = `lancamentos_${filters.start_date}_${filters.end_date}.${output}`
+      link.click()
+      URL.revokeObjectURL(link.href)
+    } catch {
+      toast.error("Erro ao exportar lançamentos.")
+    }
+  }
+
   const formatCurrencyDisplay = (value) => {
     if (!value && value !== 0) return ''
     const number = parseFloat(value)
@@ -100,9 +138,10 @@ function Financial() {
       .catch(() => toast.error("Erro ao excluir."))
   }
 
-  const revenue = transactions.filter(t => t.type === 'REVENUE' && t.status === 'PAID').reduce((acc, t) => acc + parseFloat(t.amount), 0)
-  const expense = transactions.filter(t => t.type === 'EXPENSE' && t.status === 'PAID').reduce((acc, t) => acc + parseFloat(t.amount), 0)
-  const balance = revenue - expense
+  // Somas do período inteiro (servidor), não só das páginas carregadas
+  const revenue = parseFloat(totals.revenue)
+  const expense = parseFloat(totals.expense)
+  const balance = parseFloat(totals.balance)
 
   return (
     <div className="p-4 md:p-6 max-w-7xl mx-auto">
@@ -255,6 +294,17 @@ function Financial() {
                     onChange={e => setFilters({...filters, end_date: e.target.value})}
                 />
             </div>
+            <div className="flex gap-2 mt-3">
+                {['csv', 'xlsx'].map(output => (
+                    <button
+                        key={output}
+                        onClick={() => handleExport(output)}
+                        className="flex-1 flex items-center justify-center gap-1 text-xs font-bold border dark:border-gray-600 rounded p-2 text-gray-600 dark:text-gray-300 hover:bg-gray-50 dark:hover:bg-gray-700 transition-colors"
+                    >
+                        <ArrowDownTrayIcon className="w-4 h-4"/> {output.toUpperCase()}
+                    </button>
+                ))}
+            </div>
         </div>
 
         <div className="bg-white dark:bg-gray-800 p-4 rounded-xl shadow-sm border border-gray-200 dark:border-gray-700 lg:col-span-2 flex flex-col md:flex-row justify-around items-center gap-4 transition-colors">
@@ -346,6 +396,18 @@ function Financial() {
               </tbody>
             </table>
             </div>
+
+            {nextPage && (
+                <div className="flex justify-center p-4 border-t border-gray-100 dark:border-gray-700">
+                    <button 
+                        onClick={handleLoadMore}
+                        disabled={loadingMore}
+                        className="bg-white dark:bg-gray-800 border border-gray-200 dark:border-gray-700 text-indigo-600 dark:text-indigo-400 px-4 py-2 rounded-lg font-bold text-sm hover:bg-indigo-50 dark:hover:bg-gray-700 transition disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                    </button>
+                </div>
+            )}
         </div>
       )}
     </div>
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import toast from 'react-hot-toast'
 import { 
   MagnifyingGlassIcon, ShoppingCartIcon, TrashIcon, 
@@ -9,17 +9,40 @@ import {
 import api from '../api'
 import Modal from '../components/Modal'
 
+// Vendas feitas sem internet ficam aqui até a próxima sincronização
+const OFFLINE_QUEUE = 'trama_pdv_offline_sales'
+
+const readQueue = () => JSON.parse(localStorage.getItem(OFFLINE_QUEUE) || '[]')
+const writeQueue = (queue) => localStorage.setItem(OFFLINE_QUEUE, JSON.stringify(queue))
+
+// Catálogo enxuto (catalog/) guardado localmente: só o que mudou é baixado de novo
+const CATALOG_CACHE = 'trama_pdv_catalog'
+
+const readCatalog = () => JSON.parse(localStorage.getItem(CATALOG_CACHE) || 'null')
+
+// Chave única da venda: reenvios (retentativa/offline) não duplicam no servidor
+const newSaleKey = () => (
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+)
+
 function PDV() {
   const [loading, setLoading] = useState(true)
   const [processing, setProcessing] = useState(false)
   
   // Dados
-  const [products, setProducts] = useState([])
+  const catalog = useRef(readCatalog())
+  const [products, setProducts] = useState(catalog.current?.products || [])
   const [paymentMethods, setPaymentMethods] = useState([])
   
   // Filtro e Carrinho
   const [searchTerm, setSearchTerm] = useState('')
+  const [searchResults, setSearchResults] = useState(null) // null = filtra o catálogo local
   const [cart, setCart] = useState([])
+
+  // Vendas aguardando sincronização (offline)
+  const [pendingSales, setPendingSales] = useState(readQueue().length)
   
   // Modal de Pagamento
   const [isCheckoutOpen, setIsCheckoutOpen] = useState(false)
@@ -30,12 +53,34 @@ function PDV() {
   })
 
   // --- 1. CARGA INICIAL ---
+  // Atualiza o catálogo local com o delta desde a última versão (304 = nada mudou)
+  const refreshCatalog = () => {
+    const cached = catalog.current
+    return api.get('catalog/', {
+        params: cached ? { since: cached.version } : {},
+        validateStatus: status => status === 200 || status === 304
+    }).then(res => {
+        if (res.status === 304) return
+
+        const byId = new Map(res.data.full ? [] : cached.products.map(p => [p.id, p]))
+        res.data.products.forEach(p => byId.set(p.id, p))
+        res.data.deleted.forEach(id => byId.delete(id))
+
+        const next = {
+            version: res.data.version,
+            products: [...byId.values()].sort((a, b) => a.name.localeCompare(b.name))
+        }
+        catalog.current = next
+        localStorage.setItem(CATALOG_CACHE, JSON.stringify(next))
+        setProducts(next.products)
+    })
+  }
+
   useEffect(() => {
     Promise.all([
-      api.get('products/'),
+      refreshCatalog(),
       api.get('payment-methods/')
-    ]).then(([resProd, resPay]) => {
-      setProducts(resProd.data)
+    ]).then(([, resPay]) => {
       setPaymentMethods(resPay.data)
       setLoading(false)
     }).catch(() => {
@@ -44,6 +89,55 @@ function PDV() {
     })
   }, [])
 
+  // --- 1.1 SINCRONIZAÇÃO OFFLINE ---
+  const syncOfflineSales = () => {
+    const queue = readQueue()
+    if (queue.length === 0) return
+
+    api.post('sales/bulk-sync/', { sales: queue })
+    .then(res => {
+        // Toda venda com resultado sai da fila (criada, duplicada ou recusada)
+        const done = new Set(res.data.results.map(r => r.idempotency_key))
+        const remaining = readQueue().filter(sale => !done.has(sale.idempotency_key))
+        writeQueue(remaining)
+        setPendingSales(remaining.length)
+
+        if (res.data.created) toast.success(`${res.data.created} venda(s) offline sincronizada(s).`)
+        const failed = res.data.rejected + res.data.invalid
+        if (failed) toast.error(`${failed} venda(s) offline recusada(s) (estoque ou dados inválidos).`)
+        refreshCatalog()
+    })
+    .catch(() => {}) // Continua na fila para a próxima tentativa
+  }
+
+  useEffect(() => {
+    syncOfflineSales()
+    window.addEventListener('online', syncOfflineSales)
+    return () => window.removeEventListener('online', syncOfflineSales)
+  }, [])
+
+  // --- 1.2 BUSCA NO SERVIDOR ---
+  // Índice de texto (prefixo, sem acento, SKU exato); offline cai no filtro local
+  const latestSearch = useRef('')
+  useEffect(() => {
+    const term = searchTerm.trim()
+    latestSearch.current = term
+    if (!term) {
+        setSearchResults(null)
+        return
+    }
+    const timer = setTimeout(() => {
+        api.get('products/search/', { params: { q: term, limit: 50 } })
+        .then(res => {
+            if (latestSearch.current === term) setSearchResults(res.data)
+        })
+        .catch(() => {
+            if (latestSearch.current === term) setSearchResults(null)
+        })
+    }, 200)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
+
   // --- 2. LÓGICA DO CARRINHO ---
   const addToCart = (product) => {
     if (product.stock_quantity <= 0) {
@@ -102,6 +196,7 @@ function PDV() {
     setProcessing(true)
 
     const payload = {
+        idempotency_key: newSaleKey(),
         total_amount: total,
         payment_method: paymentData.method_id,
         customer_name: paymentData.customer_name || 'Consumidor Final',
@@ -113,25 +208,38 @@ function PDV() {
         }))
     }
 
-    api.post('sales/', payload)
-    .then(() => {
-        toast.success("Venda realizada com sucesso! 🎉")
+    const resetSale = () => {
         setCart([])
         setIsCheckoutOpen(false)
         setPaymentData({ method_id: '', customer_name: '', customer_phone: '' })
-        // Atualiza estoque visualmente recarregando produtos
-        api.get('products/').then(res => setProducts(res.data))
+    }
+
+    api.post('sales/', payload)
+    .then(() => {
+        toast.success("Venda realizada com sucesso! 🎉")
+        resetSale()
+        // Atualiza o estoque na tela (só os produtos que mudaram)
+        refreshCatalog()
     })
     .catch(err => {
         console.error(err)
+        if (!err.response) {
+            // Sem conexão: guarda a venda (com a hora do caixa) para sincronizar depois
+            const queue = [...readQueue(), { ...payload, sold_at: new Date().toISOString() }]
+            writeQueue(queue)
+            setPendingSales(queue.length)
+            toast("Sem conexão: venda guardada e será enviada quando a internet voltar.", { icon: '📶' })
+            resetSale()
+            return
+        }
         const msg = err.response?.data?.error || "Erro ao processar venda."
         toast.error(msg)
     })
     .finally(() => setProcessing(false))
   }
 
-  // Filtragem
-  const filteredProducts = products.filter(p => 
+  // Filtragem: resultado do servidor quando disponível, senão catálogo local
+  const filteredProducts = searchResults ?? products.filter(p => 
     p.name.toLowerCase().includes(searchTerm.toLowerCase()) || 
     (p.sku && p.sku.includes(searchTerm))
   )
@@ -181,7 +289,7 @@ function PDV() {
                                     <p className={`text-xs ${product.stock_quantity <= 5 ? 'text-red-500 font-bold' : 'text-gray-500 dark:text-gray-400'}`}>
                                         Estoque: {product.stock_quantity}
                                     </p>
-                                    <p className="font-bold text-indigo-600 dark:text-indigo-400">R$ {product.price}</p>
+                                    <p className="font-bold text-indigo-600 dark:text-indigo-400">R$ {parseFloat(product.price).toFixed(2)}</p>
                                 </div>
                                 {product.stock_quantity > 0 && (
                                     <div className="bg-indigo-50 dark:bg-indigo-900 p-1.5 rounded-full text-indigo-600 dark:text-indigo-300 opacity-0 group-hover:opacity-100 transition">
@@ -207,7 +315,14 @@ function PDV() {
             <h2 className="font-bold text-lg flex items-center gap-2">
                 <ShoppingCartIcon className="w-6 h-6" /> Carrinho
             </h2>
-            <span className="bg-indigo-700 px-2 py-1 rounded text-xs font-bold">{cart.length} itens</span>
+            <div className="flex items-center gap-2">
+                {pendingSales > 0 && (
+                    <button onClick={syncOfflineSales} title="Sincronizar vendas offline" className="bg-yellow-500 text-yellow-950 px-2 py-1 rounded text-xs font-bold">
+                        {pendingSales} offline
+                    </button>
+                )}
+                <span className="bg-indigo-700 px-2 py-1 rounded text-xs font-bold">{cart.length} itens</span>
+            </div>
          </div>
 
          {/* Lista de Itens */}
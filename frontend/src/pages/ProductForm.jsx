@@ -159,7 +159,9 @@ function ProductForm() {
 
     const payload = {
         ...formData,
-        composition: formData.composition.filter(c => c.material && c.quantity > 0)
+        composition: formData.composition
+            .filter(c => c.material && c.quantity > 0)
+            .map(c => ({ material_id: parseInt(c.material), quantity: c.quantity }))
     }
 
     const request = isEdit 
@@ -117,6 +117,15 @@ function Products() {
                                     R$ {parseFloat(product.price).toFixed(2)}
                                 </p>
                             </div>
+                            {/* Custos já calculados no servidor (sem recalcular a ficha técnica) */}
+                            <div className="text-right">
+                                <p className="text-xs text-gray-400">
+                                    Custo R$ {(parseFloat(product.material_cost) + parseFloat(product.labor_cost)).toFixed(2)}
+                                </p>
+                                <p className="text-xs text-gray-400">
+                                    Sugerido R$ {parseFloat(product.suggested_price).toFixed(2)}
+                                </p>
+                            </div>
                         </div>
                     </div>
 
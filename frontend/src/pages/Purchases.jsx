@@ -7,16 +7,19 @@ import Modal from '../components/Modal'
 
 function Purchases() {
   const [purchases, setPurchases] = useState([])
+  const [nextPage, setNextPage] = useState(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   // Estado para o Modal de Detalhes
   const [selectedPurchase, setSelectedPurchase] = useState(null)
   const [isModalOpen, setIsModalOpen] = useState(false)
 
   useEffect(() => {
-    api.get('purchases/')
+    api.get('purchases/?page_size=50')
       .then(res => {
-        setPurchases(res.data)
+        setPurchases(res.data.results)
+        setNextPage(res.data.next)
         setLoading(false)
       })
       .catch(err => {
@@ -25,6 +28,18 @@ function Purchases() {
       })
   }, [])
 
+  // Próxima página (paginação por cursor)
+  const handleLoadMore = () => {
+    setLoadingMore(true)
+    api.get(nextPage)
+      .then(res => {
+        setPurchases(prev => [...prev, ...res.data.results])
+        setNextPage(res.data.next)
+      })
+      .catch(() => toast.error("Erro ao carregar compras."))
+      .finally(() => setLoadingMore(false))
+  }
+
   const handleOpenDetails = (purchase) => {
     setSelectedPurchase(purchase)
     setIsModalOpen(true)
@@ -224,6 +239,18 @@ function Purchases() {
                     </tbody>
                 </table>
             </div>
+
+            {nextPage && (
+                <div className="flex justify-center mt-6">
+                    <button 
+                        onClick={handleLoadMore}
+                        disabled={loadingMore}
+                        className="bg-white dark:bg-gray-800 border border-gray-200 dark:border-gray-700 text-indigo-600 dark:text-indigo-400 px-4 py-2 rounded-lg font-bold text-sm hover:bg-indigo-50 dark:hover:bg-gray-700 transition disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                    </button>
+                </div>
+            )}
         </>
       )}
     </div>